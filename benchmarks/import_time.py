@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark: import time and heavy dependencies loaded per entry point.
+
+Each scenario runs in a fresh interpreter, which imports the package and calls
+one check on a synthetic statement. It reports the median time of the import
+and the call, and which heavy dependencies ended up loaded. The run fails if a
+scenario loads a dependency it must not need (pandas never, PIL and pyzbar only
+to decode QR codes, requests and aiohttp only to call the API, pdfplumber only
+for its engine) or exceeds its time budget. The fresh interpreters import the
+package, so install the checkout first (`pip install -e .`):
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-scale 2 --json import_time.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from synthetic import make_statement
+
+HEAVY_MODULES = ('fitz', 'pymupdf', 'pdfplumber', 'pandas', 'numpy', 'PIL', 'pyzbar', 'requests', 'aiohttp')
+
+# name: (code run after the clock starts, modules it must not load, budget in ms)
+SCENARIOS = {
+    'import': ("import estatementvalidator",
+               HEAVY_MODULES, 20),
+    'check_producer': ("from estatementvalidator import check_producer\ncheck_producer(PATH)",
+                       ('pdfplumber', 'pandas', 'PIL', 'pyzbar', 'requests', 'aiohttp'), 250),
+    'check_modification': ("from estatementvalidator import check_modification\ncheck_modification(PATH)",
+                           ('pandas', 'PIL', 'pyzbar', 'requests', 'aiohttp'), 600),
+    'check_modification pymupdf': ("from estatementvalidator import check_modification\n"
+                                   "check_modification(PATH, engine='pymupdf')",
+                                   ('pdfplumber', 'pandas', 'PIL', 'pyzbar', 'requests', 'aiohttp'), 300),
+    'triage': ("from estatementvalidator import triage\ntriage(PATH)",
+               ('pdfplumber', 'pandas', 'PIL', 'pyzbar', 'requests', 'aiohttp'), 250),
+    'validate_document import': ("from estatementvalidator import validate_document",
+                                 ('pdfplumber', 'pandas', 'PIL', 'pyzbar', 'requests', 'aiohttp'), 250),
+}
+
+PROBE = """
+import json, sys, time
+PATH = {path!r}
+start = time.perf_counter()
+exec(compile({code!r}, 'scenario', 'exec'))
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'modules': heavy}}))
+"""
+
+
+def run_scenario(code, path, repeat):
+    """Median seconds over `repeat` fresh interpreters, and the heavy modules loaded"""
+    runs, modules = [], set()
+    for _ in range(repeat):
+        probe = PROBE.format(path=path, code=code, heavy=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        runs.append(result['seconds'])
+        modules.update(result['modules'])
+    return statistics.median(runs), sorted(modules)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold-start import time per entry point')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per scenario')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiply every time budget, e.g. on a slow machine')
+    parser.add_argument('--json', help='Write the report to this file')
+    args = parser.parse_args(argv)
+
+    errors = []
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'statement.pdf')
+        with open(path, 'wb') as f:
+            f.write(make_statement(1))
+
+        print(f"{'scenario':<26}{'ms':>8}{'budget':>8}  heavy modules loaded")
+        for name, (code, forbidden, budget) in SCENARIOS.items():
+            seconds, modules = run_scenario(code, path, args.repeat)
+            budget *= args.budget_scale
+            report[name] = {'ms': seconds * 1000, 'budget_ms': budget, 'modules': modules}
+            print(f"{name:<26}{seconds * 1000:>8.1f}{budget:>8.0f}  {', '.join(modules) or '-'}")
+
+            unexpected = sorted(set(modules) & set(forbidden))
+            if unexpected:
+                errors.append(f"{name}: loads {', '.join(unexpected)}")
+            if seconds * 1000 > budget:
+                errors.append(f"{name}: {seconds * 1000:.1f} ms, budget {budget:.0f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    for error in errors:
+        print(f"FAIL {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
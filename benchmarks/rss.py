@@ -0,0 +1,106 @@
+"""
+Memory benchmark: peak RSS of the page scans as the page count grows.
+
+Each statement is scanned in a fresh interpreter, by the modification check
+(full forensic scan) and find_all_format, with each character engine. It
+reports how far the peak resident set size rose above the size after the
+libraries were loaded. The pages are streamed and their caches dropped one at
+a time, so the rise must stay flat: only the document structure (xref table,
+page tree) grows with the page count. The run fails if the rise grows by more
+than `--max-mb-per-page` between the shortest and the longest statement (it
+was about 3 MB per page with pdfplumber before pages were released). It also
+checks that a scan above the memory ceiling stops with an 'error' result. The
+package must be installed, e.g. with `pip install -e .` from the checkout:
+
+    python benchmarks/rss.py
+    python benchmarks/rss.py --pages 10 100 300 --engines pdfplumber --json rss.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from synthetic import make_statement
+
+PROBE = """
+import json, resource, sys
+from estatementvalidator import check_modification
+from estatementvalidator.modify_check import find_all_format
+from estatementvalidator.memory import current_rss_mb
+PATH, WARMUP, ENGINE, LIMIT = {path!r}, {warmup!r}, {engine!r}, {limit!r}
+check_modification(WARMUP, engine=ENGINE)   # Load every library on a 1-page statement before measuring
+baseline = current_rss_mb()
+valid, result = check_modification(PATH, engine=ENGINE, memory_limit=LIMIT)
+if LIMIT is None:
+    find_all_format(PATH, engine=ENGINE)
+scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+print(json.dumps({{'baseline_mb': baseline, 'peak_mb': peak, 'result': result['result']}}))
+"""
+
+
+def run_probe(path, warmup, engine, limit=None):
+    probe = PROBE.format(path=path, warmup=warmup, engine=engine, limit=limit)
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure peak RSS of the page scans against the page count')
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--engines', nargs='+', default=['pymupdf', 'pdfplumber'], choices=('pymupdf', 'pdfplumber'))
+    parser.add_argument('--max-mb-per-page', type=float, default=0.1,
+                        help='Allowed growth of the RSS rise per additional page')
+    parser.add_argument('--json', help='Write the report to this file')
+    args = parser.parse_args(argv)
+    pages = sorted(args.pages)
+
+    errors = []
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for count in [1] + pages:
+            paths[count] = os.path.join(directory, f'statement_{count}.pdf')
+            with open(paths[count], 'wb') as f:
+                f.write(make_statement(count))
+
+        print(f"{'engine':<12}{'pages':>6}{'baseline MB':>13}{'peak MB':>9}{'rise MB':>9}")
+        for engine in args.engines:
+            rises = {}
+            for count in pages:
+                result = run_probe(paths[count], paths[1], engine)
+                rises[count] = max(result['peak_mb'] - result['baseline_mb'], 0.0)
+                report.setdefault(engine, {})[count] = dict(result, rise_mb=rises[count])
+                print(f"{engine:<12}{count:>6}{result['baseline_mb']:>13.1f}{result['peak_mb']:>9.1f}"
+                      f"{rises[count]:>9.1f}")
+                if result['result'] != 'pass':
+                    errors.append(f"{engine}, {count} pages: {result['result']} instead of pass")
+
+            if len(pages) > 1:
+                per_page = (rises[pages[-1]] - rises[pages[0]]) / (pages[-1] - pages[0])
+                report[engine]['mb_per_page'] = per_page
+                print(f"{engine:<12}{'':>6}{per_page:>31.3f} MB per page")
+                if per_page > args.max_mb_per_page:
+                    errors.append(f"{engine}: RSS grows {per_page:.3f} MB per page, "
+                                  f"allowed {args.max_mb_per_page} MB")
+
+            # A ceiling below the resident size must stop the scan, not let it run on
+            limited = run_probe(paths[pages[-1]], paths[1], engine, limit=1)
+            report[engine]['ceiling_result'] = limited['result']
+            if limited['result'] != 'error':
+                errors.append(f"{engine}: a 1 MB ceiling gave {limited['result']} instead of error")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    for error in errors:
+        print(f"FAIL {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Offline benchmark of the validator on synthetic statements.
+
+Generates statements of several page counts and variants (see synthetic.py),
+starts the stub conversion server in place of the model, and measures:
+
+- per-stage timings of validate_document (timings=True), median per document
+- end-to-end latency p50/p99 per page count and variant
+- throughput of validate_many over the whole corpus
+- peak RSS of this process and of the worker processes
+
+It also checks that every verdict is the expected one and that the pymupdf and
+pdfplumber engines report the same set of format keys on every page, and exits
+non-zero if not. The gray and cmyk variants are the known exception: PyMuPDF
+reports their DeviceGray and CMYK black as sRGB, and they must keep differing
+until it reports the PDF's own color space. With --baseline, a p50 latency more than --tolerance above the saved
+report also fails the run, so the harness can guard against regressions. The
+package must be importable, e.g. installed from the checkout with `pip install -e .`:
+
+    python benchmarks/run.py --json baseline.json
+    python benchmarks/run.py --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from estatementvalidator import validate_document, validate_many
+from estatementvalidator.document import open_document
+from estatementvalidator.modify_check import format_key, get_run_engine, iter_pages
+from estatementvalidator.stub_server import StubServer
+
+from synthetic import NAME, RECOLORS, VARIANTS, qr_address, write_corpus
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children, in MB"""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+
+
+def expected_result(variant):
+    return 'pass' if variant == 'genuine' else 'fail'
+
+
+def bench_latency(corpus, api_url, repeat, extraction):
+    """Sequential validate_document runs: latency and stage timings per document"""
+    latency = {}
+    stages = {}
+    errors = []
+    for path, pages, variant in corpus:
+        runs = []
+        stage_runs = defaultdict(list)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, result = validate_document(path, api_url=api_url, timings=True, extraction=extraction)
+            runs.append(time.perf_counter() - start)
+            for stage, seconds in result['timings']['stages'].items():
+                stage_runs[stage].append(seconds)
+            if result['result'] != expected_result(variant):
+                errors.append(f"{os.path.basename(path)}: expected {expected_result(variant)}, "
+                              f"got {result['result']} ({result.get('message')})")
+        key = f"{variant}/{pages}p"
+        latency[key] = {'pages': pages, 'p50': percentile(runs, 50), 'p99': percentile(runs, 99), 'runs': len(runs)}
+        stages[key] = {stage: percentile(values, 50) for stage, values in stage_runs.items()}
+    return latency, stages, errors
+
+
+def bench_throughput(corpus, api_url, workers, extraction):
+    paths = [path for path, _, _ in corpus]
+    start = time.perf_counter()
+    results = validate_many(paths, workers=workers, api_url=api_url, quiet=True, extraction=extraction)
+    elapsed = time.perf_counter() - start
+    errors = [f"{os.path.basename(path)}: validate_many expected {expected_result(variant)}, got {result['result']}"
+              for (path, _, variant), (_, result) in zip(corpus, results)
+              if result['result'] != expected_result(variant)]
+    pages = sum(pages for _, pages, _ in corpus)
+    return {
+        'workers': workers,
+        'documents': len(paths),
+        'seconds': elapsed,
+        'documents_per_second': len(paths) / elapsed,
+        'pages_per_second': pages / elapsed
+    }, errors
+
+
+def page_format_keys(path, engine):
+    """The set of format keys of every page, as one character engine reads them"""
+    page_runs = get_run_engine(engine)
+    with open_document(path) as document:
+        return [{format_key(font, size, color) for font, size, color, _ in page_runs(document, page_num)}
+                for page_num in iter_pages(document, range(document.page_count))]
+
+
+def check_engine_parity(corpus):
+    """Both character engines must read the same format keys on every page"""
+    errors = []
+    for path, _, variant in corpus:
+        pages = zip(page_format_keys(path, 'pymupdf'), page_format_keys(path, 'pdfplumber'))
+        differences = [(number, sorted(pymupdf - pdfplumber, key=repr), sorted(pdfplumber - pymupdf, key=repr))
+                       for number, (pymupdf, pdfplumber) in enumerate(pages, 1) if pymupdf != pdfplumber]
+        if variant in RECOLORS:
+            if not differences:
+                errors.append(f"{os.path.basename(path)}: engines now agree on {variant} text, "
+                              f"drop it from the known differences")
+            continue
+        for number, pymupdf_only, pdfplumber_only in differences:
+            errors.append(f"{os.path.basename(path)}: page {number}: pymupdf only {pymupdf_only}, "
+                          f"pdfplumber only {pdfplumber_only}")
+    return errors
+
+
+def compare_baseline(report, baseline, tolerance):
+    regressions = []
+    for key, current in report['latency'].items():
+        previous = baseline.get('latency', {}).get(key)
+        if previous and current['p50'] > previous['p50'] * (1 + tolerance):
+            regressions.append(f"{key}: p50 {current['p50'] * 1000:.1f} ms vs baseline "
+                               f"{previous['p50'] * 1000:.1f} ms")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'statement':<16}{'p50 ms':>10}{'p99 ms':>10}  slowest stages (p50 ms)")
+    for key, latency in report['latency'].items():
+        top = sorted(((seconds, stage) for stage, seconds in report['stages'][key].items()
+                      if stage != 'total' and '.' not in stage), reverse=True)[:3]
+        stages = ', '.join(f"{stage} {seconds * 1000:.1f}" for seconds, stage in top)
+        print(f"{key:<16}{latency['p50'] * 1000:>10.1f}{latency['p99'] * 1000:>10.1f}  {stages}")
+    throughput = report['throughput']
+    print(f"\nvalidate_many: {throughput['documents']} documents with {throughput['workers'] or 'all'} workers "
+          f"in {throughput['seconds']:.2f} s ({throughput['documents_per_second']:.1f} docs/s, "
+          f"{throughput['pages_per_second']:.0f} pages/s)")
+    rss = report['peak_rss_mb']
+    print(f"peak RSS: {rss['self']:.0f} MB (this process), {rss['children']:.0f} MB (largest worker)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the validator on synthetic statements')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument('--repeat', type=int, default=5, help='validate_document runs per statement')
+    parser.add_argument('--workers', type=int, default=None, help='validate_many workers (default: CPUs)')
+    parser.add_argument('--delay', type=float, default=0.0, help='Simulated model latency in seconds')
+    parser.add_argument('--extraction', default='llm', choices=('auto', 'local', 'llm'),
+                        help="'auto' and 'local' read page 1 locally instead of asking the stub server")
+    parser.add_argument('--no-parity', action='store_true', help='Skip the engine parity check')
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--baseline', help='Fail if p50 latency regressed against this report')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p50 regression')
+    args = parser.parse_args(argv)
+
+    errors = []
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = write_corpus(directory, args.pages, args.variants)
+        summary = {'Name': NAME, 'User_address': qr_address()}
+        with StubServer(summary=summary, delay=args.delay) as server:
+            latency, stages, latency_errors = bench_latency(corpus, server.url, args.repeat, args.extraction)
+            throughput, throughput_errors = bench_throughput(corpus, server.url, args.workers, args.extraction)
+        errors += latency_errors + throughput_errors
+        if not args.no_parity:
+            errors += check_engine_parity(corpus)
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'extraction': args.extraction,
+        'latency': latency,
+        'stages': stages,
+        'throughput': throughput,
+        'peak_rss_mb': peak_rss_mb()
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            errors += compare_baseline(report, json.load(f), args.tolerance)
+
+    for error in errors:
+        print(f"FAIL {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
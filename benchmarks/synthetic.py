@@ -0,0 +1,182 @@
+"""
+Synthetic BOC-like statements for benchmarks.
+
+The statements are built with PyMuPDF only: Target_Producer metadata, text in
+every (font, size, color) of TEMPLATE_FORMATS, and a QR code image with the
+NAME:/ADDR:/LANGUAGE: lines of a real statement where check_qrcode expects it.
+Variants add a white overlay, a glyph in a foreign font, an amount drawn in
+DeviceGray or CMYK black, or one in a subset font named like a template font
+('ABCDEF+AllAndNone'), all of which the modification check must reject. They
+tamper with the last page, so the whole statement is scanned, except 'early',
+the foreign glyph on page 1, where fail-fast mode stops after one page.
+
+    pip install -e .
+    python benchmarks/synthetic.py out_dir --pages 1 10 50 200
+"""
+
+import argparse
+import io
+import os
+
+import fitz  # PyMuPDF
+import qrcode
+
+from estatementvalidator.modify_check import TEMPLATE_FORMATS
+from estatementvalidator.producer_check import Target_Producer
+
+NAME = "CHAN TAI MAN"
+ADDRESS = ("FLAT A 1/F", "1 TEST ROAD", "HONG KONG")
+
+# Base-14 fonts standing in for the template fonts; they are renamed after saving
+BASE_FONTS = {'AllAndNone': ('helv', '/Helvetica'), 'AllAndNone2': ('tiro', '/Times-Roman')}
+FOREIGN_FONT = 'cour'
+# A base-14 font renamed to a subset of a template font: same name after the prefix
+SUBSET_FONT = ('ABCDEF+AllAndNone', ('hebo', '/Helvetica-Bold'))
+# Fill color operators of the recolored variants, replacing the RGB black of one amount
+RECOLORS = {'gray': b"0 G 0 g", 'cmyk': b"0 0 0 1 K 0 0 0 1 k"}
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+QR_RECT = fitz.Rect(527, 197, 567, 237)
+ROWS_PER_PAGE = 40
+
+VARIANTS = ('genuine', 'overlay', 'foreign', 'early', 'gray', 'cmyk', 'subset')
+
+
+def qr_payload(name=NAME, address=ADDRESS):
+    return f"NAME:{name}\n" + "\n".join(f"ADDR:{line}" for line in address) + "\nLANGUAGE:EN"
+
+
+def qr_address(address=ADDRESS):
+    """The User_address a conversion service reads from a statement built with `address`"""
+    return ' '.join(address)
+
+
+def _insert(page, point, text, font, size, color=(0.0, 0.0, 0.0)):
+    page.insert_text(point, text, fontname=BASE_FONTS[font][0], fontsize=size, color=color)
+
+
+def make_statement(pages=1, variant='genuine', name=NAME, address=ADDRESS):
+    """
+    Build a statement and return its PDF bytes.
+
+    Args:
+        pages (int): Number of pages; the header, address and QR code are on page 1
+        variant (str): 'genuine', 'overlay' (white rectangle over an amount on the
+                       last page), 'foreign' (an amount in a non-template font),
+                       'early' (the same on page 1 instead of the last page),
+                       'gray' or 'cmyk' (an amount in a template font and size drawn
+                       in DeviceGray or CMYK black) or 'subset' (an amount in the
+                       subset font 'ABCDEF+AllAndNone')
+        name (str): Account holder name
+        address (tuple): Address lines, also encoded in the QR code
+
+    Returns:
+        bytes: The PDF
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown variant '{variant}', expected one of {VARIANTS}")
+
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        _insert(page, (50, 80), "BANK OF CHINA (HONG KONG)", 'AllAndNone', 13.0)
+        if number == 0:
+            y = 120
+            for line in (name,) + tuple(address):
+                _insert(page, (50, y), line, 'AllAndNone', 8.0)
+                y += 10
+            _insert(page, (350, 120), "Account Number: 012-345-6-789012-3", 'AllAndNone', 8.0)
+            _insert(page, (350, 130), "Statement Date: 2025/03/31", 'AllAndNone', 8.0)
+
+            # One sample of every template format, so the whole template is exercised
+            for index, (font, size, color) in enumerate(TEMPLATE_FORMATS):
+                _insert(page, (50 + index // 5 * 150, 160 + index % 5 * 18), f"Sample {size:g}",
+                        font, size, color)
+
+            image = qrcode.make(qr_payload(name, address), border=1)
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            page.insert_image(QR_RECT, stream=buffer.getvalue())
+
+        for row in range(ROWS_PER_PAGE):
+            _insert(page, (50, 260 + row * 13),
+                    f"2025/03/{row % 28 + 1:02d}  DEPOSIT  {row * 13.5 + number:10.2f}", 'AllAndNone', 7.5)
+        _insert(page, (50, 820), f"Page {number + 1} of {pages}", 'AllAndNone', 6.0, (0.502, 0.502, 0.502))
+
+        if number == (0 if variant == 'early' else pages - 1):
+            if variant in ('foreign', 'early'):
+                page.insert_text((300, 400), "999999.99", fontname=FOREIGN_FONT, fontsize=7.5,
+                                 color=(0.0, 0.0, 0.0))
+            elif variant == 'overlay':
+                page.draw_rect(fitz.Rect(300, 390, 360, 405), color=None, fill=(1, 1, 1))
+            elif variant == 'subset':
+                page.insert_text((300, 400), "999999.99", fontname=SUBSET_FONT[1][0], fontsize=7.5,
+                                 color=(0.0, 0.0, 0.0))
+            elif variant in RECOLORS:
+                _insert(page, (300, 400), "999999.99", 'AllAndNone', 7.5)
+                # insert_text writes each call to its own content stream
+                xref = page.get_contents()[-1]
+                doc.update_stream(xref, doc.xref_stream(xref).replace(b"0 0 0 RG 0 0 0 rg", RECOLORS[variant]))
+
+    _rename_fonts(doc)
+    doc.set_metadata({'producer': Target_Producer})
+    data = doc.tobytes(garbage=1, deflate=True)
+    doc.close()
+    return data
+
+
+def _rename_fonts(doc):
+    """Give the base-14 stand-ins the template font names, with explicit metrics"""
+    renames = {base_name: (font, code) for font, (code, base_name) in list(BASE_FONTS.items()) + [SUBSET_FONT]}
+    descriptors = {}
+    for xref in range(1, doc.xref_length()):
+        if doc.xref_get_key(xref, "Type") != ("name", "/Font"):
+            continue
+        base_name = doc.xref_get_key(xref, "BaseFont")[1]
+        if base_name not in renames:
+            continue
+        font, code = renames[base_name]
+        if font not in descriptors:
+            descriptors[font] = doc.get_new_xref()
+            doc.update_object(descriptors[font],
+                              f"<</Type/FontDescriptor/FontName/{font}/Flags 32/FontBBox[-166 -225 1000 931]"
+                              "/ItalicAngle 0/Ascent 718/Descent -207/CapHeight 718/StemV 88>>")
+        metrics = fitz.Font(code)
+        widths = " ".join(str(int(round(metrics.glyph_advance(c) * 1000))) for c in range(32, 256))
+        doc.xref_set_key(xref, "BaseFont", f"/{font}")
+        doc.xref_set_key(xref, "FirstChar", "32")
+        doc.xref_set_key(xref, "LastChar", "255")
+        doc.xref_set_key(xref, "Widths", f"[{widths}]")
+        doc.xref_set_key(xref, "FontDescriptor", f"{descriptors[font]} 0 R")
+
+
+def write_corpus(directory, page_counts=(1, 10, 50, 200), variants=VARIANTS):
+    """
+    Write one statement per page count and variant into `directory`.
+
+    Returns:
+        list: (path, pages, variant) of every file written
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for pages in page_counts:
+        for variant in variants:
+            path = os.path.join(directory, f"{variant}_{pages:03d}p.pdf")
+            with open(path, 'wb') as f:
+                f.write(make_statement(pages, variant))
+            written.append((path, pages, variant))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic BOC-like statements')
+    parser.add_argument('directory')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=VARIANTS)
+    args = parser.parse_args(argv)
+    for path, _, _ in write_corpus(args.directory, args.pages, args.variants):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,15 +10,64 @@ Main Functions:
     - check_modification: Check if PDF has been modified
     - check_qrcode: Check QR codes in the document
     - extract_content: Extract content from the document
+    - extract_fields: Read name, address, account number and statement date from page 1 locally
+    - triage / iter_triage: Screen PDFs by producer, revisions, page count and size without parsing pages
+    - StatementDocument: A PDF opened once and shared by all checks
+    - ResultCache: Content-addressed cache of per-stage results
+    - ConversionClient: Pooled, retrying client for the conversion API
+    - validate_many: Validate many documents in parallel
+    - iter_validate: Validate many documents in parallel, yielding results as they finish
+    - avalidate_document / avalidate_many: asyncio versions with concurrent API calls
+    - configure_logging: Send the package's log records to a stream, optionally as JSON
+
+The package logs to the `estatementvalidator` logger and is silent until logging is configured.
 """
 
-from estatementvalidator.estatement_validator import (
-    validate_document,
-    check_producer,
-    check_modification,
-    check_qrcode,
-    extract_content
-)
+import importlib
+import logging
+
+# Public names and the submodule defining them. Submodules are imported on first
+# access, so `import estatementvalidator` stays cheap and a check only loads the
+# dependencies it needs (see benchmarks/import_time.py).
+_EXPORTS = {
+    'validate_document': 'estatement_validator',
+    'check_producer': 'estatement_validator',
+    'check_modification': 'estatement_validator',
+    'check_qrcode': 'estatement_validator',
+    'extract_content': 'estatement_validator',
+    'extract_fields': 'local_extractor',
+    'triage': 'triage_check',
+    'iter_triage': 'triage_check',
+    'StatementDocument': 'document',
+    'ResultCache': 'cache',
+    'ConversionClient': 'client',
+    'validate_many': 'batch',
+    'iter_validate': 'batch',
+    'avalidate_document': 'async_validator',
+    'avalidate_many': 'async_validator',
+    'ValidationService': 'service',
+    'configure_logging': 'log',
+    'set_memory_limit': 'memory',
+    'learn_template': 'template_learner',
+    'load_template': 'template_learner',
+    'use_template': 'modify_check',
+    'main': 'cli',
+}
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{_EXPORTS[name]}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
 
 __version__ = '0.0.1'
 __all__ = [
@@ -26,5 +75,22 @@ __all__ = [
     'check_producer',
     'check_modification',
     'check_qrcode',
-    'extract_content'
+    'extract_content',
+    'extract_fields',
+    'triage',
+    'iter_triage',
+    'StatementDocument',
+    'ResultCache',
+    'ConversionClient',
+    'validate_many',
+    'iter_validate',
+    'avalidate_document',
+    'avalidate_many',
+    'ValidationService',
+    'configure_logging',
+    'set_memory_limit',
+    'learn_template',
+    'load_template',
+    'use_template',
+    'main'
 ] 
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+
+from estatementvalidator.cli import main
+
+sys.exit(main())
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from estatementvalidator.batch import _init_worker, _local_stage, _worker_cache
+from estatementvalidator.cache import ResultCache
+from estatementvalidator.client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES, backoff_delay
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.estatement_validator import (
+    CONVERT_ENDPOINT,
+    EXTRACTION_API_PARAMS,
+    DocumentSource,
+    _all_passed_result,
+    _local_answer,
+    _qrcode_api_failure,
+    _qrcode_failed_result,
+    compare_qrcode_address
+)
+from estatementvalidator.timing import count
+from estatementvalidator.upload import build_upload, content_stage, upload_options
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+# Only aiohttp 3.10 and later tell a connect timeout from a read timeout
+_CONNECT_TIMEOUT = getattr(aiohttp, 'ConnectionTimeoutError', ())
+
+
+def _client_session() -> aiohttp.ClientSession:
+    """A session with the same connect and read timeouts as ConversionClient"""
+    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, connect=DEFAULT_CONNECT_TIMEOUT,
+                                                               sock_read=DEFAULT_READ_TIMEOUT))
+
+
+async def _apost_document(session: aiohttp.ClientSession, document: StatementDocument, api_url: str,
+                          params: Dict[str, Any], upload=None,
+                          retries: int = DEFAULT_RETRIES) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Upload the in-memory PDF bytes (or their text or page images) to the conversion API; returns (status, json or None)
+
+    Like ConversionClient, 5xx answers and connection failures are retried `retries`
+    times with jittered exponential backoff, and a read timeout is not retried.
+    """
+    url = f"{api_url}{CONVERT_ENDPOINT}"
+    # Text extraction and page renders are CPU-bound: off the event loop
+    files, params = await asyncio.get_running_loop().run_in_executor(None, build_upload, document, params, upload)
+    attempt = 0
+    while True:
+        # A form is consumed by the request that sends it
+        form = aiohttp.FormData()
+        for field, (name, data, content_type) in files:
+            form.add_field(field, data, filename=name, content_type=content_type)
+        try:
+            async with session.post(url, params=params, data=form) as response:
+                if response.status == 200:
+                    return response.status, await response.json(content_type=None)
+                if response.status < 500 or attempt >= retries:
+                    return response.status, None
+                reason = f"status {response.status}"
+        except aiohttp.ClientConnectionError as e:
+            if attempt >= retries or (isinstance(e, aiohttp.ServerTimeoutError)
+                                      and not isinstance(e, _CONNECT_TIMEOUT)):
+                raise
+            reason = str(e) or type(e).__name__
+
+        delay = backoff_delay(attempt)
+        attempt += 1
+        count('api_retries')
+        logger.warning("Conversion request to %s failed (%s), retry %d/%d in %.1f s",
+                       url, reason, attempt, retries, delay)
+        await asyncio.sleep(delay)
+
+
+async def _avalidate(source: DocumentSource, api_url: str, session: aiohttp.ClientSession,
+                     semaphore: asyncio.Semaphore, executor: Optional[Executor],
+                     cache: Optional[ResultCache], forensics: bool, upload=None,
+                     extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
+    if isinstance(source, StatementDocument):
+        return await _avalidate_document(source, api_url, session, semaphore, executor, cache, forensics,
+                                         upload, extraction)
+
+    # Read the file off the event loop; the bytes are shared by every step below
+    document = await asyncio.get_running_loop().run_in_executor(None, StatementDocument, source)
+    try:
+        return await _avalidate_document(document, api_url, session, semaphore, executor, cache, forensics,
+                                         upload, extraction)
+    finally:
+        document.close()
+
+
+async def _avalidate_document(document: StatementDocument, api_url: str, session: aiohttp.ClientSession,
+                              semaphore: asyncio.Semaphore, executor: Optional[Executor],
+                              cache: Optional[ResultCache], forensics: bool, upload=None,
+                              extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
+    loop = asyncio.get_running_loop()
+
+    # Steps 1, 2 and 3a: CPU-bound local checks, in the executor. A thread executor
+    # shares the opened document and the caller's cache; a process pool gets the bytes,
+    # parses them again, and only a shared cache backend
+    if isinstance(executor, ProcessPoolExecutor):
+        local_source, local_cache = document.data, _worker_cache(cache)
+    else:
+        local_source, local_cache = document, cache
+    failure_result, qr_data, qr_rung = await loop.run_in_executor(executor, _local_stage, local_source,
+                                                                  local_cache, forensics)
+    if failure_result is not None:
+        return False, failure_result
+
+    # Step 3b: Page 1 read locally, or one extraction request, serves both the QR code
+    # comparison and the content
+    key = content_stage(upload_options(upload), extraction)
+    content = cache.get(document, key) if cache is not None and extraction != 'local' else None
+    if content is None:
+        content = await loop.run_in_executor(None, _local_answer, document, qr_data, extraction)
+    if content is None:
+        async with semaphore:
+            status, content = await _apost_document(session, document, api_url, EXTRACTION_API_PARAMS, upload)
+        if content is not None and cache is not None:
+            cache.set(document, key, content)
+    if content is None:
+        qrcode_valid, qrcode_result = _qrcode_api_failure(status)
+    else:
+        qrcode_valid, qrcode_result = compare_qrcode_address(content, qr_data)
+    if not qrcode_valid:
+        return False, _qrcode_failed_result(qrcode_result, qr_rung)
+
+    # All checks passed; the extraction result is the content, already parsed once
+    return True, _all_passed_result(content, qrcode_result.get('content_data'), qr_rung)
+
+
+async def avalidate_document(file_path: DocumentSource, api_url: str = "http://localhost:8000",
+                             session: Optional[aiohttp.ClientSession] = None,
+                             semaphore: Optional[asyncio.Semaphore] = None,
+                             executor: Optional[Executor] = None,
+                             cache: Optional[ResultCache] = None,
+                             forensics: bool = False, upload=None,
+                             extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
+    """
+    Perform all validation steps without blocking the event loop
+
+    The local checks run in `executor` (the loop's default thread pool if None) and
+    the conversion API is called with aiohttp, so other documents keep making
+    progress while this one waits on the model.
+
+    Args:
+        file_path (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+        api_url (str): Base URL for the API
+        session (aiohttp.ClientSession): Session to reuse; a new one is created if None
+        semaphore (asyncio.Semaphore): Bounds the number of API requests in flight
+            across every caller sharing it
+        executor (concurrent.futures.Executor): Where the CPU-bound checks run
+        cache (ResultCache): Result cache to consult and fill, if any
+        forensics (bool): Report every modification issue instead of stopping at the first
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages (see upload.py)
+        extraction (str): 'llm' (default) always asks the API; 'auto' reads page 1 locally
+            and only asks the API when unsure, 'local' never asks it (see local_extractor.py)
+
+    Returns:
+        Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(DEFAULT_CONCURRENCY)
+
+    own_session = session is None
+    if own_session:
+        session = _client_session()
+    try:
+        return await _avalidate(file_path, api_url, session, semaphore, executor, cache, forensics, upload,
+                                extraction)
+    except Exception as e:
+        return False, {
+            'result': 'error',
+            'message': str(e)
+        }
+    finally:
+        if own_session:
+            await session.close()
+
+
+async def avalidate_many(paths: Iterable[DocumentSource], api_url: str = "http://localhost:8000",
+                         concurrency: int = DEFAULT_CONCURRENCY, workers: Optional[int] = None,
+                         executor: Optional[Executor] = None,
+                         max_documents: Optional[int] = None,
+                         cache: Optional[ResultCache] = None,
+                         forensics: bool = False, upload=None,
+                         extraction: str = 'llm') -> List[Tuple[bool, Dict[str, Any]]]:
+    """
+    Validate many documents concurrently and return the results in submission order
+
+    Args:
+        paths (Iterable): PDF paths (or bytes, or binary streams) to validate
+        api_url (str): Base URL for the API
+        concurrency (int): Maximum number of API requests in flight
+        workers (int): Worker processes for the local checks when no executor is given
+        executor (concurrent.futures.Executor): Where the CPU-bound checks run; a
+            process pool of `workers` processes is created if None
+        max_documents (int): Maximum number of documents held in memory at once
+            (default: four per API slot)
+        cache (ResultCache): Result cache to consult and fill, if any
+        forensics (bool): Report every modification issue instead of stopping at the first
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages (see upload.py)
+        extraction (str): 'llm' (default) always asks the API; 'auto' reads page 1 locally
+            and only asks the API when unsure, 'local' never asks it (see local_extractor.py)
+
+    Returns:
+        List[Tuple[bool, Dict[str, Any]]]: One (is_valid, result_data) per input
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    slots = asyncio.Semaphore(max_documents or concurrency * 4)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(False,))
+
+    async def validate_one(source):
+        async with slots:
+            return await avalidate_document(source, api_url=api_url, session=session,
+                                            semaphore=semaphore, executor=executor, cache=cache,
+                                            forensics=forensics, upload=upload,
+                                            extraction=extraction)
+
+    try:
+        async with _client_session() as session:
+            return await asyncio.gather(*(validate_one(source) for source in paths))
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
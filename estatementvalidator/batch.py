@@ -0,0 +1,251 @@
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from estatementvalidator.cache import ResultCache
+from estatementvalidator.client import ConversionClient
+from estatementvalidator.document import open_document, portable_source
+from estatementvalidator.estatement_validator import run_local_checks, run_remote_checks
+from estatementvalidator.log import LOGGER_NAME
+from estatementvalidator.memory import set_memory_limit
+
+# One validated document: its position in the input, the input itself and the
+# (is_valid, result_data) pair that validate_document would have returned
+BatchResult = namedtuple('BatchResult', ['index', 'source', 'is_valid', 'result'])
+
+
+def _error_result(message: str) -> Dict[str, Any]:
+    return {
+        'result': 'error',
+        'message': message
+    }
+
+
+def _init_worker(quiet: bool, memory_limit: Optional[float] = None) -> None:
+    """Process pool initializer: optionally silence the per-document log output, set the memory ceiling"""
+    if quiet:
+        logging.getLogger(LOGGER_NAME).setLevel(logging.ERROR)
+    set_memory_limit(memory_limit)
+
+
+def _local_stage(source, cache: Optional[ResultCache] = None, forensics: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[Dict[str, Any]]]:
+    """Run the CPU-bound checks in a worker process. Never raises."""
+    try:
+        with open_document(source) as document:
+            return run_local_checks(document, cache=cache, forensics=forensics)
+    except Exception as e:
+        return _error_result(str(e)), None, None
+
+
+def _remote_stage(source, qr_data: Optional[str], api_url: str, cache: Optional[ResultCache] = None,
+                  qr_rung: Optional[Dict[str, Any]] = None, client: Optional[ConversionClient] = None,
+                  upload=None, extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
+    """Run the API-bound checks in a thread of the parent process. Never raises."""
+    try:
+        with open_document(source) as document:
+            return run_remote_checks(document, qr_data, api_url, cache, qr_rung, client, upload, extraction)
+    except Exception as e:
+        return False, _error_result(str(e))
+
+
+def _local_passed(qr_data: Optional[str], qr_rung: Optional[Dict[str, Any]]) -> Tuple[bool, Dict[str, Any]]:
+    return True, {
+        'result': 'pass',
+        'producer': 'true',
+        'modify': 'true',
+        'qrcode': 'unknown',
+        'qrcode_data': qr_data,
+        'qrcode_rung': qr_rung,
+        'message': 'Local checks passed'
+    }
+
+
+def _worker_cache(cache: Optional[ResultCache]) -> Optional[ResultCache]:
+    """The cache worker processes may use: only backends that live outside this process"""
+    return cache if cache is not None and cache.backend.shared else None
+
+
+def _isolated_local_stage(source, quiet: bool, cache: Optional[ResultCache] = None,
+                          forensics: bool = False, memory_limit: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[Dict[str, Any]]]:
+    """Re-run one document in a pool of its own, so a crash can only take itself down"""
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(quiet, memory_limit)) as pool:
+        try:
+            return pool.submit(_local_stage, source, cache, forensics).result()
+        except BrokenProcessPool:
+            return _error_result('Worker process crashed while checking this document'), None, None
+
+
+def iter_validate(paths: Iterable, workers: Optional[int] = None, api_url: str = "http://localhost:8000",
+                  ordered: bool = False, local_only: bool = False, io_workers: Optional[int] = None,
+                  quiet: bool = False, cache: Optional[ResultCache] = None,
+                  forensics: bool = False, client: Optional[ConversionClient] = None,
+                  upload=None, extraction: str = 'llm',
+                  memory_limit: Optional[float] = None) -> Iterator[BatchResult]:
+    """
+    Validate many documents, spreading the CPU-bound checks over a process pool
+
+    The producer check, modification check and QR decoding run in worker processes.
+    Documents that pass them are handed to a thread pool in this process for the
+    API-bound QR comparison and content extraction.
+
+    A document that raises is reported as an 'error' result. If a worker process
+    dies, the pool is replaced and every document that was in flight is re-run in a
+    process of its own, so only the document that crashes again is reported as an
+    error and the rest of the batch carries on.
+
+    Args:
+        paths (Iterable): PDF paths (or bytes, or binary streams) to validate
+        workers (int): Number of worker processes (default: os.cpu_count())
+        api_url (str): Base URL for the API
+        ordered (bool): Yield results in submission order instead of as they finish
+        local_only (bool): Skip the API-bound steps and report the local checks only
+        io_workers (int): Number of threads for the API-bound steps (default: workers)
+        quiet (bool): Only log errors from the worker processes
+        cache (ResultCache): Result cache to consult and fill. Worker processes only
+            use it with a SQLite or directory backend; an in-process memory cache
+            serves the API-bound steps only.
+        forensics (bool): Report every modification issue instead of stopping at the first
+        client (ConversionClient): Client shared by the API-bound threads; one with a
+            connection per thread is created for the batch if None
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages (see upload.py)
+        extraction (str): 'llm' (default) always asks the API; 'auto' reads page 1 locally
+            and only asks the API when unsure, 'local' never asks it (see local_extractor.py)
+        memory_limit (float): Resident set size in MB above which a worker stops scanning
+            a statement and reports it as an 'error' result (see memory.py)
+
+    Yields:
+        BatchResult: (index, source, is_valid, result)
+    """
+    workers = workers or os.cpu_count() or 1
+    io_workers = io_workers or workers
+    max_in_flight = workers * 4
+    worker_cache = _worker_cache(cache)
+
+    sources = enumerate(paths)
+    exhausted = False
+    pending = {}     # future -> (index, source, payload, stage, pool)
+    buffered = {}    # index -> BatchResult, waiting for its turn when ordered
+    next_index = 0
+
+    def make_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(quiet, memory_limit))
+
+    pool = make_pool()
+    io_pool = ThreadPoolExecutor(max_workers=io_workers)
+    own_client = client is None and not local_only
+    if own_client:
+        client = ConversionClient(pool_size=io_workers)
+
+    def after_local(index, source, payload, outcome, finished):
+        failure_result, qr_data, qr_rung = outcome
+        if failure_result is not None:
+            finished.append(BatchResult(index, source, False, failure_result))
+        elif local_only:
+            finished.append(BatchResult(index, source, *_local_passed(qr_data, qr_rung)))
+        else:
+            future = io_pool.submit(_remote_stage, payload, qr_data, api_url, cache, qr_rung, client, upload,
+                                 extraction)
+            pending[future] = (index, source, payload, 'remote', None)
+
+    try:
+        while True:
+            # Keep the process pool fed without materialising the whole input; in order,
+            # results held back behind a slow document also count against the window
+            while not exhausted and len(pending) < max_in_flight and len(buffered) < max_in_flight:
+                try:
+                    index, source = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                # Streams are read here: worker processes get the path or the bytes
+                payload = portable_source(source)
+                try:
+                    future = pool.submit(_local_stage, payload, worker_cache, forensics)
+                except BrokenProcessPool:
+                    pool = make_pool()
+                    future = pool.submit(_local_stage, payload, worker_cache, forensics)
+                pending[future] = (index, source, payload, 'local', pool)
+
+            if not pending:
+                break
+
+            finished = []
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                index, source, payload, stage, owner = pending.pop(future)
+                try:
+                    outcome = future.result()
+                except BrokenProcessPool:
+                    # A worker died and took the pool with it: replace the pool once and
+                    # re-run each document that was in flight in a process of its own
+                    if owner is pool:
+                        pool.shutdown(wait=False)
+                        pool = make_pool()
+                    retry = io_pool.submit(_isolated_local_stage, payload, quiet, worker_cache, forensics,
+                                           memory_limit)
+                    pending[retry] = (index, source, payload, 'isolated', None)
+                    continue
+                except Exception as e:
+                    finished.append(BatchResult(index, source, False, _error_result(str(e))))
+                    continue
+
+                if stage == 'remote':
+                    finished.append(BatchResult(index, source, *outcome))
+                else:
+                    after_local(index, source, payload, outcome, finished)
+
+            if not ordered:
+                yield from finished
+                continue
+
+            for result in finished:
+                buffered[result.index] = result
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                next_index += 1
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        if own_client:
+            client.close()
+
+
+def validate_many(paths: Iterable, workers: Optional[int] = None, api_url: str = "http://localhost:8000",
+                  local_only: bool = False, io_workers: Optional[int] = None,
+                  quiet: bool = False, cache: Optional[ResultCache] = None,
+                  forensics: bool = False, client: Optional[ConversionClient] = None,
+                  upload=None, extraction: str = 'llm',
+                  memory_limit: Optional[float] = None) -> List[Tuple[bool, Dict[str, Any]]]:
+    """
+    Validate many documents in parallel and return the results in submission order
+
+    Args:
+        paths (Iterable): PDF paths (or bytes, or binary streams) to validate
+        workers (int): Number of worker processes (default: os.cpu_count())
+        api_url (str): Base URL for the API
+        local_only (bool): Skip the API-bound steps and report the local checks only
+        io_workers (int): Number of threads for the API-bound steps (default: workers)
+        quiet (bool): Only log errors from the worker processes
+        cache (ResultCache): Result cache to consult and fill (see iter_validate)
+        forensics (bool): Report every modification issue instead of stopping at the first
+        client (ConversionClient): Client shared by the API-bound threads (see iter_validate)
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages (see upload.py)
+        extraction (str): 'llm' (default) always asks the API; 'auto' reads page 1 locally
+            and only asks the API when unsure, 'local' never asks it (see local_extractor.py)
+        memory_limit (float): Per-worker memory ceiling in MB (see iter_validate)
+
+    Returns:
+        List[Tuple[bool, Dict[str, Any]]]: One (is_valid, result_data) per input
+    """
+    return [
+        (item.is_valid, item.result)
+        for item in iter_validate(paths, workers=workers, api_url=api_url, ordered=True,
+                                  local_only=local_only, io_workers=io_workers, quiet=quiet, cache=cache,
+                                  forensics=forensics, client=client, upload=upload,
+                                  extraction=extraction, memory_limit=memory_limit)
+    ]
@@ -0,0 +1,327 @@
+"""
+Content-addressed cache for validation stage results.
+
+Results are keyed by the SHA-256 of the PDF bytes, the stage name and a
+version of the rule set that produced them, so a re-uploaded statement skips
+work that has already been done while a change to the producer, template
+formats or prompts invalidates every earlier entry.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional
+
+def ruleset_version(*parts) -> str:
+    """Short stable digest of the rules that determine a stage result"""
+    text = json.dumps(parts, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU store.
+
+    Args:
+        max_entries (int): Least recently used entries beyond this count are evicted
+    """
+    # Entries live in this process only, so worker processes do not consult it
+    shared = False
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite store on local disk, shared by every process that opens the same file.
+
+    Args:
+        path (str): Database file
+        max_entries (int): Least recently used entries beyond this count are evicted
+        max_bytes (int): Least recently used entries are evicted while the stored
+                         values exceed this many bytes
+    """
+    shared = True
+
+    def __init__(self, path: str, max_entries: Optional[int] = 100000, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                         'expires_at REAL, accessed_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)')
+            self._local.conn = conn
+        return conn
+
+    def __getstate__(self):
+        # Connections stay with their process; a worker reconnects to the same file
+        return {'path': self.path, 'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        conn = self._connect()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) '
+                      'VALUES (?, ?, ?, ?, ?)',
+                      (key, value, len(value.encode('utf-8')), now + ttl if ttl else None, now))
+        self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+        if self.max_entries is not None:
+            conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at DESC '
+                         'LIMIT -1 OFFSET ?)', (self.max_entries,))
+        if self.max_bytes is not None:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            while total > self.max_bytes:
+                row = conn.execute('SELECT key, size FROM cache ORDER BY accessed_at LIMIT 1').fetchone()
+                if row is None:
+                    break
+                conn.execute('DELETE FROM cache WHERE key = ?', (row[0],))
+                total -= row[1]
+
+    def delete(self, key: str) -> None:
+        self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self) -> None:
+        self._connect().execute('DELETE FROM cache')
+
+    def __len__(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+class DirectoryCacheBackend:
+    """
+    One JSON file per entry under a directory, e.g. on a shared volume.
+
+    The file modification time doubles as the last access time for LRU eviction.
+    Eviction walks the whole directory, so it runs on the first write of each
+    process and then every `evict_every` writes; in between, the cache can grow
+    past its limits by that many entries per writing process.
+
+    Args:
+        path (str): Cache directory, created if missing
+        max_entries (int): Least recently used entries beyond this count are evicted
+        max_bytes (int): Least recently used entries are evicted while the files
+                         exceed this many bytes
+        evict_every (int): Writes between two eviction sweeps
+    """
+    shared = True
+
+    def __init__(self, path: str, max_entries: Optional[int] = 100000, max_bytes: Optional[int] = None,
+                 evict_every: int = 64):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = max(evict_every, 1)
+        self._writes = 0
+        os.makedirs(path, exist_ok=True)
+
+    def __getstate__(self):
+        # A worker process counts its own writes
+        return {'path': self.path, 'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                'evict_every': self.evict_every}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _file(self, key: str) -> str:
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, name[:2], name + '.json')
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._file(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        expires_at = entry.get('expires_at')
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['value']
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'key': key, 'value': value, 'expires_at': time.time() + ttl if ttl else None}
+        # Write then rename, so readers in other processes never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self._writes += 1
+        if (self._writes - 1) % self.evict_every == 0:
+            self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self) -> None:
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in entries:
+            over_count = self.max_entries is not None and count > self.max_entries
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            count -= 1
+            total -= size
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        for _, _, path in list(self._entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._entries())
+
+
+class ResultCache:
+    """
+    Per-stage result cache keyed by document content and rule-set version.
+
+    Args:
+        backend: MemoryCacheBackend (default), SQLiteCacheBackend or DirectoryCacheBackend
+        ttl (float): Seconds an entry stays valid; None keeps entries until evicted
+        ruleset (str): Rule-set version mixed into every key; defaults to the digest
+                       of the producer, template formats and prompts in use at the
+                       time of each lookup, so use_template() takes effect at once
+
+    Hit and miss counters are kept per process.
+    """
+
+    def __init__(self, backend=None, ttl: Optional[float] = None, ruleset: Optional[str] = None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self._ruleset = ruleset
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    @property
+    def ruleset(self) -> str:
+        if self._ruleset is not None:
+            return self._ruleset
+        from estatementvalidator.estatement_validator import current_ruleset_version
+        return current_ruleset_version()
+
+    def key(self, digest: str, stage: str) -> str:
+        return f"{self.ruleset}:{stage}:{digest}"
+
+    def get(self, document, stage: str) -> Optional[Any]:
+        """Cached result of `stage` for `document` (a StatementDocument), or None"""
+        value = self.backend.get(self.key(document.sha256, stage))
+        if value is None:
+            self.misses[stage] += 1
+            return None
+        self.hits[stage] += 1
+        return json.loads(value)
+
+    def set(self, document, stage: str, result: Any) -> None:
+        self.backend.set(self.key(document.sha256, stage), json.dumps(result), self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'stages': {
+                stage: {'hits': self.hits[stage], 'misses': self.misses[stage]}
+                for stage in sorted(set(self.hits) | set(self.misses))
+            },
+            'entries': len(self.backend)
+        }
@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
+from estatementvalidator.batch import iter_validate
+from estatementvalidator.cache import DirectoryCacheBackend, ResultCache, SQLiteCacheBackend
+from estatementvalidator.client import DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES, ConversionClient
+from estatementvalidator.local_extractor import EXTRACTION_MODES
+from estatementvalidator.modify_check import (
+    DEFAULT_ENGINE, RUN_ENGINES, TEMPLATE_ENV, TEMPLATE_VERSION_ENV, use_template
+)
+from estatementvalidator.template_learner import learn_template, save_template
+from estatementvalidator.triage_check import TRIAGE_LIMITS, iter_triage
+from estatementvalidator.upload import DEFAULT_UPLOAD, UPLOAD_MODES
+from estatementvalidator.log import configure_logging
+
+
+def expand_paths(paths: List[str]) -> Iterator[str]:
+    """Yield PDF files, walking any directories in sorted order"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.pdf'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def open_cache(path: Optional[str], ttl: Optional[float] = None) -> Optional[ResultCache]:
+    """A result cache in a directory (existing directory or trailing slash) or a SQLite file"""
+    if not path:
+        return None
+    if os.path.isdir(path) or path.endswith(('/', os.sep)):
+        return ResultCache(DirectoryCacheBackend(path), ttl=ttl)
+    return ResultCache(SQLiteCacheBackend(path), ttl=ttl)
+
+
+def _apply_template(args) -> None:
+    """Check against a learned template file, here and in every worker process"""
+    if not args.template:
+        return
+    os.environ[TEMPLATE_ENV] = os.path.abspath(args.template)
+    if args.template_version:
+        os.environ[TEMPLATE_VERSION_ENV] = args.template_version
+    try:
+        # validate and serve check with the default engine
+        use_template(args.template, args.template_version, engine=DEFAULT_ENGINE)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Cannot use template: {e}")
+
+
+def _corpora(specs: List[str]) -> Dict[str, List[str]]:
+    """Template versions from NAME=DIRECTORY arguments; a bare directory is named after itself"""
+    corpora = {}
+    for spec in specs:
+        name, separator, path = spec.partition('=')
+        if not separator:
+            name, path = os.path.basename(os.path.normpath(spec)), spec
+        corpora.setdefault(name, []).extend(expand_paths([path]))
+    return corpora
+
+
+def _learn_template(args) -> int:
+    corpora = _corpora(args.corpora)
+    start = time.perf_counter()
+    template, errors = learn_template(corpora, workers=args.workers, engine=args.engine,
+                                      min_documents=args.min_documents)
+    elapsed = time.perf_counter() - start
+    for source, message in errors:
+        print(f"Skipped {source}: {message}", file=sys.stderr)
+    if args.output:
+        save_template(template, args.output)
+    else:
+        json.dump(template, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write('\n')
+    documents = sum(version['documents'] for version in template['versions'].values())
+    for name, version in template['versions'].items():
+        print(f"{name}: {len(version['formats'])} formats from {version['documents']} statements, "
+              f"{version['pages']} pages", file=sys.stderr)
+    print(f"{documents} statements profiled in {elapsed:.2f} s", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def _validate(args) -> int:
+    _apply_template(args)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    cache = open_cache(args.cache, args.cache_ttl)
+    workers = args.workers or os.cpu_count() or 1
+    client = ConversionClient(pool_size=workers, max_in_flight=args.api_concurrency,
+                              read_timeout=args.api_timeout, retries=args.api_retries)
+    all_valid = True
+    try:
+        for item in iter_validate(expand_paths(args.paths), workers=workers, api_url=args.api_url,
+                                  ordered=not args.unordered, local_only=args.local_only,
+                                  cache=cache, forensics=args.forensics, client=client,
+                                  upload={'mode': args.upload, 'pages': args.upload_pages, 'dpi': args.upload_dpi},
+                                  extraction=args.extraction, memory_limit=args.memory_limit):
+            all_valid = all_valid and item.is_valid
+            record = {'file': item.source, 'valid': item.is_valid}
+            record.update(item.result)
+            out.write(json.dumps(record, default=str) + '\n')
+            out.flush()
+    finally:
+        client.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0 if all_valid else 1
+
+
+def _triage(args) -> int:
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    limits = dict(TRIAGE_LIMITS, max_revisions=args.max_revisions, max_pages=args.max_pages,
+                  max_size=args.max_size)
+    screened = rejected = 0
+    start = time.perf_counter()
+    try:
+        for path, passed, result in iter_triage(expand_paths(args.paths), workers=args.workers, limits=limits):
+            screened += 1
+            rejected += not passed
+            if args.paths_only:
+                if passed:
+                    out.write(path + '\n')
+                continue
+            record = {'file': path, 'passed': passed}
+            record.update(result)
+            out.write(json.dumps(record) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{screened} files, {rejected} rejected in {elapsed:.2f} s "
+          f"({screened / elapsed if elapsed else 0:.0f} files/s)", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def _serve(args) -> int:
+    # Imported here so the other commands do not load the HTTP server
+    from estatementvalidator.service import ValidationService
+    from estatementvalidator.stub_server import StubServer
+
+    _apply_template(args)
+
+    stub = None
+    api_url = args.api_url
+    if args.stub:
+        summary = {'User_address': args.stub_address.replace('\\n', '\n'), 'Name': args.stub_name}
+        stub = StubServer(summary=summary, delay=args.stub_delay).start()
+        api_url = stub.url
+        print(f"Stub conversion service listening on {stub.url}", file=sys.stderr)
+
+    client = ConversionClient(pool_size=args.queue_size or (args.workers or os.cpu_count() or 1) * 4,
+                              read_timeout=args.api_timeout, retries=args.api_retries)
+    service = ValidationService(args.host, args.port, api_url=api_url, workers=args.workers,
+                                queue_size=args.queue_size, cache=open_cache(args.cache, args.cache_ttl),
+                                client=client, upload=args.upload, extraction=args.extraction,
+                                memory_limit=args.memory_limit)
+    print(f"Validation service listening on {service.url} with {service.workers} workers", file=sys.stderr)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.closing = True
+        service.server_close()
+        client.close()
+        if stub is not None:
+            stub.stop()
+    return 0
+
+
+def _add_template_arguments(command) -> None:
+    command.add_argument('--template', help='Check formats against this learned template file '
+                                            '(see learn-template)')
+    command.add_argument('--template-version', help='Template version to use (default: the current one)')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='estatementvalidator',
+                                     description='Validate Bank of China e-statements')
+    parser.add_argument('--log-level', default='WARNING',
+                        help='Log messages of this level and above to stderr (default: WARNING)')
+    parser.add_argument('--log-json', action='store_true', help='Log one JSON object per line')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    validate = commands.add_parser('validate', help='Validate PDF files or directories of PDF files in parallel, '
+                                                    'writing one JSON result per line')
+    validate.add_argument('paths', nargs='+', help='PDF files or directories')
+    validate.add_argument('-w', '--workers', type=int, default=None,
+                          help='Number of worker processes (default: number of CPUs)')
+    validate.add_argument('--api-url', default='http://localhost:8000', help='Base URL for the conversion API')
+    validate.add_argument('--unordered', action='store_true',
+                          help='Write results as they finish instead of in input order')
+    validate.add_argument('--local-only', action='store_true',
+                          help='Only run the producer, modification and QR decoding checks')
+    validate.add_argument('-o', '--output', help='Write results to this file instead of stdout')
+    validate.add_argument('--cache', help='Cache stage results in this SQLite file, or in this directory '
+                                          'if it exists or ends with a slash')
+    validate.add_argument('--forensics', action='store_true',
+                          help='Report every modification issue instead of stopping at the first')
+    validate.add_argument('--cache-ttl', type=float, default=None, help='Seconds a cached result stays valid')
+    validate.add_argument('--api-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                          help='Seconds to wait for a conversion API answer')
+    validate.add_argument('--api-retries', type=int, default=DEFAULT_RETRIES,
+                          help='Retries after a 5xx answer or a connection failure')
+    validate.add_argument('--upload', choices=UPLOAD_MODES, default=DEFAULT_UPLOAD['mode'],
+                          help='Send the PDF, its extracted text, or images of its first pages for extraction')
+    validate.add_argument('--upload-pages', type=int, default=DEFAULT_UPLOAD['pages'],
+                          help='Pages rendered with --upload images')
+    validate.add_argument('--upload-dpi', type=int, default=DEFAULT_UPLOAD['dpi'],
+                          help='Resolution of the pages rendered with --upload images')
+    validate.add_argument('--extraction', choices=EXTRACTION_MODES, default='llm',
+                          help="Always ask the API (llm), or read page 1 locally and ask the API only when "
+                               "unsure (auto) or never (local); a local answer has only four content fields")
+    validate.add_argument('--api-concurrency', type=int, default=None,
+                          help='Maximum conversion API requests in flight (default: one per worker)')
+    validate.add_argument('--memory-limit', type=float, default=None,
+                          help='Resident MB above which a worker gives up on a statement and reports an error')
+    _add_template_arguments(validate)
+    validate.set_defaults(func=_validate)
+
+    triage = commands.add_parser('triage', help='Screen PDF files by producer, revisions, page count and size '
+                                                'without parsing page content')
+    triage.add_argument('paths', nargs='+', help='PDF files or directories')
+    triage.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs)')
+    triage.add_argument('-o', '--output', help='Write results to this file instead of stdout')
+    triage.add_argument('--paths-only', action='store_true',
+                        help='Write only the paths of the files that pass, one per line')
+    triage.add_argument('--max-revisions', type=int, default=TRIAGE_LIMITS['max_revisions'],
+                        help='Incremental revisions allowed')
+    triage.add_argument('--max-pages', type=int, default=TRIAGE_LIMITS['max_pages'],
+                        help='Pages allowed (default: no limit)')
+    triage.add_argument('--max-size', type=int, default=TRIAGE_LIMITS['max_size'],
+                        help='Bytes allowed (default: no limit)')
+    triage.set_defaults(func=_triage)
+
+    serve = commands.add_parser('serve', help='Run the HTTP validation service: POST a PDF to /validate')
+    serve.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    serve.add_argument('--port', type=int, default=8080, help='Port to bind')
+    serve.add_argument('-w', '--workers', type=int, default=None,
+                       help='Number of worker processes (default: number of CPUs)')
+    serve.add_argument('--queue-size', type=int, default=None,
+                       help='Statements admitted at once before answering 429 (default: four per worker)')
+    serve.add_argument('--api-url', default='http://localhost:8000', help='Base URL for the conversion API')
+    serve.add_argument('--api-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                       help='Seconds to wait for a conversion API answer')
+    serve.add_argument('--api-retries', type=int, default=DEFAULT_RETRIES,
+                       help='Retries after a 5xx answer or a connection failure')
+    serve.add_argument('--cache', help='Cache stage results in this SQLite file, or in this directory '
+                                       'if it exists or ends with a slash')
+    serve.add_argument('--cache-ttl', type=float, default=None, help='Seconds a cached result stays valid')
+    serve.add_argument('--upload', choices=UPLOAD_MODES, default=DEFAULT_UPLOAD['mode'],
+                       help='Send the PDF, its extracted text, or images of its first pages for extraction')
+    serve.add_argument('--extraction', choices=EXTRACTION_MODES, default='llm',
+                       help="Always ask the API (llm), or read page 1 locally and ask the API only when "
+                            "unsure (auto) or never (local); a local answer has only four content fields")
+    serve.add_argument('--memory-limit', type=float, default=None,
+                       help='Resident MB above which a worker gives up on a statement and reports an error')
+    serve.add_argument('--stub', action='store_true',
+                       help='Start a stub conversion service in-process and use it instead of --api-url')
+    serve.add_argument('--stub-address', default='', help='User_address the stub returns (use \\n between lines)')
+    serve.add_argument('--stub-name', default='', help='Name the stub returns')
+    serve.add_argument('--stub-delay', type=float, default=0.0, help='Seconds of simulated model latency')
+    _add_template_arguments(serve)
+    serve.set_defaults(func=_serve)
+
+    learn = commands.add_parser('learn-template', help='Learn the template formats from genuine statements')
+    learn.add_argument('corpora', nargs='+', metavar='[VERSION=]DIRECTORY',
+                       help='Genuine statements of one template version each; a directory without a '
+                            'name gives the version its own name. The last version is the current one.')
+    learn.add_argument('-o', '--output', help='Write the template to this file instead of stdout')
+    learn.add_argument('-w', '--workers', type=int, default=None,
+                       help='Number of worker processes (default: number of CPUs)')
+    learn.add_argument('--engine', choices=sorted(RUN_ENGINES), default=DEFAULT_ENGINE,
+                       help='Character extraction engine; use the one you validate with')
+    learn.add_argument('--min-documents', type=int, default=1,
+                       help='Keep only formats found in at least this many statements')
+    learn.set_defaults(func=_learn_template)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level, json_format=args.log_json)
+    return args.func(args)
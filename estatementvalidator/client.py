@@ -0,0 +1,135 @@
+"""
+HTTP client for the conversion API.
+
+A ConversionClient keeps a pool of keep-alive connections, applies connect and
+read timeouts, retries 5xx answers and connection failures with jittered
+exponential backoff, and caps the number of requests in flight. It is
+thread-safe: share one client across a batch so every upload reuses the same
+pool. Calls that are not given a client use default_client().
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from estatementvalidator.timing import count
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# The model answers in one go, so the read timeout bounds the whole generation
+DEFAULT_READ_TIMEOUT = 600.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+
+def backoff_delay(attempt: int, backoff: float = DEFAULT_BACKOFF, backoff_max: float = DEFAULT_BACKOFF_MAX) -> float:
+    """Seconds to wait before retry `attempt` + 1: a random time up to backoff * 2**attempt ("full jitter")"""
+    return random.uniform(0, min(backoff_max, backoff * 2 ** attempt))
+
+
+class ConversionClient:
+    """
+    Pooled, retrying client for the conversion API.
+
+    Args:
+        pool_size (int): Keep-alive connections kept per host
+        max_in_flight (int): Requests allowed at once across all threads (default: pool_size)
+        connect_timeout (float): Seconds to establish a connection
+        read_timeout (float): Seconds to wait for the answer; a hung server fails
+            the request instead of blocking the worker forever
+        retries (int): Extra attempts after a 5xx answer or a connection failure
+        backoff (float): Base delay in seconds; attempt n waits a random time up to
+            backoff * 2**n ("full jitter"), at most backoff_max
+        backoff_max (float): Upper bound of a single delay
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_in_flight: Optional[int] = None,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_in_flight or pool_size)
+
+        # requests is only loaded by code that talks to the conversion API
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _delay(self, attempt: int) -> float:
+        return backoff_delay(attempt, self.backoff, self.backoff_max)
+
+    def post_file(self, url: str, name: str, data: bytes, params: Dict[str, Any],
+                  content_type: str = 'application/pdf') -> 'requests.Response':
+        """Upload `data` as the multipart field 'file' (see post_files)"""
+        return self.post_files(url, [('file', (name, data, content_type))], params)
+
+    def post_files(self, url: str, files: List[Tuple[str, Tuple[str, bytes, str]]],
+                   params: Dict[str, Any]) -> 'requests.Response':
+        """
+        Upload multipart files, given as [(field, (name, bytes, content type)), ...].
+
+        Returns the response, which is the last 5xx answer if every attempt failed
+        that way. Raises the last requests exception if every attempt failed to
+        connect, and immediately on a read timeout (the server got the request).
+        """
+        import requests
+        attempt = 0
+        while True:
+            try:
+                with self._slots:
+                    response = self.session.post(url, params=params, files=files, timeout=self.timeout)
+                if response.status_code < 500 or attempt >= self.retries:
+                    return response
+                reason = f"status {response.status_code}"
+                response.close()
+            except requests.ConnectionError as e:
+                # Includes connect timeouts; a read timeout is not retried
+                if attempt >= self.retries:
+                    raise
+                reason = str(e)
+
+            delay = self._delay(attempt)
+            attempt += 1
+            count('api_retries')
+            logger.warning("Conversion request to %s failed (%s), retry %d/%d in %.1f s",
+                           url, reason, attempt, self.retries, delay)
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_default_client = None
+_default_client_pid = None
+_default_client_lock = threading.Lock()
+
+
+def default_client() -> ConversionClient:
+    """The process-wide client used when none is passed; recreated after a fork"""
+    global _default_client, _default_client_pid
+    with _default_client_lock:
+        if _default_client is None or _default_client_pid != os.getpid():
+            _default_client = ConversionClient()
+            _default_client_pid = os.getpid()
+        return _default_client
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Union
+
+import fitz  # PyMuPDF
+
+from estatementvalidator.timing import count, stage
+
+# Anything the checks accept as a statement: a path, the PDF bytes, a binary
+# stream such as an upload, or an already opened StatementDocument
+DocumentSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO, 'StatementDocument']
+
+
+def is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_bytes(source) -> Union[bytes, bytearray]:
+    """
+    The PDF content of an in-memory source.
+
+    bytes and bytearray are used as they are, and so is the bytes or bytearray
+    a memoryview spans whole; only a slice or a view of another buffer is copied.
+    A binary stream is read from its current position to the end. A shared
+    buffer must not change while a document reads it.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    if isinstance(source, memoryview):
+        if isinstance(source.obj, (bytes, bytearray)) and source.contiguous and source.nbytes == len(source.obj):
+            return source.obj
+        return source.tobytes()
+    if hasattr(source, 'read'):
+        data = source.read()
+        if not isinstance(data, (bytes, bytearray)):
+            raise TypeError("Expected a binary stream, opened in 'rb' mode")
+        return data
+    raise TypeError(f"Expected a path, bytes, memoryview or binary stream, got {type(source).__name__}")
+
+
+def portable_source(source):
+    """`source` as a path or bytes, which can be sent to a worker process and opened more than once"""
+    if isinstance(source, StatementDocument):
+        return source.data
+    if is_path(source) or isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)) or hasattr(source, 'read'):
+        return source_bytes(source)
+    return source
+
+
+class StatementDocument:
+    """
+    A PDF statement that is read and parsed once and shared by every check.
+
+    The raw bytes are read from disk a single time and kept in memory, or
+    taken as they are from an in-memory source. The PyMuPDF and pdfplumber
+    documents are both opened from those bytes the first time a check asks
+    for them, and the upload to the conversion API sends the same buffer, so
+    a step that only uploads the file never parses it and nothing is written
+    to disk. A bytearray or memoryview is shared, not copied, so it must not
+    be modified while the document is open.
+
+    Args:
+        source (str | PathLike | bytes | bytearray | memoryview | BinaryIO): Path to
+                    the PDF file, the PDF content itself, or a binary stream
+                    (such as an uploaded file) read from its current position.
+        name (str): File name used when uploading the document. Defaults to
+                    the base name of the path or of the stream's name, or
+                    'document.pdf'.
+    """
+
+    def __init__(self, source, name=None):
+        if is_path(source):
+            self.path = os.fspath(source)
+            with open(self.path, 'rb') as f:
+                self.data = f.read()
+        else:
+            self.path = None
+            self.data = source_bytes(source)
+        count('bytes_read', len(self.data))
+
+        if name is None:
+            stream_name = getattr(source, 'name', None) if self.path is None else self.path
+            name = os.path.basename(stream_name) if isinstance(stream_name, str) and stream_name else 'document.pdf'
+        self.name = name
+
+        self._doc = None
+        self._plumber = None
+        self._sha256 = None
+
+    @property
+    def doc(self):
+        """PyMuPDF view of the document, opened on first access."""
+        if self._doc is None:
+            with stage('open'):
+                self._doc = fitz.open(stream=self.data, filetype="pdf")
+        return self._doc
+
+    @property
+    def plumber(self):
+        """pdfplumber view of the same bytes, opened on first access."""
+        if self._plumber is None:
+            with stage('open_pdfplumber'):
+                import pdfplumber
+                self._plumber = pdfplumber.open(io.BytesIO(self.data))
+        return self._plumber
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of the PDF bytes, computed on first access."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def page_count(self):
+        return len(self.doc)
+
+    def release_page(self, page_number):
+        """Drop what pdfplumber cached for one page: its chars and layout objects"""
+        if self._plumber is not None:
+            self._plumber.pages[page_number].close()
+            # pdfminer keeps every object it parsed, content streams included; the
+            # cache is private, so a pdfminer version without it is left alone
+            cached_objs = getattr(self._plumber.doc, '_cached_objs', None)
+            if cached_objs is not None:
+                cached_objs.clear()
+
+    def close(self):
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def __repr__(self):
+        return f"StatementDocument({self.name!r})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+@contextmanager
+def open_document(source):
+    """
+    Yield a StatementDocument for `source`.
+
+    An existing StatementDocument is passed through untouched and stays open
+    for the caller; anything else is opened here and closed on exit.
+    """
+    if isinstance(source, StatementDocument):
+        yield source
+        return
+
+    document = StatementDocument(source)
+    try:
+        yield document
+    finally:
+        document.close()
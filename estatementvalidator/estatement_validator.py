@@ -1,272 +1,637 @@
-import requests
-import os
 import json
 import re
-from typing import Tuple, Dict, Any
-from estatementvalidator.producer_check import producer_check
-from estatementvalidator.modify_check import modify_detect
-from estatementvalidator.img_qr_reader import qrcode_data
+from functools import lru_cache
+from typing import TYPE_CHECKING, Tuple, Dict, Any, Optional, Union
+from estatementvalidator.cache import ResultCache, ruleset_version
+from estatementvalidator.client import ConversionClient, default_client
+from estatementvalidator.document import DocumentSource, StatementDocument, open_document
+from estatementvalidator.producer_check import producer_check, Target_Producer
+from estatementvalidator.modify_check import modify_detect, template_formats, DEFAULT_ENGINE
+from estatementvalidator.img_qr_reader import decode_qrcode, QR_DECODE_LADDER
+from estatementvalidator.local_extractor import (
+    EXTRACTION_MODES, LOCAL_CONFIDENCE_THRESHOLD, LOCAL_LAYOUT, extract_fields, local_api_result
+)
+from estatementvalidator.pdf_qr2img import QR_LOCATOR
+from estatementvalidator.timing import count, stage, with_timings
+from estatementvalidator.triage_check import TRIAGE_LIMITS, triage
+from estatementvalidator.upload import (
+    COMPACT_SYSTEM_PROMPT, COMPACT_USER_PROMPT, build_upload, content_stage, upload_options, upload_size
+)
 
-def check_producer(file_path: str) -> Tuple[bool, Dict[str, Any]]:
+UploadOptions = Union[None, str, Dict[str, Any]]
+
+if TYPE_CHECKING:
+    import requests
+
+CONVERT_ENDPOINT = "/convert-pdf-with-images"
+
+# validate_document only needs the modification verdict, so by default the check
+# stops at the first issue; forensics=True asks for the exhaustive report instead
+FAIL_FAST_VIOLATIONS = 1
+
+# Conversion API parameters for the single extraction request. Its JSON answers both the
+# QR code address comparison (User_address) and the final extracted content.
+EXTRACTION_API_PARAMS = {
+    "max_tokens": 7500,
+    "temperature": 0.1,
+    "system_prompt": "Summarize the content into json",
+    "user_prompt": '''Summarize the content in English into json, must include {
+        "Name": "",
+        "Bank_code": "",
+        "User_address": "",
+        "Bank_address": "",
+        "Account_Number": "",
+        "Statement_Date": "",
+        "Account_type": "",
+        ...<Other Suitable data into sub-json>
+    }, if data do not provided use blank or null.
+    Make sure main details are totally correct.
+    "User_address" do not add any extra details that not shown in file, do not use comma to separate address new line.
+    only return json.''',
+    "model": "gemma-3-27b-it-qat"
+}
+
+@lru_cache(maxsize=8)
+def _ruleset_version(formats) -> str:
+    return ruleset_version(Target_Producer, formats, QR_LOCATOR, QR_DECODE_LADDER, CONVERT_ENDPOINT, EXTRACTION_API_PARAMS,
+                           COMPACT_SYSTEM_PROMPT, COMPACT_USER_PROMPT, LOCAL_LAYOUT, LOCAL_CONFIDENCE_THRESHOLD,
+                           TRIAGE_LIMITS)
+
+def current_ruleset_version() -> str:
+    """Version of the rules behind every cached stage result: producer, template formats, QR locator and ladder, prompts, local layout, triage limits"""
+    # Only the template formats change at run time; the digest is computed once per template
+    formats = template_formats()
+    try:
+        return _ruleset_version(tuple(formats))
+    except TypeError:  # Formats given as dicts or lists are not hashable
+        return _ruleset_version.__wrapped__(formats)
+
+def _cached_check(cache: Optional[ResultCache], document: StatementDocument, stage: str,
+                  check) -> Tuple[bool, Dict[str, Any]]:
+    """Return the cached (is_valid, result_data) of `stage`, or run `check` and cache its verdict"""
+    if cache is not None:
+        cached = cache.get(document, stage)
+        if cached is not None:
+            return cached[0], cached[1]
+
+    is_valid, result = check()
+
+    # Errors and API failures are transient, only verdicts are worth keeping
+    if cache is not None and result.get('result') != 'error' and 'api_error' not in result:
+        cache.set(document, stage, [is_valid, result])
+    return is_valid, result
+
+def _post_document(document: StatementDocument, api_endpoint: str, params: Dict[str, Any],
+                   client: Optional[ConversionClient] = None, upload: UploadOptions = None) -> 'requests.Response':
+    """Upload the in-memory PDF bytes, or the text or page images taken from them, to the conversion API"""
+    if client is None:
+        client = default_client()
+    with stage('prepare_upload'):
+        files, params = build_upload(document, params, upload)
+    count('bytes_uploaded', upload_size(files))
+    with stage('api_request'):
+        return client.post_files(api_endpoint, files, params)
+
+def _request_extraction(document: StatementDocument, api_url: str, client: Optional[ConversionClient] = None,
+                        upload: UploadOptions = None) -> 'requests.Response':
+    """Send the one extraction request shared by the QR code check and content extraction"""
+    return _post_document(document, f"{api_url}{CONVERT_ENDPOINT}", EXTRACTION_API_PARAMS, client, upload)
+
+def _local_answer(document: StatementDocument, qr_data: Optional[str],
+                  extraction: str = 'llm') -> Optional[Dict[str, Any]]:
+    """The local extraction result if it can stand in for the conversion API's, None to ask the model"""
+    if extraction not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode '{extraction}', expected one of {EXTRACTION_MODES}")
+    if extraction == 'llm':
+        return None
+    with stage('local_extract'):
+        api_result = local_api_result(extract_fields(document))
+    if extraction == 'local':
+        return api_result
+    # A low confidence or an address mismatch may be a misread layout, which the model settles
+    if api_result['confidence'] < LOCAL_CONFIDENCE_THRESHOLD or not compare_qrcode_address(api_result, qr_data)[0]:
+        count('local_fallbacks')
+        return None
+    return api_result
+
+def check_producer(file_path: DocumentSource, cache: Optional[ResultCache] = None,
+                   timings: bool = False) -> Tuple[bool, Dict[str, Any]]:
     """
     Check the producer of the PDF document
     
     Args:
-        file_path (str): Path to the PDF file
+        file_path (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+        cache (ResultCache): Result cache to consult and fill, if any
+        timings (bool): Add a 'timings' breakdown to the result: seconds per stage and
+            sub-stage, bytes read and pages processed
         
     Returns:
         Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
     """
-    try:
-        is_valid = producer_check(file_path)
+    return with_timings(timings, _check_producer, file_path, cache)
+
+def _check_producer(file_path: DocumentSource, cache: Optional[ResultCache]) -> Tuple[bool, Dict[str, Any]]:
+    def check():
+        is_valid = producer_check(document)
         return is_valid, {
             'result': 'pass' if is_valid else 'fail',
             'producer': str(is_valid).lower()
         }
+
+    try:
+        with stage('producer'), open_document(file_path) as document:
+            return _cached_check(cache, document, 'producer', check)
     except Exception as e:
         return False, {
             'result': 'error',
             'message': str(e)
         }
 
-def check_modification(file_path: str) -> Tuple[bool, Dict[str, Any]]:
+def check_modification(file_path: DocumentSource, engine: str = DEFAULT_ENGINE,
+                       cache: Optional[ResultCache] = None, max_violations: Optional[int] = None,
+                       workers: Optional[int] = None, timings: bool = False,
+                       memory_limit: Optional[float] = None) -> Tuple[bool, Dict[str, Any]]:
     """
     Check if the PDF document has been modified
     
     Args:
-        file_path (str): Path to the PDF file
+        file_path (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+        engine (str): Character extraction engine, 'pdfplumber' (default) or the
+            faster 'pymupdf', which reports every color as sRGB
+        cache (ResultCache): Result cache to consult and fill, if any
+        max_violations (int): Stop after this many issues and skip the remaining
+            pages (fail-fast); None reports every issue (full forensics)
+        workers (int): Scan the pages in this many worker processes (page-sharded);
+            worth it for long statements. The report is the same either way.
+        timings (bool): Add a 'timings' breakdown to the result: seconds per stage and
+            sub-stage, bytes read and pages processed
+            (pages scanned by page workers are not timed)
+        memory_limit (float): Resident set size in MB above which the page scan stops
+            with an 'error' result; the process-wide set_memory_limit() if None
         
     Returns:
         Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
     """
-    try:
-        is_valid, modify_result = modify_detect(file_path)
+    return with_timings(timings, _check_modification, file_path, engine, cache, max_violations, workers,
+                        memory_limit)
+
+def _check_modification(file_path: DocumentSource, engine: str, cache: Optional[ResultCache],
+                        max_violations: Optional[int], workers: Optional[int],
+                        memory_limit: Optional[float] = None) -> Tuple[bool, Dict[str, Any]]:
+    def check():
+        report = {}
+        is_valid, modify_result = modify_detect(document, engine=engine, max_violations=max_violations,
+                                                workers=workers, report=report, memory_limit=memory_limit)
         return is_valid, {
             'result': 'pass' if is_valid else 'fail',
             'modify': str(is_valid).lower(),
-            'modify_result': modify_result
+            'modify_result': modify_result,
+            **report
         }
+
+    try:
+        with stage('modification'), open_document(file_path) as document:
+            key = f'modification.{engine}' if max_violations is None else f'modification.{engine}.{max_violations}'
+            return _cached_check(cache, document, key, check)
     except Exception as e:
         return False, {
             'result': 'error',
             'message': str(e)
         }
 
-def check_qrcode(file_path: str, output_img: str = 'test.png', api_url: str = "http://localhost:8000") -> Tuple[bool, Dict[str, Any]]:
+def check_qrcode(file_path: DocumentSource, output_img: Optional[str] = None, api_url: str = "http://localhost:8000",
+                 qr_data: Optional[str] = None, api_result: Optional[Dict[str, Any]] = None,
+                 cache: Optional[ResultCache] = None, timings: bool = False,
+                 client: Optional[ConversionClient] = None, upload: UploadOptions = None,
+                 extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
     """
     Check QR codes in the PDF document and compare with extracted content
     
     Args:
-        file_path (str): Path to the PDF file
-        output_img (str): Path to save the QR code image
+        file_path (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+        output_img (str): Debug only: also save the rendered QR code area to this PNG.
+            The QR code is decoded in memory either way.
         api_url (str): Base URL for the API
+        qr_data (str): Already decoded QR code data; decoded from the document if None
+        api_result (Dict[str, Any]): Already received extraction result (as returned by
+            extract_content); the extraction request is only sent if None
+        cache (ResultCache): Result cache to consult and fill, if any. Only used when
+            neither qr_data nor api_result is given.
+        timings (bool): Add a 'timings' breakdown to the result: seconds per stage and
+            sub-stage, bytes read and pages processed
+        client (ConversionClient): Pooled client for the conversion API; the
+            process-wide default_client() if None
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages; a dict also sets the
+            'pages' and 'dpi' of the images
+        extraction (str): How User_address is read: 'llm' (default) always asks the
+            conversion API; 'auto' reads page 1 locally and only asks the API when the
+            local confidence is low or the address does not match, 'local' never asks it
         
     Returns:
         Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
     """
+    return with_timings(timings, _check_qrcode_document, file_path, output_img, api_url, qr_data, api_result,
+                        cache, client, upload, extraction)
+
+def _check_qrcode_document(file_path: DocumentSource, output_img: Optional[str], api_url: str,
+                           qr_data: Optional[str], api_result: Optional[Dict[str, Any]],
+                           cache: Optional[ResultCache], client: Optional[ConversionClient],
+                           upload: UploadOptions, extraction: str) -> Tuple[bool, Dict[str, Any]]:
+    try:
+        with stage('qrcode'), open_document(file_path) as document:
+            def check():
+                return _check_qrcode(document, output_img, api_url, qr_data, api_result, client, upload, extraction)
+
+            if qr_data is not None or api_result is not None:
+                return check()
+            # 'qrcode', or e.g. 'qrcode.text' for an answer extracted from the text layer,
+            # 'qrcode.auto' with local extraction; 'qrcode.local' for one that never asked the model
+            key = ('qrcode.local' if extraction == 'local'
+                   else content_stage(upload_options(upload), extraction, prefix='qrcode'))
+            return _cached_check(cache, document, key, check)
+    except Exception as e:
+        return False, {
+            'result': 'error',
+            'message': str(e)
+        }
+
+def _check_qrcode(document: StatementDocument, output_img: Optional[str], api_url: str,
+                  qr_data: Optional[str], api_result: Optional[Dict[str, Any]],
+                  client: Optional[ConversionClient] = None, upload: UploadOptions = None,
+                  extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
     try:
         # Get QR code data
-        qr_data = qrcode_data(file_path, output_img)
-        
-        # Call API to convert PDF
-        api_endpoint = f"{api_url}/convert-pdf-with-images"
-        params = {
-            "max_tokens": 2000,
-            "temperature": 0.1,
-            "system_prompt": "Summarize the content into json",
-            "user_prompt": '''Summarize the content in English into json, must include {
-                "Name": "",
-                "Bank_code": "",
-                "User_address": "",
-                "Bank_address": "",
-                "Account_Number": "",
-                "Statement_Date": "",
-                "Account_type": "",
-                ...<other data>
-            Make sure main details are totally correct.
-            "User_address" do not add any extra details that not shown in file, do not use comma to separate address new line.
-            only return json.''',
-            "model": "gemma-3-27b-it-qat"
+        qr_rung = None
+        if qr_data is None:
+            qr_data, qr_rung = decode_qrcode(document, output_img)
+
+        # Read the address locally if the layout is clear enough
+        if api_result is None:
+            api_result = _local_answer(document, qr_data, extraction)
+
+        # Call API to convert PDF, unless the caller already did
+        if api_result is None:
+            response = _request_extraction(document, api_url, client, upload)
+
+            if response.status_code != 200:
+                return _qrcode_api_failure(response.status_code)
+
+            api_result = response.json()
+
+        # Compare the extracted address with the QR code
+        with stage('compare'):
+            is_valid, result = compare_qrcode_address(api_result, qr_data)
+        if qr_rung is not None:
+            result['qrcode_rung'] = qr_rung
+        return is_valid, result
+
+    except Exception as e:
+        return False, {
+            'result': 'error',
+            'message': str(e)
         }
 
-        with open(file_path, 'rb') as f:
-            files = {'file': (os.path.basename(file_path), f, 'application/pdf')}
-            response = requests.post(api_endpoint, params=params, files=files)
+def _cached_decode_qrcode(document: StatementDocument, output_img: Optional[str],
+                          cache: Optional[ResultCache]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Decode the QR code, or take the decoded data and its ladder rung from the cache"""
+    if cache is not None:
+        cached = cache.get(document, 'qrcode_data')
+        if cached is not None:
+            return cached['qr_data'], cached['qr_rung']
 
-        if response.status_code != 200:
-            return False, {
-                'result': 'fail',
-                'qrcode': 'false',
-                'api_error': f'Failed to process PDF content (Status: {response.status_code})'
-            }
+    qr_data, qr_rung = decode_qrcode(document, output_img)
+    # Like _cached_check, a failure is not cached: the next run decodes again
+    if cache is not None and qr_data is not None:
+        cache.set(document, 'qrcode_data', {'qr_data': qr_data, 'qr_rung': qr_rung})
+    return qr_data, qr_rung
 
-        # Store the API response
-        api_result = response.json()
-
-        try:
-            # Extract the nested JSON from the result
-            json_str_match = re.search(r'```json\n(.*?)\n```', api_result.get('result', ''), re.DOTALL)
-
-            if not json_str_match:
-                # If no ```json ``` found, try to parse the entire result string if it looks like JSON
-                json_str_match = re.search(r'({.*})', api_result.get('result', ''), re.DOTALL)
-
-            if json_str_match:
-                # Clean the JSON string
-                json_content = json_str_match.group(1).strip()
-                # Remove any potential trailing commas before closing brackets/braces
-                json_content = re.sub(r',\s*}', '}', json_content)
-                json_content = re.sub(r',\s*]', ']', json_content)
-
-                pdf_data = json.loads(json_content)
-                # Compare user address from PDF with QR code data
-                pdf_address = pdf_data.get('User_address', '').strip().replace('\n', ' ').replace(',','') # Normalize address
-                qr_address = qr_data.replace('Address: ', '').strip().replace('\n', ' ').replace(',','') # Normalize address
-
-                # Simple comparison (consider more robust comparison if needed)
-                if pdf_address == qr_address:
-                    return True, {
-                        'result': 'pass',
-                        'qrcode': 'true',
-                        'qrcode_data': qr_data,
-                        'api_result': api_result
-                    }
-                else:
-                    return False, {
-                        'result': 'fail',
-                        'qrcode': 'false',
-                        'qr_result': {
-                            'result': f'Address mismatch:\nPDF Address: `{pdf_address}`\nQR Code Address: `{qr_address}`'
-                        }
-                    }
+def _qrcode_api_failure(status_code: int) -> Tuple[bool, Dict[str, Any]]:
+    return False, {
+        'result': 'fail',
+        'qrcode': 'false',
+        'api_error': f'Failed to process PDF content (Status: {status_code})'
+    }
+
+def parse_extraction(api_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Parse the statement JSON out of a conversion API result
+    
+    Args:
+        api_result (Dict[str, Any]): JSON response of the conversion API
+        
+    Returns:
+        Optional[Dict[str, Any]]: The parsed statement fields, or None if the result
+            holds no JSON object (raises json.JSONDecodeError if it is malformed)
+    """
+    # Extract the nested JSON from the result
+    json_str_match = re.search(r'```json\n(.*?)\n```', api_result.get('result', ''), re.DOTALL)
+
+    if not json_str_match:
+        # If no ```json ``` found, try to parse the entire result string if it looks like JSON
+        json_str_match = re.search(r'({.*})', api_result.get('result', ''), re.DOTALL)
+
+    if not json_str_match:
+        return None
+
+    # Clean the JSON string
+    json_content = json_str_match.group(1).strip()
+    # Remove any potential trailing commas before closing brackets/braces
+    json_content = re.sub(r',\s*}', '}', json_content)
+    json_content = re.sub(r',\s*]', ']', json_content)
+
+    return json.loads(json_content)
+
+def compare_qrcode_address(api_result: Dict[str, Any], qr_data: Optional[str]) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Compare the User_address in a conversion API result with the QR code address
+    
+    Args:
+        api_result (Dict[str, Any]): JSON response of the conversion API
+        qr_data (str): QR code data as returned by qrcode_data or decode_qrcode
+        
+    Returns:
+        Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
+    """
+    try:
+        pdf_data = parse_extraction(api_result)
+
+        if pdf_data is not None:
+            # Compare user address from PDF with QR code data
+            pdf_address = pdf_data.get('User_address', '').strip().replace('\n', ' ').replace(',','') # Normalize address
+            qr_address = qr_data.replace('Address: ', '').strip().replace('\n', ' ').replace(',','') # Normalize address
+
+            # Simple comparison (consider more robust comparison if needed)
+            if pdf_address == qr_address:
+                return True, {
+                    'result': 'pass',
+                    'qrcode': 'true',
+                    'qrcode_data': qr_data,
+                    'api_result': api_result,
+                    'content_data': pdf_data
+                }
             else:
                 return False, {
                     'result': 'fail',
-                    'qrcode': 'unknown',
-                    'api_error': 'Failed to find or parse JSON in response'
+                    'qrcode': 'false',
+                    'qr_result': {
+                        'result': f'Address mismatch:\nPDF Address: `{pdf_address}`\nQR Code Address: `{qr_address}`'
+                    }
                 }
-        except json.JSONDecodeError as e:
-            return False, {
-                'result': 'fail',
-                'qrcode': 'unknown',
-                'api_error': f'JSON parsing error: {str(e)}'
-            }
-        except Exception as e:
+        else:
             return False, {
                 'result': 'fail',
                 'qrcode': 'unknown',
-                'api_error': f'Error processing response: {str(e)}'
+                'api_error': 'Failed to find or parse JSON in response'
             }
-
+    except json.JSONDecodeError as e:
+        return False, {
+            'result': 'fail',
+            'qrcode': 'unknown',
+            'api_error': f'JSON parsing error: {str(e)}'
+        }
     except Exception as e:
         return False, {
-            'result': 'error',
-            'message': str(e)
+            'result': 'fail',
+            'qrcode': 'unknown',
+            'api_error': f'Error processing response: {str(e)}'
         }
 
-def extract_content(file_path: str, api_url: str = "http://localhost:8000") -> Dict[str, Any]:
+def extract_content(file_path: DocumentSource, api_url: str = "http://localhost:8000",
+                    cache: Optional[ResultCache] = None, client: Optional[ConversionClient] = None,
+                    upload: UploadOptions = None) -> Dict[str, Any]:
     """
     Extract content from the PDF document
     
     Args:
-        file_path (str): Path to the PDF file
+        file_path (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
         api_url (str): Base URL for the API
+        cache (ResultCache): Result cache to consult and fill, if any
+        client (ConversionClient): Pooled client for the conversion API; the
+            process-wide default_client() if None
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages; a dict also sets the
+            'pages' and 'dpi' of the images
         
     Returns:
         Dict[str, Any]: Extracted content (in JSON format)
     """
     try:
-        api_endpoint = f"{api_url}/convert-pdf-with-images"
-        params = {
-            "max_tokens": 7500,
-            "temperature": 0.1,
-            "system_prompt": "Summarize the content into json",
-            "user_prompt": '''Summarize the content in English into json, must include {
-                "Name": "",
-                "Bank_code": "",
-                "User_address": "",
-                "Bank_address": "",
-                "Account_Number": "",
-                "Statement_Date": "",
-                "Account_type": "",
-                ...<Other Suitable data into sub-json>
-            }, if data do not provided use blank or null.
-            only return json.'''
-        }
-        
-        with open(file_path, 'rb') as f:
-            files = {'file': (os.path.basename(file_path), f, 'application/pdf')}
-            response = requests.post(api_endpoint, params=params, files=files)
-            
-        if response.status_code != 200:
-            raise Exception("Failed to extract content from PDF")
+        with open_document(file_path) as document:
+            key = content_stage(upload_options(upload))
+            content = cache.get(document, key) if cache is not None else None
+            if content is not None:
+                return content
+
+            response = _request_extraction(document, api_url, client, upload)
             
-        return response.json()
+            if response.status_code != 200:
+                raise Exception("Failed to extract content from PDF")
+
+            content = response.json()
+            if cache is not None:
+                cache.set(document, key, content)
+            return content
     except Exception as e:
         raise Exception(f"Error extracting content: {str(e)}")
 
-def validate_document(file_path: str, api_url: str = "http://localhost:8000") -> Tuple[bool, Dict[str, Any]]:
+def validate_document(file_path: DocumentSource, api_url: str = "http://localhost:8000",
+                      cache: Optional[ResultCache] = None, forensics: bool = False,
+                      page_workers: Optional[int] = None, timings: bool = False,
+                      client: Optional[ConversionClient] = None,
+                      upload: UploadOptions = None, extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
     """
     Perform all validation steps
     
     Args:
-        file_path (str): Path to the PDF file
+        file_path (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
         api_url (str): Base URL for the API
+        cache (ResultCache): Result cache to consult and fill, if any. A statement that
+            was validated before under the same rules skips the checks it already passed.
+        forensics (bool): Report every modification issue instead of stopping at the first
+        page_workers (int): Worker processes for the page-sharded modification check of a
+            long statement; pages are scanned in this process if None
+        timings (bool): Add a 'timings' breakdown to the result: seconds per stage and
+            sub-stage, bytes read and pages processed
+        client (ConversionClient): Pooled client for the conversion API; the
+            process-wide default_client() if None
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages; a dict also sets the
+            'pages' and 'dpi' of the images
+        extraction (str): How the content is read: 'llm' (default) always asks the
+            conversion API; 'auto' reads page 1 locally and only asks the API when the
+            local confidence is low or the address does not match, 'local' never asks it
+            With a local answer, 'content' holds only Name, User_address,
+            Account_Number and Statement_Date.
         
     Returns:
         Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
     """
-    try:
-        # Step 1: Producer check
-        producer_valid, producer_result = check_producer(file_path)
-        if not producer_valid:
-            return False, {
-                'result': 'fail',
-                'producer': 'false',
-                'modify': 'unknown',
-                'qrcode': 'unknown',
-                'message':'Producer check failed'
-            }
+    return with_timings(timings, _open_and_validate, file_path, api_url, cache, forensics, page_workers, client,
+                        upload, extraction)
 
-        # Step 2: Modification check
-        modify_valid, modify_result = check_modification(file_path)
-        if not modify_valid:
-            return False, {
-                'result': 'fail',
-                'producer': 'true',
-                'modify': 'false',
-                'qrcode': 'unknown',
-                'modify_result': modify_result.get('modify_result'),
-                'message':'Modification check failed'
-            }
+def _open_and_validate(file_path: DocumentSource, api_url: str, cache: Optional[ResultCache],
+                       forensics: bool, page_workers: Optional[int], client: Optional[ConversionClient],
+                       upload: UploadOptions, extraction: str) -> Tuple[bool, Dict[str, Any]]:
+    try:
+        # Open the PDF once and share it across every step
+        with open_document(file_path) as document:
+            return _validate_document(document, api_url, cache, forensics, page_workers, client, upload,
+                                      extraction)
+    except Exception as e:
+        return False, {
+            'result': 'error',
+            'message': str(e)
+        }
 
-        # Step 3: QR code check
-        qrcode_valid, qrcode_result = check_qrcode(file_path, api_url=api_url)
-        if not qrcode_valid:
-            return False, {
-                'result': 'fail',
-                'producer': 'true',
-                'modify': 'true',
-                'qrcode': 'false',
-                'qr_result': qrcode_result.get('qr_result'),
-                'message':'QR code check failed'
-            }
+def run_local_checks(document: StatementDocument, output_img: Optional[str] = None,
+                     cache: Optional[ResultCache] = None, forensics: bool = False,
+                     page_workers: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Run the CPU-bound steps: triage, producer check, modification check and QR code decoding
+    
+    Args:
+        document (StatementDocument): The opened PDF document
+        output_img (str): Debug only: also save the rendered QR code area to this PNG
+        cache (ResultCache): Result cache to consult and fill, if any
+        forensics (bool): Report every modification issue instead of stopping at the first
+        page_workers (int): Worker processes for the page-sharded modification check
+        
+    Returns:
+        Tuple: (failure_result, qr_data, qr_rung), where failure_result is None if the
+            document may go on to the API steps and qr_rung is the QR_DECODE_LADDER
+            rung that decoded the QR code
+    """
+    # Step 0: Structural triage, before any page content is parsed
+    triage_passed, triage_result = triage(document)
+    if triage_result['result'] == 'error':
+        return triage_result, None, None
+    # A wrong producer is reported by the producer check below, as it always was
+    if not triage_passed and triage_result['producer'] == Target_Producer:
+        return {
+            'result': 'fail',
+            'producer': 'true',
+            'modify': 'unknown',
+            'qrcode': 'unknown',
+            'triage_result': triage_result,
+            'message': 'Triage failed'
+        }, None, None
 
-        # Extract content
-        content = extract_content(file_path, api_url=api_url)
+    # Step 1: Producer check
+    producer_valid, producer_result = check_producer(document, cache=cache)
+    if not producer_valid:
+        return {
+            'result': 'fail',
+            'producer': 'false',
+            'modify': 'unknown',
+            'qrcode': 'unknown',
+            'message':'Producer check failed'
+        }, None, None
 
-        # All checks passed
-        return True, {
-            'result': 'pass',
+    # Step 2: Modification check
+    modify_valid, modify_result = check_modification(
+        document, cache=cache, max_violations=None if forensics else FAIL_FAST_VIOLATIONS, workers=page_workers)
+    if modify_result['result'] == 'error':
+        # E.g. the memory ceiling was reached: no verdict, not a modified statement
+        return modify_result, None, None
+    if not modify_valid:
+        return {
+            'result': 'fail',
             'producer': 'true',
-            'modify': 'true',
-            'qrcode': 'true',
-            'content': content,
-            'message':'All checks passed'
-        }
+            'modify': 'false',
+            'qrcode': 'unknown',
+            'modify_result': modify_result.get('modify_result'),
+            'format_violations': modify_result.get('format_violations'),
+            'overlay_issues': modify_result.get('overlay_issues'),
+            'revisions': modify_result.get('revisions'),
+            'message':'Modification check failed'
+        }, None, None
 
-    except Exception as e:
-        return False, {
-            'result': 'error',
-            'message': str(e)
-        } 
\ No newline at end of file
+    # Step 3a: Decode the QR code locally
+    return (None, *_cached_decode_qrcode(document, output_img, cache))
+
+def run_remote_checks(document: StatementDocument, qr_data: Optional[str], api_url: str = "http://localhost:8000",
+                      cache: Optional[ResultCache] = None, qr_rung: Optional[Dict[str, Any]] = None,
+                      client: Optional[ConversionClient] = None,
+                      upload: UploadOptions = None, extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
+    """
+    Run the API-bound steps: QR code comparison and content extraction
+    
+    Args:
+        document (StatementDocument): The opened PDF document
+        qr_data (str): QR code data decoded by run_local_checks
+        api_url (str): Base URL for the API
+        cache (ResultCache): Result cache to consult and fill, if any
+        qr_rung (Dict[str, Any]): Decode ladder rung reported by run_local_checks
+        client (ConversionClient): Pooled client for the conversion API; the
+            process-wide default_client() if None
+        upload (str | dict): What the extraction request sends: 'pdf' (default), the
+            extracted 'text', or 'images' of the first pages; a dict also sets the
+            'pages' and 'dpi' of the images
+        extraction (str): How the content is read: 'llm' (default) always asks the
+            conversion API; 'auto' reads page 1 locally and only asks the API when the
+            local confidence is low or the address does not match, 'local' never asks it
+        
+    Returns:
+        Tuple[bool, Dict[str, Any]]: (is_valid, result_data)
+    """
+    # Step 3b: Page 1 read locally, or one extraction request, serves both the QR code
+    # comparison and the content
+    key = content_stage(upload_options(upload), extraction)
+    content = cache.get(document, key) if cache is not None and extraction != 'local' else None
+    if content is None:
+        content = _local_answer(document, qr_data, extraction)
+    if content is None:
+        response = _request_extraction(document, api_url, client, upload)
+        if response.status_code == 200:
+            content = response.json()
+            if cache is not None:
+                cache.set(document, key, content)
+    if content is None:
+        qrcode_valid, qrcode_result = _qrcode_api_failure(response.status_code)
+    else:
+        qrcode_valid, qrcode_result = check_qrcode(document, api_url=api_url, qr_data=qr_data, api_result=content)
+    if not qrcode_valid:
+        return False, _qrcode_failed_result(qrcode_result, qr_rung)
+
+    # All checks passed; the extraction result is the content, already parsed once
+    return True, _all_passed_result(content, qrcode_result.get('content_data'), qr_rung)
+
+def _qrcode_failed_result(qrcode_result: Dict[str, Any], qr_rung: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        'result': 'fail',
+        'producer': 'true',
+        'modify': 'true',
+        'qrcode': 'false',
+        'qr_result': qrcode_result.get('qr_result'),
+        'qrcode_rung': qr_rung,
+        'message':'QR code check failed'
+    }
+
+def _all_passed_result(content: Dict[str, Any], content_data: Optional[Dict[str, Any]],
+                       qr_rung: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        'result': 'pass',
+        'producer': 'true',
+        'modify': 'true',
+        'qrcode': 'true',
+        'qrcode_rung': qr_rung,
+        'content': content,
+        'content_data': content_data,
+        'message':'All checks passed'
+    }
+
+def _validate_document(document: StatementDocument, api_url: str, cache: Optional[ResultCache] = None,
+                       forensics: bool = False, page_workers: Optional[int] = None,
+                       client: Optional[ConversionClient] = None,
+                       upload: UploadOptions = None, extraction: str = 'llm') -> Tuple[bool, Dict[str, Any]]:
+    failure_result, qr_data, qr_rung = run_local_checks(document, cache=cache, forensics=forensics,
+                                                        page_workers=page_workers)
+    if failure_result is not None:
+        return False, failure_result
+    return run_remote_checks(document, qr_data, api_url, cache, qr_rung, client, upload, extraction)
@@ -1,8 +1,12 @@
-from PIL import Image, UnidentifiedImageError, ImageOps
-import pyzbar.pyzbar as pyzbar
+import fitz  # PyMuPDF
+import logging
 import os
 import time
-from estatementvalidator.pdf_qr2img import qr2img
+from estatementvalidator.document import open_document
+from estatementvalidator.pdf_qr2img import QR_LOCATOR, embedded_qr_pixmap, locate_qr, qr2pixmap, save_pixmap_png
+from estatementvalidator.timing import stage
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration for Debugging ---
 DEBUG_SAVE_IMAGES = False  # Set to True to save processed images for inspection
@@ -29,158 +33,314 @@ def extract_qr_data_from_image(image_path, upscale_factor=1, try_threshold=False
               from a found QR code. Returns an empty list if no QR codes
               are found or an error occurs.
     """
-    found_qr_data = set() # Use set for auto-uniqueness
     if not os.path.exists(image_path):
-        print(f"Error: Image file not found at {image_path}")
+        logger.error("Image file not found at %s", image_path)
         return []
 
-    print(f"Processing image: {image_path}")
+    logger.debug("Processing image: %s", image_path)
     base_filename = os.path.splitext(os.path.basename(image_path))[0]
+    from PIL import Image, UnidentifiedImageError
 
     try:
         # --- 1. Load Image with Pillow ---
         pil_image = Image.open(image_path)
         img_width, img_height = pil_image.size
-        print(f"  Image size: {img_width}x{img_height}")
+        logger.debug("Image size: %dx%d", img_width, img_height)
 
         if DEBUG_SAVE_IMAGES:
              ts = int(time.time() * 1000)
              debug_path = os.path.join(DEBUG_FOLDER, f"{base_filename}_original_{ts}.png")
              try:
                  pil_image.save(debug_path)
-                 print(f"  [Debug] Saved Original image to: {debug_path}")
+                 logger.debug("Saved original image to: %s", debug_path)
              except Exception as save_e:
-                 print(f"  [Debug] Failed to save original image: {save_e}")
-
+                 logger.warning("Failed to save original image: %s", save_e)
 
-        # --- 2. Preprocessing ---
         # Convert to Grayscale first (almost always beneficial for QR)
         pil_image_gray = pil_image.convert('L')
-
-        # Attempt decoding on original grayscale first
-        print("  Attempt 1: Decoding original grayscale...")
-        decoded_objects = pyzbar.decode(pil_image_gray)
-        if decoded_objects:
-             print(f"  Found {len(decoded_objects)} barcode(s) in original grayscale.")
-             for obj in decoded_objects:
-                  if obj.type == 'QRCODE':
-                      try:
-                           data = obj.data.decode('utf-8')
-                           print(f"    SUCCESS (Original Gray): Found QR Code!")
-                           found_qr_data.add(data)
-                      except UnicodeDecodeError:
-                           print(f"    WARNING (Original Gray): Found QR but couldn't decode UTF-8. Data: {obj.data}")
-
-
-        # --- 3. Optional Upscaling and Thresholding ---
-        if upscale_factor > 1 or try_threshold:
-            print(f"\n  Attempt 2: Preprocessing (U={upscale_factor}, T={try_threshold})...")
-            image_to_process = pil_image_gray # Start with grayscale
-
-            # Apply Upscaling if needed
-            if upscale_factor > 1:
-                new_size = (img_width * upscale_factor, img_height * upscale_factor)
-                print(f"    Upscaling by {upscale_factor}x to {new_size} using LANCZOS...")
-                try:
-                    image_to_process = image_to_process.resize(new_size, Image.LANCZOS)
-                except Exception as resize_e:
-                     print(f"    Error during resize: {resize_e}")
-                     # Continue with non-upscaled image if resize fails
-
-            # Apply Thresholding if needed
-            if try_threshold:
-                print("    Applying autocontrast and thresholding...")
-                try:
-                    # Autocontrast might help first
-                    image_processed = ImageOps.autocontrast(image_to_process, cutoff=5)
-                    # Simple threshold - adjust 128 if needed
-                    image_processed = image_processed.point(lambda x: 0 if x < 128 else 255, '1')
-                    image_to_process = image_processed # Use the thresholded image
-                except Exception as thresh_e:
-                     print(f"    Error during thresholding: {thresh_e}")
-                     # Continue with potentially only upscaled image if threshold fails
-
-            if DEBUG_SAVE_IMAGES:
-                 ts = int(time.time() * 1000)
-                 debug_path = os.path.join(DEBUG_FOLDER, f"{base_filename}_processed_U{upscale_factor}_T{try_threshold}_{ts}.png")
-                 try:
-                    image_to_process.save(debug_path)
-                    print(f"    [Debug] Saved Processed image to: {debug_path}")
-                 except Exception as save_e:
-                    print(f"    [Debug] Failed to save processed image: {save_e}")
-
-            # Decode the processed (upscaled/thresholded) image
-            print("    Decoding processed image...")
-            decoded_objects_processed = pyzbar.decode(image_to_process)
-
-            if decoded_objects_processed:
-                 print(f"    Found {len(decoded_objects_processed)} barcode(s) in processed image.")
-                 for obj in decoded_objects_processed:
-                    if obj.type == 'QRCODE':
-                        try:
-                            data = obj.data.decode('utf-8')
-                            print(f"      SUCCESS (Processed): Found QR Code!")
-                            found_qr_data.add(data) # Add to set (handles duplicates)
-                        except UnicodeDecodeError:
-                            print(f"      WARNING (Processed): Found QR but couldn't decode UTF-8. Data: {obj.data}")
+        return _extract_qr_data(pil_image_gray, lambda: pil_image_gray, base_filename,
+                                upscale_factor, try_threshold)
 
     except UnidentifiedImageError:
-        print(f"Error: Pillow cannot identify image file format for {image_path}")
+        logger.error("Pillow cannot identify image file format for %s", image_path)
     except Exception as e:
-        print(f"An error occurred processing image {image_path}: {e}")
+        logger.error("An error occurred processing image %s: %s", image_path, e)
+
+    return []
+
+def extract_qr_data_from_pixmap(pix, upscale_factor=1, try_threshold=False, try_original=True):
+    """
+    Extracts QR code data from a rendered PyMuPDF pixmap, without writing or
+    reading an image file.
+
+    The grayscale samples are handed to pyzbar as a raw (pixels, width, height)
+    buffer. A Pillow image is only wrapped around the same buffer when
+    upscaling or thresholding is requested.
+
+    Args:
+        pix (fitz.Pixmap): Rendered image, ideally grayscale without alpha
+                           (as returned by qr2pixmap); converted otherwise.
+        upscale_factor (int): See extract_qr_data_from_image.
+        try_threshold (bool): See extract_qr_data_from_image.
+        try_original (bool): Whether to decode the unprocessed image first;
+                             False skips straight to the preprocessed attempt.
+
+    Returns:
+        list: A list of unique strings decoded from the QR codes found.
+
+    Raises:
+        ImportError, OSError: pyzbar or the zbar library can't be loaded.
+    """
+    try:
+        if pix.colorspace is None or pix.colorspace.n != 1 or pix.alpha:
+            pix = fitz.Pixmap(fitz.csGRAY, pix)
+        width, height = pix.width, pix.height
+        logger.debug("Processing pixmap: %dx%d", width, height)
+
+        # One byte per pixel with no row padding, exactly what zbar expects
+        samples = pix.samples
+
+        def gray_image():
+            from PIL import Image
+            return Image.frombuffer('L', (width, height), samples, 'raw', 'L', 0, 1)
+
+        return _extract_qr_data((samples, width, height), gray_image, 'pixmap', upscale_factor, try_threshold,
+                                try_original)
+    except (ImportError, OSError):
+        # A missing zbar library is a broken environment, not a statement without a QR code
+        raise
+    except Exception as e:
+        logger.error("An error occurred processing pixmap: %s", e)
+
+    return []
+
+def _decode_qr_objects(decoded_objects, label, found_qr_data):
+    for obj in decoded_objects:
+        if obj.type == 'QRCODE':
+            try:
+                data = obj.data.decode('utf-8')
+                logger.debug("Found QR code (%s)", label)
+                found_qr_data.add(data)
+            except UnicodeDecodeError:
+                logger.warning("Found QR code (%s) but couldn't decode UTF-8. Data: %r", label, obj.data)
+
+def _extract_qr_data(image, gray_image, base_filename, upscale_factor, try_threshold, try_original=True):
+    """
+    Decodes `image` (a grayscale Pillow image or raw buffer), then optionally
+    an upscaled/thresholded copy of the Pillow image returned by `gray_image()`.
+    """
+    # zbar is only loaded once a QR code is actually decoded
+    from pyzbar import pyzbar
+    found_qr_data = set() # Use set for auto-uniqueness
+
+    # --- 2. Attempt decoding on original grayscale first ---
+    if try_original:
+        logger.debug("Attempt 1: decoding original grayscale")
+        decoded_objects = pyzbar.decode(image)
+        if decoded_objects:
+             logger.debug("Found %d barcode(s) in original grayscale", len(decoded_objects))
+             _decode_qr_objects(decoded_objects, 'Original Gray', found_qr_data)
+
+
+    # --- 3. Optional Upscaling and Thresholding ---
+    if not found_qr_data and (upscale_factor > 1 or try_threshold):
+        logger.debug("Attempt 2: preprocessing (upscale=%d, threshold=%s)", upscale_factor, try_threshold)
+        from PIL import Image, ImageOps
+        image_to_process = gray_image() # Start with grayscale
+        img_width, img_height = image_to_process.size
+
+        # Apply Upscaling if needed
+        if upscale_factor > 1:
+            new_size = (img_width * upscale_factor, img_height * upscale_factor)
+            logger.debug("Upscaling by %dx to %s using LANCZOS", upscale_factor, new_size)
+            try:
+                image_to_process = image_to_process.resize(new_size, Image.LANCZOS)
+            except Exception as resize_e:
+                 logger.warning("Error during resize: %s", resize_e)
+                 # Continue with non-upscaled image if resize fails
+
+        # Apply Thresholding if needed
+        if try_threshold:
+            logger.debug("Applying autocontrast and thresholding")
+            try:
+                # Autocontrast might help first
+                image_processed = ImageOps.autocontrast(image_to_process, cutoff=5)
+                # Simple threshold - adjust 128 if needed
+                image_processed = image_processed.point(lambda x: 0 if x < 128 else 255, '1')
+                image_to_process = image_processed # Use the thresholded image
+            except Exception as thresh_e:
+                 logger.warning("Error during thresholding: %s", thresh_e)
+                 # Continue with potentially only upscaled image if threshold fails
+
+        if DEBUG_SAVE_IMAGES:
+             ts = int(time.time() * 1000)
+             debug_path = os.path.join(DEBUG_FOLDER, f"{base_filename}_processed_U{upscale_factor}_T{try_threshold}_{ts}.png")
+             try:
+                image_to_process.save(debug_path)
+                logger.debug("Saved processed image to: %s", debug_path)
+             except Exception as save_e:
+                logger.warning("Failed to save processed image: %s", save_e)
+
+        # Decode the processed (upscaled/thresholded) image
+        decoded_objects_processed = pyzbar.decode(image_to_process)
+
+        if decoded_objects_processed:
+             logger.debug("Found %d barcode(s) in processed image", len(decoded_objects_processed))
+             _decode_qr_objects(decoded_objects_processed, 'Processed', found_qr_data)
 
     return list(found_qr_data) # Convert set back to list
 
-def qrcode_data(input_pdf,output_image_file):
-    image_file_path=qr2img(input_pdf,output_image_file)
-    resize_factor = 1  # Start with 1 (no upscale), maybe increase (e.g., 2, 3) if needed.
-    # If contrast is poor, try enabling thresholding
-    use_thresholding = False  # Try setting to True if decoding fails
+# Rungs tried in order until a QR code decodes: start with a small render and only
+# escalate resolution, then thresholding and upscaling, when decoding fails
+QR_DECODE_LADDER = (
+    {'dpi': 150, 'upscale_factor': 1, 'try_threshold': False},
+    {'dpi': 300, 'upscale_factor': 1, 'try_threshold': False},
+    {'dpi': 600, 'upscale_factor': 1, 'try_threshold': False},
+    {'dpi': 600, 'upscale_factor': 1, 'try_threshold': True},
+    {'dpi': 600, 'upscale_factor': 2, 'try_threshold': True},
+)
 
-    # --- Run Extraction ---
-    print("=" * 30)
-    print(" Starting QR Code Extraction from Image ".center(30, "="))
-    print(f"  File: {image_file_path}")
-    print(f"  Upscale: {resize_factor}x")
-    print(f"  Threshold: {use_thresholding}")
-    print("=" * 30)
+def decode_qrcode(input_pdf, output_image_file=None, ladder=QR_DECODE_LADDER, locate=True):
+    """
+    Decodes the QR code of a statement, climbing the resolution ladder.
 
-    extracted_data = extract_qr_data_from_image(
-        image_file_path,
-        upscale_factor=resize_factor,
-        try_threshold=use_thresholding
-    )
+    The QR code is first located from the PDF structure (locate_qr). An
+    embedded raster QR image is decoded directly, without rendering the page.
+    Otherwise each rung renders the located area (or, failing that, the area
+    inside the fixed QR_CUT_* margins) at its DPI - a render is reused by the
+    rungs that share it - and decodes it in memory, optionally upscaled and/or
+    thresholded. The first rung that yields a QR code wins.
+
+    Args:
+        input_pdf (str | StatementDocument): Path to the PDF file, or an already
+                                             opened document.
+        output_image_file (str): Optional debug PNG path for the last decoded image.
+        ladder (sequence): Rungs as dicts of dpi, upscale_factor and try_threshold.
+        locate (bool): Whether to look for the QR code in the page structure
+                       before falling back to the fixed margins.
+
+    Returns:
+        tuple: (address, rung), where address is "Address: ..." built from the
+               ADDR: lines and rung describes what decoded it: the rung settings
+               with its index, and 'source' ('embedded', 'located' or 'margins');
+               (None, None) if every attempt failed.
+    """
+    logger.debug("Decoding the QR code of %s (%d rungs)", input_pdf, len(ladder))
+
+    with stage('qrcode_decode'), open_document(input_pdf) as document:
+        extracted_data, rung, pix = _decode_qrcode(document, ladder, locate)
+
+    if output_image_file and pix is not None:
+        try:
+            save_pixmap_png(pix, output_image_file)
+        except Exception as e:
+            logger.warning("Failed to save QR debug image: %s", e)
 
-    # --- Print Results ---
-    print("\n" + "=" * 30)
-    print(" Extraction Results ".center(30, "="))
-    print("=" * 30)
     if extracted_data:
-        # Extract and process the QR code data
-        qr_data = extracted_data[0]
-        lines = qr_data.split('\n')
-        
-        # Extract address parts
-        address_parts = []
-        language = None
-        
-        for line in lines:
-            if line.startswith('ADDR:'):
-                address_parts.append(line[5:].strip())  # Remove 'ADDR:' prefix
-            elif line.startswith('LANGUAGE:'):
-                language = line[9:].strip()  # Remove 'LANGUAGE:' prefix
-        
-        # Combine address parts
-        full_address = ' '.join(address_parts)
-        
-        # Return combined information
-        return f"Address: {full_address}"
-    else:
-        print("\nNo QR codes found in the image or failed to decode.")
-        if not DEBUG_SAVE_IMAGES:
-            print("Consider setting DEBUG_SAVE_IMAGES = True at the top to inspect images.")
+        logger.info("Decoded QR code of %s from %s at rung %s", input_pdf, rung['source'], rung['rung'])
+        return _qr_address(extracted_data[0]), rung
 
-    print("\nProcessing complete.")
+    logger.warning("No QR code found in %s or failed to decode%s", input_pdf,
+                   "" if DEBUG_SAVE_IMAGES else "; set DEBUG_SAVE_IMAGES = True to inspect images")
+    return None, None
+
+def _decode_qrcode(document, ladder, locate):
+    """Returns (extracted_data, rung, last pixmap)"""
+    with stage('locate'):
+        location = locate_qr(document) if locate else None
+    clips = [('margins', None)]
+    pix = None
+
+    if location is not None:
+        logger.debug("Located QR %s at %s", location['source'], location['rect'])
+
+        # An embedded raster QR code is decoded as stored, without rendering: first
+        # reduced to about the first rung's resolution, then at full size
+        if location['xref']:
+            min_width = int(location['rect'].width * ladder[0]['dpi'] / 72) if ladder else None
+            full_width = None
+            for width in (min_width, None):
+                with stage('render'):
+                    pix = embedded_qr_pixmap(document, location['xref'], min_width=width)
+                if pix is None or pix.width == full_width:
+                    break
+                logger.debug("Embedded image: %dx%d", pix.width, pix.height)
+                with stage('decode'):
+                    extracted_data = extract_qr_data_from_pixmap(pix)
+                if extracted_data:
+                    return extracted_data, {'dpi': None, 'upscale_factor': 1, 'try_threshold': False,
+                                            'rung': None, 'source': 'embedded'}, pix
+                full_width = pix.width
+
+        padding = QR_LOCATOR['padding']
+        clips.insert(0, ('located', location['rect'] + (-padding, -padding, padding, padding)))
+
+    for source, clip in clips:
+        pixmaps = {}
+        tried = set()  # DPIs whose unprocessed render was already decoded
+        for index, rung in enumerate(ladder):
+            dpi = rung['dpi']
+            if dpi not in pixmaps:
+                with stage('render'):
+                    pixmaps[dpi] = qr2pixmap(document, dpi=dpi, clip=clip)
+            if pixmaps[dpi] is None:
+                # Rendering failed, a higher DPI will not do better
+                break
+            pix = pixmaps[dpi]
+
+            logger.debug("Rung %d (%s): %d DPI, upscale %dx, threshold %s",
+                         index, source, dpi, rung['upscale_factor'], rung['try_threshold'])
+            with stage('decode'):
+                extracted_data = extract_qr_data_from_pixmap(
+                    pix,
+                    upscale_factor=rung['upscale_factor'],
+                    try_threshold=rung['try_threshold'],
+                    try_original=dpi not in tried
+                )
+            tried.add(dpi)
+            if extracted_data:
+                return extracted_data, dict(rung, rung=index, source=source), pix
+
+    return [], None, pix
+
+def _qr_address(qr_data):
+    # Extract and process the QR code data
+    lines = qr_data.split('\n')
+
+    # Extract address parts
+    address_parts = []
+    language = None
+
+    for line in lines:
+        if line.startswith('ADDR:'):
+            address_parts.append(line[5:].strip())  # Remove 'ADDR:' prefix
+        elif line.startswith('LANGUAGE:'):
+            language = line[9:].strip()  # Remove 'LANGUAGE:' prefix
+
+    # Combine address parts
+    full_address = ' '.join(address_parts)
+
+    # Return combined information
+    return f"Address: {full_address}"
+
+def qrcode_data(input_pdf, output_image_file=None):
+    """
+    Decodes the QR code of a statement and returns its address.
+
+    The QR code is located from the PDF structure and decoded in memory,
+    escalating through QR_DECODE_LADDER only as far as needed. Pass `output_image_file` to also
+    save the rendered area as a PNG for debugging.
+
+    Args:
+        input_pdf (str | StatementDocument): Path to the PDF file, or an already
+                                             opened document.
+        output_image_file (str): Optional debug PNG path.
+
+    Returns:
+        str: "Address: ..." built from the ADDR: lines, or None if no QR code
+             was decoded.
+    """
+    return decode_qrcode(input_pdf, output_image_file)[0]
 
 # --- How to Use ---
 if __name__ == "__main__":
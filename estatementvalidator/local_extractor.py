@@ -0,0 +1,160 @@
+"""
+Rule-based extraction of the statement fields the QR code check needs.
+
+BOC statements have a fixed layout: the holder's name and address sit in a
+block at the top left of page 1, and the account number and statement date
+follow their printed labels. Reading them from the PyMuPDF text lines takes
+milliseconds; the conversion model is only needed when the layout does not
+match well enough, which the per-field confidence reports.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+# --- Where the fields are printed on page 1, in points ---
+LOCAL_LAYOUT = {
+    'page': 0,
+    'address_region': (30.0, 90.0, 320.0, 220.0),  # Name line, then the address lines
+    'max_address_lines': 6,
+    'max_line_gap': 2.0,        # Vertical gap between block lines, in line heights
+    'max_indent': 2.0,          # Points the block lines may differ in their left edge
+    'labels': {
+        'Account_Number': ('Account Number', 'Account No.', 'Account No', '帳戶號碼'),
+        'Statement_Date': ('Statement Date', '結單日期'),
+    },
+    'patterns': {
+        'Account_Number': r'\d[\d -]{6,}\d',
+        'Statement_Date': r'\d{4}[/-]\d{1,2}[/-]\d{1,2}|\d{1,2}[/-]\d{1,2}[/-]\d{4}|\d{1,2} [A-Za-z]{3,9} \d{4}',
+    }
+}
+
+# Every field must reach this confidence for the local result to be used
+LOCAL_CONFIDENCE_THRESHOLD = 0.9
+
+EXTRACTION_MODES = ('auto', 'local', 'llm')
+
+
+def _page_lines(page: fitz.Page, clip: Optional[fitz.Rect] = None) -> List[Dict[str, Any]]:
+    """Text lines of a page, top to bottom: text, bbox and the size of their largest span"""
+    lines = []
+    # Without TEXT_PRESERVE_IMAGES, so image blocks such as the QR code are not decoded
+    for block in page.get_text('dict', clip=clip, flags=fitz.TEXTFLAGS_TEXT)['blocks']:
+        for line in block.get('lines', ()):
+            spans = [span for span in line['spans'] if span['text'].strip()]
+            if not spans:
+                continue
+            lines.append({
+                'text': ''.join(span['text'] for span in spans).strip(),
+                'rect': fitz.Rect(line['bbox']),
+                'size': round(max(span['size'] for span in spans), 2)
+            })
+    lines.sort(key=lambda line: (round(line['rect'].y0), line['rect'].x0))
+    return lines
+
+
+def _address_block(lines: List[Dict[str, Any]], layout: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The first run of left-aligned lines of one font size, without a wide gap between them"""
+    if not lines:
+        return []
+    block = [lines[0]]
+    for line in lines[1:]:
+        previous = block[-1]
+        height = previous['rect'].height or previous['size']
+        if (line['size'] != block[0]['size']
+                or abs(line['rect'].x0 - block[0]['rect'].x0) > layout['max_indent']
+                or line['rect'].y0 - previous['rect'].y1 > layout['max_line_gap'] * height):
+            break
+        block.append(line)
+    return block
+
+
+def _address_fields(page: fitz.Page, layout: Dict[str, Any]) -> Dict[str, Any]:
+    lines = _page_lines(page, fitz.Rect(layout['address_region']))
+    block = _address_block(lines, layout)
+    if len(block) < 2:
+        return {'Name': ('', 0.0), 'User_address': ('', 0.0)}
+
+    name, address = block[0]['text'], block[1:]
+    # A holder's name has letters and no digits; a first line with digits is an address line
+    name_confidence = 1.0 if re.search(r'[^\W\d_]', name) and not re.search(r'\d', name) else 0.5
+
+    address_confidence = 1.0
+    if len(address) < 2:
+        address_confidence -= 0.3
+    if len(address) >= layout['max_address_lines']:
+        address_confidence -= 0.4  # Probably ran into the statement body
+    # Same normalisation the model is asked for: lines joined with spaces, no commas
+    text = ' '.join(line['text'] for line in address).replace(',', '')
+    return {'Name': (name, name_confidence), 'User_address': (text, max(address_confidence, 0.0))}
+
+
+def _labelled_field(lines: List[Dict[str, Any]], labels, pattern: str):
+    """Value printed after one of `labels`: on the same line, to its right, or below it"""
+    for index, line in enumerate(lines):
+        lowered = line['text'].lower()
+        for label in labels:
+            position = lowered.find(label.lower())
+            if position < 0:
+                continue
+            rest = line['text'][position + len(label):].lstrip(' :：')
+            candidates = [rest] if rest else []
+            rect = line['rect']
+            candidates += [other['text'] for other in lines
+                           if other is not line and other['rect'].x0 >= rect.x1 - 1
+                           and abs(other['rect'].y0 - rect.y0) < rect.height / 2]
+            candidates += [other['text'] for other in lines[index + 1:index + 3]
+                           if other['rect'].y0 >= rect.y1 - 1 and other['rect'].x0 < rect.x1
+                           and other['rect'].x1 > rect.x0]
+            for candidate in candidates:
+                match = re.search(pattern, candidate)
+                if match:
+                    return match.group(0).strip(), 1.0
+            return (candidates[0] if candidates else ''), 0.3
+
+    # No label: a value that only this pattern fits is still a fair guess
+    matches = {match.group(0).strip() for line in lines for match in re.finditer(pattern, line['text'])}
+    if len(matches) == 1:
+        return matches.pop(), 0.6
+    return '', 0.0
+
+
+def extract_fields(document, layout: Dict[str, Any] = LOCAL_LAYOUT) -> Dict[str, Any]:
+    """
+    Extract Name, Account_Number, Statement_Date and User_address from page 1.
+
+    Args:
+        document (StatementDocument): The opened PDF document
+        layout (dict): Regions, labels and value patterns (LOCAL_LAYOUT)
+
+    Returns:
+        Dict[str, Any]: {'fields': {name: value}, 'confidence': {name: 0..1},
+            'overall': lowest field confidence}
+    """
+    if document.page_count <= layout['page']:
+        fields = {name: ('', 0.0) for name in ('Name', 'User_address', *layout['labels'])}
+    else:
+        page = document.doc[layout['page']]
+        fields = _address_fields(page, layout)
+        lines = _page_lines(page)
+        for name, labels in layout['labels'].items():
+            fields[name] = _labelled_field(lines, labels, layout['patterns'][name])
+
+    return {
+        'fields': {name: value for name, (value, _) in fields.items()},
+        'confidence': {name: confidence for name, (_, confidence) in fields.items()},
+        'overall': min(confidence for _, confidence in fields.values())
+    }
+
+
+def local_api_result(extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """A local extraction in the shape of a conversion API result, so it parses the same way"""
+    summary = json.dumps(extraction['fields'], indent=2, ensure_ascii=False)
+    return {
+        'result': f'```json\n{summary}\n```',
+        'extractor': 'local',
+        'confidence': extraction['overall'],
+        'field_confidence': extraction['confidence']
+    }
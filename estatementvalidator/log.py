@@ -0,0 +1,62 @@
+"""
+Logging setup for the estatementvalidator package.
+
+Every module logs to a child of the `estatementvalidator` logger. The package
+only installs a NullHandler, so nothing is emitted until the application
+configures logging, either with the standard `logging` module or with
+configure_logging below.
+"""
+
+import json
+import logging
+import sys
+from typing import Optional, TextIO, Union
+
+LOGGER_NAME = 'estatementvalidator'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line, including `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: Union[int, str] = logging.INFO, json_format: bool = False,
+                      stream: Optional[TextIO] = None) -> logging.Logger:
+    """
+    Send the package's log records to a stream.
+
+    Args:
+        level (int | str): Minimum level, e.g. logging.DEBUG or 'WARNING'
+        json_format (bool): One JSON object per record instead of plain text
+        stream: Where to write; stderr if None
+
+    Returns:
+        logging.Logger: The package logger
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in [h for h in logger.handlers if getattr(h, '_estatementvalidator', False)]:
+        logger.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(JSONFormatter() if json_format else
+                         logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler._estatementvalidator = True
+    logger.addHandler(handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    return logger
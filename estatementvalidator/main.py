@@ -1,12 +1,10 @@
 import streamlit as st
 import requests
-import os
-import tempfile
 from typing import Tuple, Dict, Any
-from producer_check import producer_check
-from QRcode_check import verify_qr_info
-from modify_check import modify_detect
-from img_qr_reader import qrcode_data
+from estatementvalidator.document import DocumentSource, StatementDocument, open_document
+from estatementvalidator.producer_check import producer_check
+from estatementvalidator.modify_check import modify_detect
+from estatementvalidator.img_qr_reader import qrcode_data
 import base64 # Import base64 for PDF display
 
 # Configure page settings
@@ -52,12 +50,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def save_uploaded_file(uploaded_file):
-    """Save uploaded file to temporary location"""
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(uploaded_file.getbuffer())
-        return tmp_file.name
-
 # --- Function to display PDF ---
 def show_pdf(file):
     """Displays the PDF file in the Streamlit app."""
@@ -70,11 +62,17 @@ def show_pdf(file):
 # --- End of function ---
 
 
-def verify_pdf(file_path: str) -> Tuple[bool, Dict[str, Any]]:
-    """Execute the three verification steps"""
+def verify_pdf(source: DocumentSource) -> Tuple[bool, Dict[str, Any]]:
+    """Execute the three verification steps on a path, the PDF bytes or an uploaded file"""
+    # The upload is read into memory once and every step shares it, nothing is written to disk
+    with open_document(source) as document:
+        return _verify_document(document)
+
+
+def _verify_document(document: StatementDocument) -> Tuple[bool, Dict[str, Any]]:
     try:
         # Step 1: Producer check
-        producer_valid = producer_check(file_path)
+        producer_valid = producer_check(document)
         if not producer_valid:
             return False, {
                 'result': 'fail',
@@ -84,7 +82,7 @@ def verify_pdf(file_path: str) -> Tuple[bool, Dict[str, Any]]:
             }
 
         # Step 2: Modification check
-        modify_valid,modify_result = modify_detect(file_path)
+        modify_valid,modify_result = modify_detect(document)
         if not modify_valid:
             return False, {
                 'result': 'fail',
@@ -95,8 +93,7 @@ def verify_pdf(file_path: str) -> Tuple[bool, Dict[str, Any]]:
             }
 
         # Step 3: QR Code check
-        output_img='test.png'
-        qr_data=qrcode_data(file_path,output_img)
+        qr_data=qrcode_data(document)
 
         # Make API call to convert PDF
         api_url = "http://localhost:8000/convert-pdf-with-images"
@@ -121,9 +118,9 @@ def verify_pdf(file_path: str) -> Tuple[bool, Dict[str, Any]]:
         }
         # ...<Other Suitable data into sub-json>
 
-        with open(file_path, 'rb') as f:
-            files = {'file': (os.path.basename(file_path), f, 'application/pdf')}
-            response = requests.post(api_url, params=params, files=files)
+        # Upload the same in-memory bytes the checks read
+        files = {'file': (document.name, document.data, 'application/pdf')}
+        response = requests.post(api_url, params=params, files=files)
 
         if response.status_code != 200:
             return False, {
@@ -346,20 +343,11 @@ if uploaded_file is not None:
 
     if st.button("Verify Document", type="primary"):
         with st.spinner("Verifying document... Please wait."):
-            # Save to temp file
             # Important: Need to reset the file pointer after reading it for display
             uploaded_file.seek(0)
-            temp_path = save_uploaded_file(uploaded_file)
-
-            # Perform verification
-            is_valid, result_data = verify_pdf(temp_path)
-
-            # Clean up temp file
-            try:
-                os.unlink(temp_path)
-            except Exception as e:
-                st.warning(f"Could not delete temporary file: {temp_path}. Error: {e}")
 
+            # Perform verification on the uploaded bytes, without a temporary file
+            is_valid, result_data = verify_pdf(uploaded_file)
 
             # Display results
             display_results(result_data)
@@ -0,0 +1,159 @@
+"""
+Memory ceiling for the page scans.
+
+A long statement is scanned one page at a time, and what a page cached is
+dropped before the next one is read, so memory should not grow with the page
+count. The ceiling is the safety net: after each page the resident set size
+is compared with it, the PDF libraries' caches are emptied when it is
+exceeded, and if that is not enough the scan stops with MemoryLimitExceeded.
+A batch worker then reports an 'error' result for that statement instead of
+being killed by the operating system.
+
+The current resident size is read from /proc on Linux, from psutil if it is
+installed, and from the kernel on macOS and Windows. Where none of them is
+available the ceiling is disabled with a warning: the peak size would never
+come down again, so every scan after one large statement would fail.
+
+    set_memory_limit(1024)               # MB, for every scan in this process
+    check_modification(path, memory_limit=512)
+"""
+
+import ctypes
+import gc
+import logging
+import os
+import sys
+from typing import Optional
+
+from estatementvalidator.timing import count
+
+logger = logging.getLogger(__name__)
+
+# Resident set size, in MB, above which a scan stops; None is no ceiling
+_memory_limit: Optional[float] = None
+
+
+class MemoryLimitExceeded(MemoryError):
+    """A scan needed more memory than the configured ceiling"""
+
+
+def set_memory_limit(limit_mb: Optional[float]) -> None:
+    """Set the ceiling, in MB, of every scan in this process that does not pass its own"""
+    global _memory_limit
+    if limit_mb is not None and limit_mb <= 0:
+        raise ValueError("The memory limit must be positive")
+    _memory_limit = limit_mb
+
+
+def get_memory_limit() -> Optional[float]:
+    return _memory_limit
+
+
+def _proc_rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _psutil_rss():
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+class _TimeValue(ctypes.Structure):
+    _fields_ = [('seconds', ctypes.c_int32), ('microseconds', ctypes.c_int32)]
+
+
+class _MachTaskBasicInfo(ctypes.Structure):
+    _fields_ = [('virtual_size', ctypes.c_uint64), ('resident_size', ctypes.c_uint64),
+                ('resident_size_max', ctypes.c_uint64), ('user_time', _TimeValue),
+                ('system_time', _TimeValue), ('policy', ctypes.c_int32), ('suspend_count', ctypes.c_int32)]
+
+
+def _mach_rss():
+    libc = ctypes.CDLL('/usr/lib/libSystem.B.dylib')
+    libc.mach_task_self.restype = ctypes.c_uint32
+    info = _MachTaskBasicInfo()
+    size = ctypes.c_uint32(ctypes.sizeof(info) // 4)
+    MACH_TASK_BASIC_INFO = 20
+    if libc.task_info(libc.mach_task_self(), MACH_TASK_BASIC_INFO, ctypes.byref(info), ctypes.byref(size)) != 0:
+        raise OSError("task_info failed")
+    return info.resident_size
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [('cb', ctypes.c_uint32), ('PageFaultCount', ctypes.c_uint32)] + [
+        (name, ctypes.c_size_t) for name in (
+            'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+            'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+
+def _windows_rss():
+    kernel32 = ctypes.WinDLL('kernel32')
+    kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+    counters = _ProcessMemoryCounters(cb=ctypes.sizeof(_ProcessMemoryCounters))
+    if not kernel32.K32GetProcessMemoryInfo(ctypes.c_void_p(kernel32.GetCurrentProcess()),
+                                            ctypes.byref(counters), counters.cb):
+        raise OSError("GetProcessMemoryInfo failed")
+    return counters.WorkingSetSize
+
+
+def _rss_readers():
+    if sys.platform.startswith('linux'):
+        yield _proc_rss
+    yield _psutil_rss
+    if sys.platform == 'darwin':
+        yield _mach_rss
+    elif sys.platform == 'win32':
+        yield _windows_rss
+
+
+_rss_reader = None
+
+
+def current_rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MB, or None where it can't be read"""
+    global _rss_reader
+    if _rss_reader is None:
+        for reader in _rss_readers():
+            try:
+                reader()
+            except Exception:
+                continue
+            _rss_reader = reader
+            break
+        else:
+            _rss_reader = False
+            logger.warning("The current resident set size can't be read on %s; "
+                           "the memory ceiling is disabled (install psutil to enable it)", sys.platform)
+    return _rss_reader() / (1024 * 1024) if _rss_reader else None
+
+
+def release_caches() -> None:
+    """Empty MuPDF's resource store (fonts, images) and collect freed page objects"""
+    fitz = sys.modules.get('fitz')
+    if fitz is not None:
+        fitz.TOOLS.store_shrink(100)
+    gc.collect()
+
+
+def check_memory(limit_mb: Optional[float] = None) -> None:
+    """
+    Raise MemoryLimitExceeded if this process is above the ceiling even after
+    releasing the library caches. Does nothing where the current resident size
+    can't be read.
+
+    Args:
+        limit_mb (float): Ceiling in MB; the process-wide set_memory_limit() if None
+    """
+    limit_mb = limit_mb if limit_mb is not None else _memory_limit
+    if limit_mb is None:
+        return
+    rss = current_rss_mb()
+    if rss is None or rss <= limit_mb:
+        return
+    count('memory_releases')
+    release_caches()
+    rss = current_rss_mb()
+    if rss > limit_mb:
+        logger.warning("Memory ceiling exceeded: %.0f MB resident, %.0f MB allowed", rss, limit_mb)
+        raise MemoryLimitExceeded(f"Memory ceiling exceeded: {rss:.0f} MB resident, {limit_mb:.0f} MB allowed")
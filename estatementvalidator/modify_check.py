@@ -1,7 +1,17 @@
+import logging
+import os
+import threading
 import fitz  # PyMuPDF
-import pdfplumber
-import pandas as pd
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from estatementvalidator.document import open_document
+from estatementvalidator.memory import check_memory, get_memory_limit
+from estatementvalidator.revisions import MAX_REVISIONS, revision_check
+from estatementvalidator.timing import count, stage
+
+logger = logging.getLogger(__name__)
 
 # Template formats from the template PDF
 TEMPLATE_FORMATS = [
@@ -21,6 +31,19 @@ TEMPLATE_FORMATS = [
     ('AllAndNone', 13.5, (0.0, 0.0, 0.0))
 ]
 
+# A template learned from genuine statements (template_learner.py) takes the place of
+# TEMPLATE_FORMATS: the file named by $ESTATEMENT_TEMPLATE, else template.json next to
+# this module if there is one. $ESTATEMENT_TEMPLATE_VERSION picks a version other than
+# the file's current one.
+TEMPLATE_ENV = 'ESTATEMENT_TEMPLATE'
+TEMPLATE_VERSION_ENV = 'ESTATEMENT_TEMPLATE_VERSION'
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template.json')
+_template_formats = None
+# The environment the startup default was loaded from; None if use_template() was given a template
+_template_env = None
+# Engine the template file in use was learned with, None for formats given directly
+_template_engine = None
+
 def format_color(color):
     """Standardize color value precision (RGB tuple or single value)"""
     if color is None:
@@ -29,165 +52,488 @@ def format_color(color):
         return tuple(round(float(c), 3) for c in color)
     return round(float(color), 3)
 
-def find_all_format(file_path):
-    format_all=[]
+# rawdict flags: keep whitespace and glyphs outside the mediabox, like pdfplumber's page.chars
+RAWDICT_FLAGS = fitz.TEXTFLAGS_RAWDICT & ~fitz.TEXT_MEDIABOX_CLIP
+
+def srgb_to_rgb(value):
+    """Convert a PyMuPDF sRGB integer into an (r, g, b) tuple of floats in [0, 1]"""
+    return ((value >> 16) & 255) / 255, ((value >> 8) & 255) / 255, (value & 255) / 255
+
+def _span_chars(span, font, size, color):
+    for char in span["chars"]:
+        x0, top, x1, bottom = char["bbox"]
+        yield {
+            "text": char["c"],
+            "fontname": font,
+            "size": size,
+            "non_stroking_color": color,
+            "x0": x0,
+            "top": top,
+            "x1": x1,
+            "bottom": bottom
+        }
 
-    # Open PDF with both libraries
-    doc = fitz.open(file_path)
-    pdf_pdfplumber = pdfplumber.open(file_path)
+def pymupdf_runs(document, page_num):
+    """
+    Runs of characters sharing one format, from PyMuPDF's rawdict span data.
+
+    Yields (font, size, color, chars) once per span. Font, size and color are span
+    attributes, so a format check can judge a whole span at once; `chars` is a lazy
+    iterator of pdfplumber-shaped char dicts that is only worth consuming for the
+    spans that need them. Subset fonts keep their "ABCDEF+" prefix, as in pdfplumber.
+
+    MuPDF reports every color as an 8-bit sRGB value, whereas pdfplumber reports it
+    in the PDF's own color space: DeviceGray `0 g` comes out as RGB black here and
+    (0,) there, CMYK is converted, and `0.5 0.5 0.5 rg` is rounded to 0.502. The
+    format keys of the two engines therefore only agree for RGB text whose
+    components are multiples of 1/255, which is why pdfplumber is the default.
+    """
+    # The prefix setting is process-wide: turned on for this page only, then restored
+    # for other PyMuPDF users in the process
+    previous = fitz.TOOLS.set_subset_fontnames()
+    fitz.TOOLS.set_subset_fontnames(True)
+    try:
+        page_dict = document.doc[page_num].get_text("rawdict", flags=RAWDICT_FLAGS)
+    finally:
+        fitz.TOOLS.set_subset_fontnames(previous)
+    for block in page_dict["blocks"]:
+        if block["type"] != 0:  # Skip image blocks
+            continue
+        for line in block["lines"]:
+            for span in line["spans"]:
+                font = span["font"]
+                size = span["size"]
+                color = srgb_to_rgb(span["color"])
+                yield font, size, color, _span_chars(span, font, size, color)
+
+def pdfplumber_runs(document, page_num):
+    """Characters of one page from pdfplumber (reference engine, much slower), one run per char"""
+    for char in document.plumber.pages[page_num].chars:
+        yield char["fontname"], char["size"], char["non_stroking_color"], (char,)
+
+def pymupdf_chars(document, page_num):
+    """Characters of one page from PyMuPDF's rawdict span data, in pdfplumber's char layout."""
+    for _, _, _, chars in pymupdf_runs(document, page_num):
+        yield from chars
+
+def pdfplumber_chars(document, page_num):
+    """Characters of one page from pdfplumber (reference engine, much slower)"""
+    return document.plumber.pages[page_num].chars
+
+# Character extraction engines, selectable by name: (per-char, per-run) readers
+CHAR_ENGINES = {
+    'pymupdf': pymupdf_chars,
+    'pdfplumber': pdfplumber_chars
+}
+RUN_ENGINES = {
+    'pymupdf': pymupdf_runs,
+    'pdfplumber': pdfplumber_runs
+}
+DEFAULT_ENGINE = 'pdfplumber'
+
+def get_char_engine(engine):
+    try:
+        return CHAR_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown character engine '{engine}', expected one of {sorted(CHAR_ENGINES)}")
+
+def get_run_engine(engine):
+    get_char_engine(engine)  # Same names, same error
+    return RUN_ENGINES[engine]
+
+def format_key(font, size, color):
+    """Comparison key of a character format (considering float precision)"""
+    return (font, round(size, 2), format_color(color))
+
+class TemplateIndex:
+    """
+    Template formats compiled into a set of comparison keys.
 
-    for page_num in range(len(doc)):
-        pdfplumber_page = pdf_pdfplumber.pages[page_num]
+    Every raw (font, size, color) seen so far is remembered with its verdict, so
+    the rounding and color normalisation run once per distinct format rather
+    than once per glyph.
+    """
 
-        # Get all characters from pdfplumber page
-        all_chars = pdfplumber_page.chars
+    def __init__(self, formats):
+        self.keys = frozenset(format_key(font, size, color) for font, size, color in formats)
+        self._verdicts = {}
 
-        for c in all_chars:
-            format={
-                "font": c["fontname"],
-                "size": c["size"],
-                "color": c["non_stroking_color"]
-            }
-            format_all.append(format)
+    def allows(self, font, size, color):
+        if isinstance(color, list):
+            color = tuple(color)
+        raw = (font, size, color)
+        verdict = self._verdicts.get(raw)
+        if verdict is None:
+            verdict = self._verdicts[raw] = format_key(font, size, color) in self.keys
+        return verdict
 
-    df = pd.DataFrame(format_all)
-    unique_df = df.drop_duplicates()
+    def __contains__(self, key):
+        return key in self.keys
 
-    # Convert back to list of dictionaries
-    unique_formats = unique_df.to_dict('records')
+    def __len__(self):
+        return len(self.keys)
 
-    # Close files
-    pdf_pdfplumber.close()
-    doc.close()
+@lru_cache(maxsize=32)
+def _compile_template(formats):
+    return TemplateIndex(formats)
 
-    return unique_formats
+def compile_template(template_formats):
+    """
+    Compile template formats once; later calls with the same formats reuse the index.
 
+    :param template_formats: (font, size, color) tuples like TEMPLATE_FORMATS, dicts
+        with font/size/color keys (as returned by find_all_format), or a TemplateIndex
+    :return: TemplateIndex
+    """
+    if isinstance(template_formats, TemplateIndex):
+        return template_formats
+    formats = []
+    for fmt in template_formats:
+        if isinstance(fmt, dict):
+            fmt = (fmt["font"], fmt["size"], fmt.get("color"))
+        font, size, color = fmt
+        formats.append((font, size, tuple(color) if isinstance(color, list) else color))
+    return _compile_template(tuple(formats))
 
-def analyze_pdf(file_path, template_formats):
-    modify_valid=True
+def iter_pages(document, page_nums, memory_limit=None):
     """
-    Analyze target PDF, detect two types of issues:
-    1. Characters using formats not in the template format list
-    2. Suspicious white overlay rectangles
+    Stream page numbers to a scan. Before the next page is read, the caches of
+    the previous one are dropped and the memory ceiling is checked (see
+    memory.py), so memory stays flat however long the statement is.
+    """
+    for page_num in page_nums:
+        yield page_num
+        document.release_page(page_num)
+        check_memory(memory_limit)
 
-    :param file_path: Path to the PDF to analyze
-    :param template_formats: Template format list (from find_all_format)
-    :return: List of abnormal formats and overlay issues
+def use_template(template=None, version=None, engine=None):
     """
-    # Store detection results
-    format_violations = []
-    overlay_issues = []
-    detect_result=[]
+    Set the formats modify_detect checks against in this process.
+
+    :param template: Path of a learned template file, a list of formats like
+        TEMPLATE_FORMATS, or None to load the startup default again
+    :param version: Version of the template file; its current version if None
+    :param engine: Engine the statements will be checked with; a template file
+        learned with another engine raises ValueError. If None, modify_detect
+        warns when it checks with another engine than the file's.
+    """
+    global _template_formats, _template_env, _template_engine
+    # Follow later changes of the environment only if it chose the template
+    environment = _environment() if template is None and version is None else None
+    if template is None:
+        template = os.environ.get(TEMPLATE_ENV) or (TEMPLATE_FILE if os.path.exists(TEMPLATE_FILE) else None)
+        version = version or os.environ.get(TEMPLATE_VERSION_ENV)
+    if template is None:
+        _template_formats, _template_engine = TEMPLATE_FORMATS, None
+    elif isinstance(template, (str, os.PathLike)):
+        from estatementvalidator.template_learner import _check_engine, _read_template
+        formats, learned_with = _read_template(os.fspath(template), version)
+        _check_engine(os.fspath(template), learned_with, engine)
+        _template_formats, _template_engine = formats, learned_with
+        logger.info("Template formats loaded from %s: %d formats learned with %s", template,
+                    len(_template_formats), _template_engine)
+    else:
+        _template_formats, _template_engine = list(template), None
+    _template_env = environment
 
-    # Open PDF file
-    doc = fitz.open(file_path)
-    pdf_pdfplumber = pdfplumber.open(file_path)
+def _environment():
+    return os.environ.get(TEMPLATE_ENV), os.environ.get(TEMPLATE_VERSION_ENV)
 
-    # Convert template formats to comparable form (considering float precision)
-    template_keys = set()
-    for fmt in template_formats:
-        color = fmt.get("color")
-        norm_color = format_color(color) if color is not None else None
-        key = (
-            fmt["font"],
-            round(fmt["size"], 2),  # Keep 4 decimal places for comparison
-            norm_color
-        )
-        template_keys.add(key)
-
-
-    for page_num in range(len(doc)):
-        pymupdf_page = doc[page_num]
-        pdfplumber_page = pdf_pdfplumber.pages[page_num]
-
-        # ======================
-        # 1. Detect abnormal character formats
-        # ======================
-        all_chars = pdfplumber_page.chars
-        for char in all_chars:
-            current_fmt = {
-                "font": char["fontname"],
-                "size": round(char["size"], 2),
-                "color": char["non_stroking_color"]
-            }
+def template_formats():
+    """
+    The formats modify_detect checks against. The startup default is loaded on
+    first use, and again if $ESTATEMENT_TEMPLATE or its version changed since.
+    """
+    if _template_formats is None or (_template_env is not None and _template_env != _environment()):
+        use_template()
+    return _template_formats
 
-            color=current_fmt['color']
+@lru_cache(maxsize=None)
+def _warn_engine_mismatch(learned_with, engine):
+    # Once per pair: the colors of one engine rarely match a template learned with the other
+    logger.warning("The template in use was learned with the %r engine, statements are checked with %r; "
+                   "colors may not match", learned_with, engine)
 
-            normed_color=format_color(color) if color is not None else None
+def find_all_format(file_path, engine=DEFAULT_ENGINE, memory_limit=None):
+    # Distinct formats in order of first appearance
+    format_all={}
+    page_runs = get_run_engine(engine)
 
-            # Create comparison key
-            current_key = (
-                current_fmt["font"],
-                current_fmt["size"],
-                normed_color
-            )
+    # Open PDF once; pdfplumber is loaded from the same bytes on demand
+    with open_document(file_path) as document:
+        for page_num in iter_pages(document, range(document.page_count), memory_limit):
+            # Formats of all characters of the page, once per run of equal formats
+            for font, size, color, _ in page_runs(document, page_num):
+                format_all.setdefault((font, size, color), None)
 
+    return [{"font": font, "size": size, "color": color} for font, size, color in format_all]
 
-            # Check if in template formats
-            if current_key not in template_keys:
-                modify_valid=False
+
+def _analyze_page(document, page_num, template, page_runs, budget):
+    """
+    Issues of one page: (format_violations, overlay_issues), at most `budget` of
+    them in total when a budget is given.
+    """
+    format_violations = []
+    overlay_issues = []
+
+    def limit_reached():
+        return budget is not None and len(format_violations) + len(overlay_issues) >= budget
+
+    count('pages_processed')
+    # ======================
+    # 1. Detect abnormal character formats
+    # ======================
+    # Judged once per run of equally formatted characters; only the
+    # characters of violating runs are materialised
+    with stage('glyphs'):
+        for font, size, color, chars in page_runs(document, page_num):
+            if template.allows(font, size, color):
+                continue
+
+            # Plain lists and floats, so a cached report reads back exactly as it was found
+            current_fmt = {
+                "font": font,
+                "size": round(size, 2),
+                "color": list(color) if isinstance(color, tuple) else color
+            }
+            for char in chars:
                 violation={
                     'page':page_num+1,
                     'text':char['text'],
-                    'position':(char["x0"], char["top"], char["x1"], char["bottom"]),
+                    'position':[char["x0"], char["top"], char["x1"], char["bottom"]],
                     'format':current_fmt
                 }
                 format_violations.append(violation)
+                if limit_reached():
+                    return format_violations, overlay_issues
+
+    # ======================
+    # 2. Detect white overlays
+    # ======================
+    with stage('drawings'):
+        drawings = document.doc[page_num].get_drawings()
+    for draw in drawings:
+        if "fill" in draw and draw["fill"] == (1, 1, 1):  # White fill
+            rect = draw["rect"]
+            overlay = {
+                "page": page_num + 1,
+                "coordinates": [float(rect.x0), float(rect.y0), float(rect.x1), float(rect.y1)],
+                "area": abs(rect.x1 - rect.x0) * abs(rect.y1 - rect.y0)
+            }
+            overlay_issues.append(overlay)
+            if limit_reached():
+                break
 
-                # ======================
-                # 2. Detect white overlays
-                # ======================
-        for draw in pymupdf_page.get_drawings():
-            if "fill" in draw and draw["fill"] == (1, 1, 1):  # White fill
-                modify_valid=False
-                overlay = {
-                    "page": page_num + 1,
-                    "coordinates": draw["rect"],
-                    "area": abs(draw["rect"][2] - draw["rect"][0]) * abs(draw["rect"][3] - draw["rect"][1])
-                }
-                overlay_issues.append(overlay)
+    return format_violations, overlay_issues
 
-                # Close files
-    pdf_pdfplumber.close()
-    doc.close()
+def _analyze_shard(source, template, engine, page_nums, max_violations, memory_limit=None):
+    """
+    Scan a run of pages in order; a worker process opens the document on its own.
 
-    # Print detection results
+    Returns one (format_violations, overlay_issues) pair per page scanned. In
+    fail-fast mode the scan stops once the shard alone has enough issues.
+    """
+    page_runs = get_run_engine(engine)
+    pages = []
+    found = 0
+    with open_document(source) as document:
+        for page_num in iter_pages(document, page_nums, memory_limit):
+            budget = None if max_violations is None else max_violations - found
+            violations, overlays = _analyze_page(document, page_num, template, page_runs, budget)
+            pages.append((violations, overlays))
+            found += len(violations) + len(overlays)
+            if max_violations is not None and found >= max_violations:
+                break
+    return pages
+
+def _shard_pages(page_count, shards):
+    """Split page numbers into `shards` contiguous runs of near-equal length"""
+    size, extra = divmod(page_count, shards)
+    start = 0
+    for shard in range(shards):
+        end = start + size + (1 if shard < extra else 0)
+        if end > start:
+            yield range(start, end)
+        start = end
+
+# Page workers kept across calls that pass `workers` but no executor, one pool per size
+_shard_pools = {}
+_shard_pools_lock = threading.Lock()
+
+def _shard_pool(workers):
+    with _shard_pools_lock:
+        pool = _shard_pools.get(workers)
+        if pool is None:
+            pool = _shard_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+def _discard_shard_pool(pool):
+    with _shard_pools_lock:
+        for workers, cached in list(_shard_pools.items()):
+            if cached is pool:
+                del _shard_pools[workers]
+    pool.shutdown(wait=False)
+
+def _scan_pages(document, template, engine, max_violations, workers, executor, memory_limit):
+    """Per-page issues in page order, scanned here or sharded across processes"""
+    page_count = len(document.doc)
+    if executor is None and (not workers or workers < 2 or page_count < 2):
+        return _analyze_shard(document, template, engine, range(page_count), max_violations, memory_limit)
+
+    # Workers re-open the file from its path when there is one, else from the bytes
+    source = document.path or document.data
+    own_executor = executor is None
+    if own_executor:
+        executor = _shard_pool(workers)
+    shards = min(workers or os.cpu_count() or 1, page_count)
+    futures = [executor.submit(_analyze_shard, source, template, engine, page_nums, max_violations, memory_limit)
+               for page_nums in _shard_pages(page_count, shards)]
+    try:
+        pages = []
+        found = 0
+        for future in futures:
+            shard_pages = future.result()
+            pages.extend(shard_pages)
+            found += sum(len(violations) + len(overlays) for violations, overlays in shard_pages)
+            # Fail-fast: later shards can no longer change the report
+            if max_violations is not None and found >= max_violations:
+                break
+        return pages
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool; the next call starts a new one
+        if own_executor:
+            _discard_shard_pool(executor)
+        raise
+    finally:
+        # Shards not started yet are dropped; running ones finish in the background
+        for future in futures:
+            future.cancel()
+
+def analyze_pdf(file_path, template_formats, engine=DEFAULT_ENGINE, max_violations=None,
+                workers=None, executor=None, report=None, memory_limit=None):
+    modify_valid=True
+    """
+    Analyze target PDF, detect two types of issues:
+    1. Characters using formats not in the template format list
+    2. Suspicious white overlay rectangles
+
+    :param file_path: Path to the PDF to analyze, or an open StatementDocument
+    :param template_formats: Template format list (from find_all_format), or a
+        TemplateIndex from compile_template
+    :param engine: Character extraction engine, 'pdfplumber' (default) or 'pymupdf'
+    :param max_violations: Fail-fast mode: stop after this many issues and skip the
+        remaining pages. None (default) is the full forensic report of every issue.
+    :param workers: Page-sharded mode: split the pages into this many contiguous
+        shards, each scanned by a worker process that opens the document itself.
+        Issues are merged back in page order, so the report is the same as a
+        single-process scan.
+    :param executor: Process pool to run the shards in (e.g. one kept warm across
+        documents); if None, a pool of `workers` processes is created on the first
+        call and reused by later ones
+    :param report: Optional dict filled with the details behind the verdict:
+        'format_violations', 'overlay_issues' and 'stopped_at_page'
+    :param memory_limit: Resident set size in MB above which the scan raises
+        MemoryLimitExceeded; the process-wide set_memory_limit() if None
+    :return: List of abnormal formats and overlay issues
+    """
+    # Store detection results
+    format_violations = []
+    overlay_issues = []
+    detect_result=[]
+    get_run_engine(engine)
+
+    # Template formats compiled once into comparable keys (considering float precision)
+    template = compile_template(template_formats)
+    # Page workers don't share this process's setting, so they are given the ceiling
+    memory_limit = memory_limit if memory_limit is not None else get_memory_limit()
+
+    # Open PDF once; pdfplumber is only loaded if that engine is selected
+    with open_document(file_path) as document:
+        pages = _scan_pages(document, template, engine, max_violations, workers, executor, memory_limit)
+
+    # Merge in page order, exactly as a single-process scan would have found them
+    stopped_at_page = None
+    for page_number, (violations, overlays) in enumerate(pages, 1):
+        format_violations.extend(violations)
+        overlay_issues.extend(overlays)
+        if max_violations is None:
+            continue
+        excess = len(format_violations) + len(overlay_issues) - max_violations
+        if excess >= 0:
+            # A shard only knew its own budget: trim this page's surplus, overlays
+            # first since a page's format violations are found before its overlays
+            dropped = min(excess, len(overlays))
+            del overlay_issues[len(overlay_issues) - dropped:]
+            del format_violations[len(format_violations) - (excess - dropped):]
+            stopped_at_page = page_number
+            break
+
+    if format_violations or overlay_issues:
+        modify_valid=False
+
+    # Report detection results; the details are only formatted if logging is enabled
     if format_violations:
-        result=f"Unusual formatting characters found: {violation['text']}"
+        result=f"Unusual formatting characters found: {format_violations[-1]['text']}"
         detect_result.append(result)
-        print("\n[!] Found abnormal formatting characters:")
-        for i, violation in enumerate(format_violations, 1):
-            print(f"\nAbnormal {i} (Page {violation['page']}):")
-            print(f"Text: '{violation['text']}'")
-            print(f"Position: {violation['position']}")
-            print(
-                f"Format: font={violation['format']['font']}, size={violation['format']['size']}, color={violation['format']['color']}")
+        logger.info("Found %d abnormal formatting character(s)", len(format_violations))
+        if logger.isEnabledFor(logging.INFO):
+            for i, violation in enumerate(format_violations, 1):
+                logger.info("Abnormal %d (page %d): text %r at %s, format font=%s, size=%s, color=%s",
+                            i, violation['page'], violation['text'], violation['position'],
+                            violation['format']['font'], violation['format']['size'],
+                            violation['format']['color'], extra={'violation': violation})
     else:
-        print("\n[✓] No abnormal formatting characters found")
+        logger.debug("No abnormal formatting characters found")
 
     if overlay_issues:
         detect_result.append('Suspicious white coverage found')
-        print("\n[!] Found suspicious white overlays:")
-        for i, overlay in enumerate(overlay_issues, 1):
-            print(f"\nOverlay {i} (Page {overlay['page']}):")
-            print(f"Coordinates: {overlay['coordinates']}")
-            print(f"Area: {overlay['area']:.1f} square units")
+        logger.info("Found %d suspicious white overlay(s)", len(overlay_issues))
+        if logger.isEnabledFor(logging.INFO):
+            for i, overlay in enumerate(overlay_issues, 1):
+                logger.info("Overlay %d (page %d): coordinates %s, area %.1f square units",
+                            i, overlay['page'], overlay['coordinates'], overlay['area'],
+                            extra={'overlay': overlay})
     else:
-        print("\n[✓] No suspicious white overlays found")
+        logger.debug("No suspicious white overlays found")
+
+    if stopped_at_page is not None:
+        logger.info("Fail-fast: stopped on page %d after %d issue(s)", stopped_at_page, max_violations)
+
+    if report is not None:
+        report.update({
+            'format_violations': format_violations,
+            'overlay_issues': overlay_issues,
+            'stopped_at_page': stopped_at_page
+        })
 
     return modify_valid,detect_result
 
-def modify_detect(file_path):
-    # Convert TEMPLATE_FORMATS to the format expected by analyze_pdf
-    template_formats = [
-        {
-            "font": fmt[0],
-            "size": fmt[1],
-            "color": fmt[2]
-        }
-        for fmt in TEMPLATE_FORMATS
-    ]
-    return analyze_pdf(file_path, template_formats)
+def modify_detect(file_path, engine=DEFAULT_ENGINE, max_violations=None, workers=None, executor=None,
+                  report=None, max_revisions=MAX_REVISIONS, memory_limit=None):
+    # Incremental updates are read from the raw bytes first: far cheaper than the glyph scan
+    with open_document(file_path) as document:
+        revisions_valid, revisions = revision_check(document, max_revisions)
+        if report is not None:
+            report['revisions'] = revisions['revisions']
+        if not revisions_valid:
+            logger.info("%s", revisions['message'])
+            if max_violations is not None:
+                # Fail-fast: the verdict is known before page 1 is scanned
+                if report is not None:
+                    report.update({'format_violations': [], 'overlay_issues': [], 'stopped_at_page': 0})
+                return False, [revisions['message']]
+
+        # The template is compiled on the first call and reused afterwards
+        formats = template_formats()
+        if _template_engine is not None and _template_engine != engine:
+            _warn_engine_mismatch(_template_engine, engine)
+        modify_valid, detect_result = analyze_pdf(document, compile_template(formats), engine=engine,
+                                                  max_violations=max_violations, workers=workers,
+                                                  executor=executor, report=report, memory_limit=memory_limit)
+    if not revisions_valid:
+        return False, [revisions['message']] + detect_result
+    return modify_valid, detect_result
 
 
 
@@ -1,144 +1,363 @@
+import logging
 import fitz  # PyMuPDF
 import os
+from estatementvalidator.document import StatementDocument
 
-def crop_enlarge_save_png(input_pdf_path,
-                          output_png_path,
-                          page_number=0,
-                          cut_top=50,
-                          cut_bottom=50,
-                          cut_left=50,
-                          cut_right=50,
-                          output_dpi=300): # Changed parameter for clarity
+logger = logging.getLogger(__name__)
+
+# --- Where the QR code sits on a BOC e-statement ---
+# Cuts in points (1 inch = 72 points) from the edges of the first page
+QR_PAGE_INDEX = 0
+QR_CUT_TOP = 605.0
+QR_CUT_BOTTOM = 195.0
+QR_CUT_LEFT = 525.0
+QR_CUT_RIGHT = 25.0
+# Higher DPI means larger pixel dimensions for the rendered image.
+# 300 DPI is good print quality. Use 600 or more for very high detail.
+QR_DPI = 600
+
+# --- What a QR code looks like in the page structure ---
+QR_LOCATOR = {
+    'min_side': 20.0,      # Points; smaller squares are logos or bullets
+    'max_side': 200.0,     # Points; larger squares are photos or backgrounds
+    'max_skew': 0.15,      # Allowed relative difference between width and height
+    'max_module': 6.0,     # Points; vector modules are small filled squares
+    'min_modules': 20,     # Filled squares needed before a vector cluster counts
+    'padding': 4.0         # Quiet zone in points added around a located code
+}
+
+def render_clip(input_pdf_path,
+                page_number=0,
+                cut_top=50,
+                cut_bottom=50,
+                cut_left=50,
+                cut_right=50,
+                output_dpi=300,
+                colorspace=fitz.csRGB,
+                clip=None):
     """
-    Extracts a central portion of a specific PDF page by cutting amounts
-    from the edges, renders this portion at a specified DPI (effectively
-    enlarging it in pixel dimensions), and saves it as a PNG image.
+    Renders a central portion of a specific PDF page, left after cutting
+    amounts from the edges (or an explicit clip rectangle), to an in-memory
+    pixmap at a specified DPI.
 
     Args:
-        input_pdf_path (str): Path to the source PDF file.
-        output_png_path (str): Path where the output PNG image will be saved.
+        input_pdf_path (str | StatementDocument): Path to the source PDF file,
+                                                  or an already opened document.
         page_number (int): The 0-based index of the page to process.
         cut_top (float): Points to cut off from the top edge.
         cut_bottom (float): Points to cut off from the bottom edge.
         cut_left (float): Points to cut off from the left edge.
         cut_right (float): Points to cut off from the right edge.
-        output_dpi (int): Resolution (dots per inch) for the output PNG.
-                          Higher DPI results in a larger, clearer image from the
-                          same source area. Common values: 96, 150, 300, 600.
+        output_dpi (int): Resolution (dots per inch) of the rendered image.
+        colorspace (fitz.Colorspace): fitz.csRGB, or fitz.csGRAY for one byte
+                                      per pixel.
+        clip (fitz.Rect): Area to render in page coordinates; overrides the cuts.
 
     Returns:
-        bool: True if successful, False otherwise.
+        fitz.Pixmap: The rendered area without alpha channel, or None on failure.
     """
-    if not os.path.exists(input_pdf_path):
-        print(f"Error: Input PDF not found at '{input_pdf_path}'")
-        return False
+    if isinstance(input_pdf_path, str) and not os.path.exists(input_pdf_path):
+        logger.error("Input PDF not found at '%s'", input_pdf_path)
+        return None
 
     # Validate cut amounts are non-negative
     if not (cut_top >= 0 and cut_bottom >= 0 and cut_left >= 0 and cut_right >= 0):
-         print("Error: Cut amounts (top, bottom, left, right) cannot be negative.")
-         return False
+         logger.error("Cut amounts (top, bottom, left, right) cannot be negative")
+         return None
 
     if output_dpi <= 0:
-         print("Error: Output DPI must be positive.")
-         return False
+         logger.error("Output DPI must be positive")
+         return None
 
-    doc = None
+    document = None
     try:
-        # --- 1. Open the Source PDF ---
-        doc = fitz.open(input_pdf_path)
+        # --- 1. Open the Source PDF (reused if the caller already opened it) ---
+        if isinstance(input_pdf_path, StatementDocument):
+            document = input_pdf_path
+        else:
+            document = StatementDocument(input_pdf_path)
+        doc = document.doc
         if not (0 <= page_number < len(doc)):
-            print(f"Error: Page number {page_number} is out of range (PDF has {len(doc)} pages).")
-            return False
+            logger.error("Page number %d is out of range (PDF has %d pages)", page_number, len(doc))
+            return None
 
         # --- 2. Get the Specified Page and its Dimensions ---
         page = doc.load_page(page_number)
         source_rect = page.rect   # Get the rectangle defining the page size (x0, y0, x1, y1)
-        print(f"Source page {page_number + 1} size: {source_rect.width:.2f} x {source_rect.height:.2f} points")
+        logger.debug("Source page %d size: %.2f x %.2f points", page_number + 1, source_rect.width, source_rect.height)
 
         # --- 3. Define the Rectangle to Keep (after cutting) ---
-        clip_x0 = source_rect.x0 + cut_left
-        clip_y0 = source_rect.y0 + cut_bottom
-        clip_x1 = source_rect.x1 - cut_right
-        clip_y1 = source_rect.y1 - cut_top
-
-        clip_rect = fitz.Rect(clip_x0, clip_y0, clip_x1, clip_y1)
-        print(f"Calculated area to keep: ({clip_rect.x0:.2f}, {clip_rect.y0:.2f}) to ({clip_rect.x1:.2f}, {clip_rect.y1:.2f})")
+        if clip is not None:
+            clip_rect = fitz.Rect(clip) & source_rect
+        else:
+            clip_rect = cut_rect(source_rect, cut_top, cut_bottom, cut_left, cut_right)
+        logger.debug("Calculated area to keep: (%.2f, %.2f) to (%.2f, %.2f)",
+                     clip_rect.x0, clip_rect.y0, clip_rect.x1, clip_rect.y1)
 
         # --- Validate the resulting clip_rect ---
         if clip_rect.is_empty or clip_rect.width <= 0 or clip_rect.height <= 0:
-             print(f"Error: Calculated clipping rectangle is invalid or has zero/negative area.")
-             print(f"  Page Width: {source_rect.width:.2f}, Total Horizontal Cut: {cut_left + cut_right:.2f}")
-             print(f"  Page Height: {source_rect.height:.2f}, Total Vertical Cut: {cut_top + cut_bottom:.2f}")
-             return False
-        print(f"  Resulting clip area size: {clip_rect.width:.2f} x {clip_rect.height:.2f} points")
+             logger.error("Calculated clipping rectangle is invalid or has zero/negative area "
+                          "(page %.2f x %.2f, horizontal cut %.2f, vertical cut %.2f)",
+                          source_rect.width, source_rect.height, cut_left + cut_right, cut_top + cut_bottom)
+             return None
+        logger.debug("Resulting clip area size: %.2f x %.2f points", clip_rect.width, clip_rect.height)
 
 
         # --- 4. Render the Clipped Area to a Pixmap (Image) at specified DPI ---
-        print(f"Rendering clipped area at {output_dpi} DPI...")
+        logger.debug("Rendering clipped area at %d DPI", output_dpi)
         pix = page.get_pixmap(
-            clip=clip_rect,    # Render *only* the clipped area
-            dpi=output_dpi,    # Control the output resolution (enlargement)
-            alpha=False        # Create RGB image, no transparency
+            clip=clip_rect,          # Render *only* the clipped area
+            dpi=output_dpi,          # Control the output resolution (enlargement)
+            colorspace=colorspace,   # RGB, or grayscale for barcode decoding
+            alpha=False              # No transparency
         )
 
-        if not pix.samples:
-            print("Error: Failed to render the clipped area to a pixmap.")
-            return False
-
-        print(f"Rendered image size: {pix.width} x {pix.height} pixels.")
+        if not pix.samples_mv:
+            logger.error("Failed to render the clipped area to a pixmap")
+            return None
 
-        # --- 5. Save the Pixmap as a PNG Image ---
-        # Create output directory if it doesn't exist
-        output_dir = os.path.dirname(output_png_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-            print(f"Created output directory: '{output_dir}'")
-
-        pix.save(output_png_path) # Pixmap object has a save method
-        print(f"Successfully saved cropped and enlarged image to: '{output_png_path}'")
-        return True
+        logger.debug("Rendered image size: %d x %d pixels", pix.width, pix.height)
+        return pix
 
     except Exception as e:
-        print(f"An error occurred: {e}")
         # Attempt to provide more specific feedback for common pixmap errors
         if "cannot render page" in str(e).lower():
-             print("  Hint: This might happen with complex or damaged PDFs.")
-        return False
+            logger.error("Rendering failed: %s (this might happen with complex or damaged PDFs)", e)
+        else:
+            logger.error("Rendering failed: %s", e)
+        return None
     finally:
-        # --- 6. Close Document ---
-        if doc:
-            doc.close()
+        # --- 5. Close Document (only if we opened it) ---
+        if document is not None and document is not input_pdf_path:
+            document.close()
 
-def qr2img(input_pdf,output_image_file):
-    target_page_index = 0  # Process the first page (index 0)
+def cut_rect(source_rect, cut_top, cut_bottom, cut_left, cut_right):
+    """The rectangle left after cutting amounts from the edges of `source_rect`."""
+    return fitz.Rect(source_rect.x0 + cut_left,
+                     source_rect.y0 + cut_bottom,
+                     source_rect.x1 - cut_right,
+                     source_rect.y1 - cut_top)
 
-    # --- Define Cuts in Points (1 inch = 72 points) ---
-    cut_off_top = 605.0
-    cut_off_bottom = 195.0  # Make sure these are floats if needed
-    cut_off_left = 525.0
-    cut_off_right = 25.0
+def _is_qr_shaped(rect):
+    side = max(rect.width, rect.height)
+    return (QR_LOCATOR['min_side'] <= side <= QR_LOCATOR['max_side']
+            and abs(rect.width - rect.height) <= QR_LOCATOR['max_skew'] * side)
 
-    # --- Define Output Image Resolution ---
-    # Higher DPI means larger pixel dimensions for the output image.
-    # 300 DPI is good print quality. Use 600 or more for very high detail.
-    image_dpi = 600
+def _is_dark(color):
+    return color is not None and sum(color) / len(color) < 0.5
 
-    print(f"Processing '{input_pdf}'...")
+def _drawing_candidates(page):
+    """Bounding boxes of vector QR codes: clusters of small, dark, filled squares."""
+    max_module = QR_LOCATOR['max_module']
+    clusters = []  # [bounding rect, number of filled squares]
+    for path in page.get_drawings():
+        if not _is_dark(path.get('fill')):
+            continue
+        rect = path['rect']
+        squares = sum(1 for item in path['items'] if item[0] in ('re', 'qu'))
+
+        # One path holding every module
+        if squares >= QR_LOCATOR['min_modules'] and _is_qr_shaped(rect):
+            yield rect
+            continue
+        if rect.width > max_module or rect.height > max_module:
+            continue
+
+        # One path per module (or per run of modules): grow adjacent clusters
+        cluster = [fitz.Rect(rect), max(squares, 1)]
+        grown = rect + (-max_module, -max_module, max_module, max_module)
+        for other in [c for c in clusters if c[0].intersects(grown)]:
+            clusters.remove(other)
+            cluster[0] |= other[0]
+            cluster[1] += other[1]
+        clusters.append(cluster)
+
+    for rect, squares in clusters:
+        if squares >= QR_LOCATOR['min_modules'] and _is_qr_shaped(rect):
+            yield rect
+
+def locate_qr(input_pdf, page_number=QR_PAGE_INDEX):
+    """
+    Finds the QR code on a page from the PDF structure rather than fixed margins.
+
+    Square raster images of QR size are preferred, then clusters of filled
+    vector squares. When several candidates qualify, the one closest to the
+    legacy crop area wins.
+
+    Args:
+        input_pdf (str | StatementDocument): Path to the PDF file, or an already
+                                             opened document.
+        page_number (int): The 0-based index of the page to search.
+
+    Returns:
+        dict: {'rect': fitz.Rect, 'xref': image xref or None, 'source': 'image'
+              or 'drawing'}, or None if nothing QR-like was found.
+    """
+    document = None
+    try:
+        document = input_pdf if isinstance(input_pdf, StatementDocument) else StatementDocument(input_pdf)
+        doc = document.doc
+        if not (0 <= page_number < len(doc)):
+            return None
+        page = doc.load_page(page_number)
+        legacy = cut_rect(page.rect, QR_CUT_TOP, QR_CUT_BOTTOM, QR_CUT_LEFT, QR_CUT_RIGHT)
+
+        def distance(rect):
+            if rect.intersects(legacy):
+                return 0.0
+            return abs(rect.x0 + rect.x1 - legacy.x0 - legacy.x1) + abs(rect.y0 + rect.y1 - legacy.y0 - legacy.y1)
+
+        images = [info for info in page.get_image_info(xrefs=True)
+                  if _is_qr_shaped(fitz.Rect(info['bbox']))]
+        if images:
+            info = min(images, key=lambda info: distance(fitz.Rect(info['bbox'])))
+            return {'rect': fitz.Rect(info['bbox']), 'xref': info['xref'] or None, 'source': 'image'}
+
+        drawings = list(_drawing_candidates(page))
+        if drawings:
+            return {'rect': min(drawings, key=distance), 'xref': None, 'source': 'drawing'}
+        return None
+
+    except Exception as e:
+        logger.warning("An error occurred while locating the QR code: %s", e)
+        return None
+    finally:
+        if document is not None and document is not input_pdf:
+            document.close()
+
+def embedded_qr_pixmap(input_pdf, xref, min_width=None):
+    """
+    Decodes an embedded raster image to a grayscale pixmap, without rendering
+    the page.
+
+    Args:
+        input_pdf (StatementDocument): The opened document holding the image.
+        xref (int): Cross-reference number of the image XObject.
+        min_width (int): If given, the image is halved while it stays at least
+                         this wide; the decoder's cost grows with the pixel count.
+
+    Returns:
+        fitz.Pixmap: One byte per pixel, or None if the image cannot be read.
+    """
+    try:
+        pix = fitz.Pixmap(input_pdf.doc, xref)
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)  # Drop the alpha channel
+        if pix.n != 1:
+            pix = fitz.Pixmap(fitz.csGRAY, pix)
+        if min_width:
+            halvings = 0
+            while pix.width >> (halvings + 1) >= min_width:
+                halvings += 1
+            if halvings:
+                pix.shrink(halvings)
+        return pix
+    except Exception as e:
+        logger.warning("Failed to read embedded image %d: %s", xref, e)
+        return None
+
+def save_pixmap_png(pix, output_png_path):
+    """Saves a rendered pixmap as a PNG image, creating the output directory if needed."""
+    output_dir = os.path.dirname(output_png_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        logger.debug("Created output directory: '%s'", output_dir)
+
+    pix.save(output_png_path) # Pixmap object has a save method
+    logger.info("Saved cropped and enlarged image to: '%s'", output_png_path)
+
+def crop_enlarge_save_png(input_pdf_path,
+                          output_png_path,
+                          page_number=0,
+                          cut_top=50,
+                          cut_bottom=50,
+                          cut_left=50,
+                          cut_right=50,
+                          output_dpi=300): # Changed parameter for clarity
+    """
+    Extracts a central portion of a specific PDF page by cutting amounts
+    from the edges, renders this portion at a specified DPI (effectively
+    enlarging it in pixel dimensions), and saves it as a PNG image.
+
+    Args:
+        input_pdf_path (str | StatementDocument): Path to the source PDF file,
+                                                  or an already opened document.
+        output_png_path (str): Path where the output PNG image will be saved.
+        page_number (int): The 0-based index of the page to process.
+        cut_top (float): Points to cut off from the top edge.
+        cut_bottom (float): Points to cut off from the bottom edge.
+        cut_left (float): Points to cut off from the left edge.
+        cut_right (float): Points to cut off from the right edge.
+        output_dpi (int): Resolution (dots per inch) for the output PNG.
+                          Higher DPI results in a larger, clearer image from the
+                          same source area. Common values: 96, 150, 300, 600.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    pix = render_clip(input_pdf_path, page_number, cut_top, cut_bottom, cut_left, cut_right, output_dpi)
+    if pix is None:
+        return False
+
+    try:
+        save_pixmap_png(pix, output_png_path)
+        return True
+    except Exception as e:
+        logger.error("Failed to save '%s': %s", output_png_path, e)
+        return False
+
+def qr2pixmap(input_pdf, debug_image_file=None, dpi=QR_DPI, clip=None):
+    """
+    Renders the QR code area of a statement to an in-memory grayscale pixmap.
+
+    Args:
+        input_pdf (str | StatementDocument): Path to the PDF file, or an already
+                                             opened document.
+        debug_image_file (str): If given, the rendered area is also saved there
+                                as a PNG for inspection.
+        dpi (int): Render resolution.
+        clip (fitz.Rect): Area to render, e.g. from locate_qr; the fixed QR_CUT_*
+                          margins are used if None.
+
+    Returns:
+        fitz.Pixmap: One byte per pixel, or None if rendering failed.
+    """
+    logger.debug("Rendering the QR code area of '%s'", input_pdf)
+    pix = render_clip(
+        input_pdf,
+        page_number=QR_PAGE_INDEX,
+        cut_top=QR_CUT_TOP,
+        cut_bottom=QR_CUT_BOTTOM,
+        cut_left=QR_CUT_LEFT,
+        cut_right=QR_CUT_RIGHT,
+        output_dpi=dpi,
+        colorspace=fitz.csGRAY,
+        clip=clip
+    )
+
+    if pix is not None and debug_image_file:
+        try:
+            save_pixmap_png(pix, debug_image_file)
+        except Exception as e:
+            logger.warning("Failed to save QR debug image: %s", e)
+
+    return pix
+
+def qr2img(input_pdf,output_image_file):
+    logger.debug("Rendering the QR code area of '%s'", input_pdf)
     success = crop_enlarge_save_png(
         input_pdf_path=input_pdf,
         output_png_path=output_image_file,
-        page_number=target_page_index,
-        cut_top=cut_off_top,
-        cut_bottom=cut_off_bottom,
-        cut_left=cut_off_left,
-        cut_right=cut_off_right,
-        output_dpi=image_dpi
+        page_number=QR_PAGE_INDEX,
+        cut_top=QR_CUT_TOP,
+        cut_bottom=QR_CUT_BOTTOM,
+        cut_left=QR_CUT_LEFT,
+        cut_right=QR_CUT_RIGHT,
+        output_dpi=QR_DPI
     )
 
-    if success:
-        print("\nImage processing complete.")
-    else:
-        print("\nImage processing failed.")
+    if not success:
+        logger.error("Image processing failed for '%s'", input_pdf)
 
     return output_image_file
 
@@ -1,15 +1,17 @@
-import fitz
+import logging
+from estatementvalidator.document import open_document
+
+logger = logging.getLogger(__name__)
 
 Target_Producer="; modified using iText 2.1.7 by 1T3XT"
 
 def producer_check(file):
     try:
-        with fitz.open(file) as doc:
-            producer = doc.metadata.get("producer", "").strip()
+        with open_document(file) as document:
+            producer = document.doc.metadata.get("producer", "").strip()
             return producer == Target_Producer
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.error("Producer check failed: %s", e)
         return False
 
-
@@ -0,0 +1,270 @@
+"""
+Incremental-update analysis of the raw PDF bytes.
+
+An edit saved incrementally leaves the original bytes in place and appends
+the changed objects, a new xref section and another %%EOF. Walking those
+sections tells which objects every revision added, and flags an edited
+statement without parsing any page content. Files are memory-mapped: apart
+from the search for %%EOF markers, only the xref sections, trailers and Info
+dictionaries are read.
+"""
+
+import mmap
+import os
+import re
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from estatementvalidator.document import StatementDocument, is_path, source_bytes
+from estatementvalidator.timing import stage
+
+# A genuine statement: the original, plus at most the iText stamping pass
+MAX_REVISIONS = 2
+
+EOF_MARKER = b'%%EOF'
+STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+XREF_TOKEN_RE = re.compile(rb'(\d+)\s+(\d+)(?:\s+([nf]))?')  # A subsection header, or an entry
+OBJECT_HEADER_RE = re.compile(rb'(\d+)\s+\d+\s+obj\b')
+LINEARIZED_RE = re.compile(rb'/Linearized\b')
+DICT_KEY_RES = {
+    'prev': re.compile(rb'/Prev\s+(\d+)'),
+    'info': re.compile(rb'/Info\s+(\d+)\s+\d+\s+R'),
+    'size': re.compile(rb'/Size\s+(\d+)'),
+    'widths': re.compile(rb'/W\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s*\]'),
+    'index': re.compile(rb'/Index\s*\[([\d\s]*)\]'),
+    'length': re.compile(rb'/Length\s+(\d+)(?!\s+\d+\s+R)'),
+    'predictor': re.compile(rb'/Predictor\s+(\d+)'),
+    'columns': re.compile(rb'/Columns\s+(\d+)'),
+}
+INFO_STRING_RES = {
+    'producer': re.compile(rb'/Producer\s*\(((?:[^()\\]|\\.)*)\)'),
+    'mod_date': re.compile(rb'/ModDate\s*\(((?:[^()\\]|\\.)*)\)'),
+}
+
+
+@contextmanager
+def _buffer(source):
+    """The raw bytes of `source`: memory-mapped for a path, shared for bytes or a document"""
+    if isinstance(source, StatementDocument):
+        yield source.data
+    elif is_path(source):
+        with open(os.fspath(source), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+    else:
+        yield source_bytes(source)
+
+
+def _int(pattern: re.Pattern, text: bytes) -> Optional[int]:
+    match = pattern.search(text)
+    return int(match.group(1)) if match else None
+
+
+def _table_entries(data, offset: int, end: int) -> Tuple[Dict[int, Optional[int]], List[int], bytes]:
+    """Offsets of the objects a classic xref table writes, the numbers it frees, and its trailer dictionary"""
+    objects, freed = {}, []
+    trailer = data.find(b'trailer', offset, end)
+    if trailer < 0:
+        trailer = end
+    next_number = 0
+    for first, second, kind in XREF_TOKEN_RE.findall(data[offset + len(b'xref'):trailer]):
+        if not kind:
+            next_number = int(first)
+            continue
+        if kind == b'n':
+            objects[next_number] = int(first)
+        elif next_number:  # Object 0 heads the free list
+            freed.append(next_number)
+        next_number += 1
+    return objects, freed, bytes(data[trailer:end])
+
+
+def _unpredict(raw: bytes, columns: int) -> bytes:
+    """Undo the PNG row filters of an xref stream (/Predictor 10 to 15)"""
+    rows, previous = [], bytearray(columns)
+    for start in range(0, len(raw), columns + 1):
+        kind, row = raw[start], bytearray(raw[start + 1:start + 1 + columns])
+        for i in range(len(row)):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                upper_left = previous[i - 1] if i else 0
+                estimate = left + up - upper_left
+                distances = (abs(estimate - left), abs(estimate - up), abs(estimate - upper_left))
+                row[i] = (row[i] + (left, up, upper_left)[distances.index(min(distances))]) & 0xFF
+        rows.append(bytes(row))
+        previous = row
+    return b''.join(rows)
+
+
+def _stream_entries(data, offset: int, end: int) -> Optional[Tuple[Dict[int, Optional[int]], List[int], bytes]]:
+    """Offsets of the objects an xref stream writes (None inside object streams), the numbers it
+    frees, and its dictionary; None if it can't be decoded"""
+    stream_start = data.find(b'stream', offset, end)
+    if stream_start < 0:
+        return None
+    dictionary = bytes(data[offset:stream_start])
+    widths = DICT_KEY_RES['widths'].search(dictionary)
+    length = _int(DICT_KEY_RES['length'], dictionary)
+    if widths is None or length is None or (b'/Filter' in dictionary and b'/FlateDecode' not in dictionary):
+        return None
+    body_start = stream_start + len(b'stream')
+    body_start += 2 if data[body_start:body_start + 2] == b'\r\n' else 1
+    try:
+        raw = bytes(data[body_start:body_start + length])
+        if b'/FlateDecode' in dictionary:
+            raw = zlib.decompress(raw)
+    except zlib.error:
+        return None
+
+    w1, w2, w3 = (int(width) for width in widths.groups())
+    if (_int(DICT_KEY_RES['predictor'], dictionary) or 1) >= 10:
+        raw = _unpredict(raw, _int(DICT_KEY_RES['columns'], dictionary) or 1)
+    index = DICT_KEY_RES['index'].search(dictionary)
+    ranges = [int(value) for value in index.group(1).split()] if index else [0, _int(DICT_KEY_RES['size'], dictionary) or 0]
+
+    objects, freed = {}, []
+    entry_size, cursor = w1 + w2 + w3, 0
+    for first, number in zip(ranges[::2], ranges[1::2]):
+        for object_number in range(first, first + number):
+            entry = raw[cursor:cursor + entry_size]
+            cursor += entry_size
+            if len(entry) < entry_size:
+                break
+            kind = int.from_bytes(entry[:w1], 'big') if w1 else 1
+            if kind == 0:
+                if object_number:
+                    freed.append(object_number)
+            else:
+                objects[object_number] = int.from_bytes(entry[w1:w1 + w2], 'big') if kind == 1 else None
+    return objects, freed, dictionary
+
+
+def _info_strings(data, objects: Dict[int, Optional[int]], dictionary: bytes) -> Dict[str, Optional[str]]:
+    """Producer and ModDate of the Info dictionary, if this revision wrote it outside an object stream"""
+    strings = dict.fromkeys(INFO_STRING_RES)
+    info = _int(DICT_KEY_RES['info'], dictionary)
+    offset = objects.get(info)
+    if offset is None or offset >= len(data):
+        return strings
+    end = data.find(b'endobj', offset)
+    segment = bytes(data[offset:end if end >= 0 else len(data)])
+    for key, pattern in INFO_STRING_RES.items():
+        match = pattern.search(segment)
+        if match:
+            strings[key] = match.group(1).decode('latin-1')
+    return strings
+
+
+def _revision(data, number: int, start: int, end: int) -> Dict[str, Any]:
+    startxref = STARTXREF_RE.match(data, max(start, data.rfind(b'startxref', start, end)), end)
+    offset = int(startxref.group(1)) if startxref else None
+    section_end = startxref.start() if startxref else end
+
+    parsed = None
+    kind = 'unknown'
+    if offset is not None and offset < len(data):
+        if data[offset:offset + 4] == b'xref':
+            kind = 'table'
+            parsed = _table_entries(data, offset, section_end)
+        elif OBJECT_HEADER_RE.match(data, offset, min(offset + 32, section_end)):
+            kind = 'stream'
+            parsed = _stream_entries(data, offset, section_end)
+    if parsed is None:
+        # Not a readable xref section: fall back to the object headers written in the range
+        objects = {int(match.group(1)): match.start() for match in OBJECT_HEADER_RE.finditer(data, start, end)}
+        parsed = objects, [], b''
+
+    objects, freed, dictionary = parsed
+    return {
+        'revision': number,
+        'start': start,
+        'end': end,
+        'xref_offset': offset,
+        'xref': kind,
+        'prev': _int(DICT_KEY_RES['prev'], dictionary),
+        'objects': sorted(objects),
+        'freed': freed,
+        **_info_strings(data, objects, dictionary)
+    }
+
+
+def scan_revisions(source) -> List[Dict[str, Any]]:
+    """
+    Split a PDF into its incremental revisions.
+
+    Args:
+        source (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+
+    Returns:
+        List[Dict[str, Any]]: One entry per revision, oldest first: its byte range
+            ('start', 'end'), 'xref_offset' and 'xref' kind ('table', 'stream' or
+            'unknown'), the 'prev' xref offset of its trailer, the object numbers it
+            wrote ('objects') or freed ('freed'), and the 'producer' and 'mod_date'
+            it set, if readable
+    """
+    with stage('revisions'), _buffer(source) as data:
+        revisions = []
+        start = 0
+        for number, end in enumerate(_revision_ends(data), 1):
+            revisions.append(_revision(data, number, start, end))
+            start = end
+        return revisions
+
+
+def _revision_ends(data) -> List[int]:
+    """End offset of every revision: each save appended with %%EOF is one"""
+    boundaries = []
+    position = data.find(EOF_MARKER)
+    while position >= 0:
+        end = position + len(EOF_MARKER)
+        # The end-of-line after %%EOF still belongs to this revision
+        while end < len(data) and data[end:end + 1] in (b'\r', b'\n'):
+            end += 1
+        boundaries.append(end)
+        position = data.find(EOF_MARKER, end)
+
+    # A linearized file's first-page xref ends in its own %%EOF, but it is one revision
+    if len(boundaries) > 1 and LINEARIZED_RE.search(data, 0, min(len(data), 1024)):
+        del boundaries[0]
+    return boundaries
+
+
+def count_revisions(source) -> int:
+    """The number of revisions scan_revisions finds, without parsing their xref sections"""
+    with stage('revisions'), _buffer(source) as data:
+        return len(_revision_ends(data))
+
+
+def revision_check(source, max_revisions: int = MAX_REVISIONS) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Flag a PDF with more incremental revisions than a genuine statement has.
+
+    Args:
+        source (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+        max_revisions (int): Revisions a genuine statement may have
+
+    Returns:
+        Tuple[bool, Dict[str, Any]]: (is_valid, {'revision_count', 'revisions', 'message'})
+    """
+    revisions = scan_revisions(source)
+    is_valid = len(revisions) <= max_revisions
+    message = None
+    if not is_valid:
+        added = sorted({number for revision in revisions[max_revisions:] for number in revision['objects']})
+        message = (f"Incremental updates found: {len(revisions)} revisions, at most {max_revisions} expected; "
+                   f"bytes {revisions[max_revisions]['start']} to {revisions[-1]['end']} added objects {added}")
+    return is_valid, {
+        'revision_count': len(revisions),
+        'revisions': revisions,
+        'message': message
+    }
@@ -0,0 +1,358 @@
+"""
+HTTP validation service.
+
+POST the bytes of a statement to /validate and get the validate_document
+result back as JSON:
+
+    curl --data-binary @statement.pdf -H 'Content-Type: application/pdf' \
+         http://127.0.0.1:8080/validate
+
+The CPU-bound checks run in a pool of worker processes that are started, and
+have imported their libraries and compiled the template, before the first
+request arrives; the API-bound checks run in the request thread with a shared
+ConversionClient. At most `queue_size` statements are admitted at once, and
+any further request is answered 429 straight away instead of piling up.
+GET /health and GET /metrics report the state of the service.
+
+    python -m estatementvalidator serve --stub --stub-address "FLAT A 1/F\\n1 TEST ROAD"
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from estatementvalidator.batch import _error_result, _local_stage, _remote_stage, _worker_cache
+from estatementvalidator.cache import ResultCache
+from estatementvalidator.client import ConversionClient
+from estatementvalidator.stub_server import StubHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+# Statements admitted at once per worker process: one being checked, the rest queued
+QUEUE_PER_WORKER = 4
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+# Latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 1024
+# Seconds the worker processes are given to start and import their libraries
+WARMUP_TIMEOUT = 120
+
+# Set in each worker process by _warm_worker
+_warmup_barrier = None
+
+
+class _UploadTooLarge(Exception):
+    """The request body is longer than the service accepts"""
+
+
+def _warm_worker(memory_limit: Optional[float] = None, barrier=None) -> None:
+    """Process pool initializer: import the check libraries and compile the template up front"""
+    global _warmup_barrier
+    _warmup_barrier = barrier
+    from estatementvalidator import estatement_validator  # noqa: F401
+    from estatementvalidator.memory import set_memory_limit
+    set_memory_limit(memory_limit)
+    from estatementvalidator.modify_check import compile_template, template_formats
+    compile_template(template_formats())
+    try:
+        from PIL import Image  # noqa: F401
+        from pyzbar import pyzbar  # noqa: F401
+    except ImportError as e:
+        logger.warning("QR decoding libraries could not be preloaded: %s", e)
+
+
+def _ready() -> int:
+    # Hold this worker until every worker has taken one task, so none takes two
+    if _warmup_barrier is not None:
+        _warmup_barrier.wait(WARMUP_TIMEOUT)
+    return os.getpid()
+
+
+def _flag(query: Dict[str, list], name: str) -> bool:
+    return query.get(name, ['0'])[0].lower() in ('1', 'true', 'yes')
+
+
+class ValidationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # The same JSON answers as the stub conversion server
+    _send_json = StubHandler._send_json
+
+    def _content_length(self) -> Optional[int]:
+        """The declared body length, None for a chunked body; ValueError if malformed"""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return None
+        length = int(self.headers.get('Content-Length') or 0)
+        if length < 0:
+            raise ValueError(f"Negative Content-Length {length}")
+        return length
+
+    def _read_body(self, limit: int) -> bytes:
+        """
+        Read the request body, plain or chunked, and raise _UploadTooLarge as soon as
+        it exceeds `limit` bytes, so a chunked upload is never buffered past it.
+        """
+        length = self._content_length()
+        if length is not None:
+            if length > limit:
+                raise _UploadTooLarge()
+            return self.rfile.read(length)
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                # Skip trailers up to the terminating blank line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return bytes(body)
+            if len(body) + size > limit:
+                raise _UploadTooLarge()
+            body += self.rfile.read(size)
+            self.rfile.readline()
+
+    def _send_too_large(self):
+        self.close_connection = True
+        self.server.count('too_large')
+        self._send_json(413, {'detail': f'Statements are limited to {self.server.max_upload} bytes'})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            healthy = not self.server.closing
+            self._send_json(200 if healthy else 503, {'status': 'ok' if healthy else 'closing',
+                                                      'workers': self.server.workers})
+        elif path == '/metrics':
+            self._send_json(200, self.server.metrics())
+        else:
+            self._send_json(404, {'detail': 'Not Found'})
+
+    def do_POST(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path != '/validate':
+            self.close_connection = True
+            self._send_json(404, {'detail': 'Not Found'})
+            return
+        try:
+            length = self._content_length()
+        except ValueError:
+            self.close_connection = True
+            self._send_json(400, {'detail': 'Invalid Content-Length'})
+            return
+        if length is not None and length > server.max_upload:
+            self._send_too_large()
+            return
+
+        # Refuse before reading the body, so an overloaded service does not buffer uploads
+        if not server.admit():
+            self.close_connection = True
+            server.count('rejected')
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Type', 'application/json')
+            body = json.dumps({'detail': 'Too many statements in flight, retry later'}).encode('utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        try:
+            try:
+                data = self._read_body(server.max_upload)
+            except _UploadTooLarge:
+                self._send_too_large()
+                return
+            except ValueError:
+                self.close_connection = True
+                self._send_json(400, {'detail': 'Invalid chunked body'})
+                return
+            is_valid, result = server.validate(data, forensics=_flag(parse_qs(url.query), 'forensics'))
+        finally:
+            server.release()
+        payload = {'valid': is_valid}
+        payload.update(result)
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(422 if result.get('result') == 'error' else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class ValidationService(ThreadingHTTPServer):
+    """
+    Threaded HTTP validation service with a warm worker pool.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind, 0 picks a free port
+        api_url (str): Base URL of the conversion API
+        workers (int): Worker processes for the CPU-bound checks (default: os.cpu_count())
+        queue_size (int): Statements admitted at once, checked or waiting; further
+            requests get 429 (default: four per worker)
+        cache (ResultCache): Result cache; worker processes only use a SQLite or
+            directory backend
+        client (ConversionClient): Client for the conversion API; one sized to the
+            queue is created if None
+        upload (str | dict): What the extraction request sends (see upload.py)
+        extraction (str): 'llm' (default), 'auto' or 'local' (see local_extractor.py)
+        max_upload (int): Largest statement accepted, in bytes
+        memory_limit (float): Resident MB above which a worker gives up on a statement
+            and answers an 'error' result (see memory.py)
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, api_url: str = "http://localhost:8000",
+                 workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 cache: Optional[ResultCache] = None, client: Optional[ConversionClient] = None,
+                 upload=None, extraction: str = 'llm', max_upload: int = MAX_UPLOAD_BYTES,
+                 memory_limit: Optional[float] = None):
+        super().__init__((host, port), ValidationHandler)
+        self.api_url = api_url
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * QUEUE_PER_WORKER
+        self.cache = cache
+        self.upload = upload
+        self.extraction = extraction
+        self.max_upload = max_upload
+        self.memory_limit = memory_limit
+        self.closing = False
+
+        self._own_client = client is None
+        self.client = client or ConversionClient(pool_size=self.queue_size)
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._counters = Counter()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._in_flight = 0
+        self._started = time.time()
+        self._thread = None
+        self._pool = self._make_pool()
+
+    def _make_pool(self) -> ProcessPoolExecutor:
+        barrier = multiprocessing.Barrier(self.workers)
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                   initargs=(self.memory_limit, barrier))
+        # Start every worker now rather than on the first requests: each _ready waits
+        # at the barrier until all workers hold one, so every worker runs exactly one
+        pids = {future.result() for future in [pool.submit(_ready) for _ in range(self.workers)]}
+        logger.debug("%d worker processes started: %s", len(pids), sorted(pids))
+        return pool
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self) -> bool:
+        if self.closing or not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _local(self, data: bytes, forensics: bool):
+        pool = self._pool
+        try:
+            return pool.submit(_local_stage, data, _worker_cache(self.cache), forensics).result()
+        except BrokenProcessPool:
+            # Replace the pool once, whichever request noticed first
+            with self._pool_lock:
+                if self._pool is pool:
+                    self.count('pool_restarts')
+                    pool.shutdown(wait=False)
+                    self._pool = self._make_pool()
+            logger.error("Worker process crashed while checking a statement")
+            return _error_result('Worker process crashed while checking this document'), None, None
+
+    def validate(self, data: bytes, forensics: bool = False) -> Tuple[bool, Dict[str, Any]]:
+        """Run every check on the statement bytes; never raises"""
+        start = time.perf_counter()
+        is_valid, result = False, None
+        try:
+            failure_result, qr_data, qr_rung = self._local(data, forensics)
+            if failure_result is not None:
+                result = failure_result
+            else:
+                is_valid, result = _remote_stage(data, qr_data, self.api_url, self.cache, qr_rung, self.client,
+                                                 self.upload, self.extraction)
+        except Exception as e:
+            result = _error_result(str(e))
+        finally:
+            with self._lock:
+                self._counters['requests'] += 1
+                self._counters[(result or {}).get('result', 'error')] += 1
+                self._latencies.append(time.perf_counter() - start)
+        return is_valid, result
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+            in_flight = self._in_flight
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))] if latencies else None
+
+        return {
+            'uptime_seconds': time.time() - self._started,
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'in_flight': in_flight,
+            'requests': counters.get('requests', 0),
+            'results': {result: counters.get(result, 0) for result in ('pass', 'fail', 'error')},
+            'rejected': counters.get('rejected', 0),
+            'too_large': counters.get('too_large', 0),
+            'pool_restarts': counters.get('pool_restarts', 0),
+            'latency_seconds': {'p50': percentile(50), 'p99': percentile(99), 'window': len(latencies)}
+        }
+
+    def start(self):
+        """Serve from a background thread and return self"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.closing = True
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def server_close(self):
+        super().server_close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._own_client:
+            self.client.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,168 @@
+"""
+Stand-in for the /convert-pdf-with-images conversion service.
+
+Answers every conversion request with a fixed statement summary in the same
+shape as the real service (a ```json fenced block in the 'result' field), after
+an optional delay that mimics model latency. The uploaded file may be the PDF,
+its extracted text or rendered page images; the server counts each kind. Used to exercise the validator
+offline, e.g.
+
+    python -m estatementvalidator.stub_server --port 8000 --address "FLAT A 1/F\n1 TEST ROAD"
+"""
+
+import argparse
+import json
+import re
+import threading
+from collections import Counter
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Content types of the upload modes, and the kind each is counted as
+UPLOAD_KINDS = {'application/pdf': 'pdf', 'text/plain': 'text', 'image/png': 'image', 'image/jpeg': 'image'}
+_PART_CONTENT_TYPE = re.compile(rb'\r\nContent-Type: *([\w.+-]+/[\w.+-]+)', re.IGNORECASE)
+
+DEFAULT_SUMMARY = {
+    "Name": "",
+    "Bank_code": "",
+    "User_address": "",
+    "Bank_address": "",
+    "Account_Number": "",
+    "Statement_Date": "",
+    "Account_type": ""
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self._read_body()
+        with server.lock:
+            server.requests += 1
+            server.bytes_received += len(body)
+
+        if not self.path.split('?')[0].endswith('/convert-pdf-with-images'):
+            self._send_json(404, {'detail': 'Not Found'})
+            return
+        with server.lock:
+            failing = server.failures > 0
+            server.failures -= failing
+        if failing:
+            self._send_json(503, {'detail': 'Service Unavailable'})
+            return
+
+        kinds = [UPLOAD_KINDS.get(content_type.decode('ascii').lower())
+                 for content_type in _PART_CONTENT_TYPE.findall(body)]
+        kinds = [kind for kind in kinds if kind is not None]
+        if not kinds:
+            self._send_json(422, {'detail': 'Expected a PDF, text or image file'})
+            return
+        with server.lock:
+            server.uploads.update(kinds)
+
+        if server.delay:
+            time.sleep(server.delay)
+        summary = json.dumps(server.summary, indent=2)
+        self._send_json(200, {'result': f'```json\n{summary}\n```'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Threaded stub conversion server.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind, 0 picks a free port
+        summary (dict): Fields returned as the statement summary
+        delay (float): Seconds to wait before answering each request
+        failures (int): Conversion requests answered 503 before the first success,
+            to exercise the clients' retries
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, summary=None, delay=0.0, failures=0):
+        super().__init__((host, port), StubHandler)
+        self.summary = dict(DEFAULT_SUMMARY, **(summary or {}))
+        self.delay = delay
+        self.failures = failures
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0
+        self.uploads = Counter()  # 'pdf', 'text' or 'image' -> files received
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread and return self"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stub conversion service for offline validation runs')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--address', default='', help='User_address to return (use \\n between lines)')
+    parser.add_argument('--name', default='', help='Name to return')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds of simulated model latency')
+    parser.add_argument('--failures', type=int, default=0, help='Conversion requests to answer 503 first')
+    args = parser.parse_args(argv)
+
+    summary = {'User_address': args.address.replace('\\n', '\n'), 'Name': args.name}
+    server = StubServer(args.host, args.port, summary=summary, delay=args.delay, failures=args.failures)
+    print(f"Stub conversion service listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
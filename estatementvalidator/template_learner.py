@@ -0,0 +1,222 @@
+"""
+Learn the template formats from a corpus of known-genuine statements.
+
+Every statement is profiled in a worker process: each glyph is counted under
+its (font, size, color) format, and where it sits on the page goes into that
+format's horizontal and vertical histograms. The profiles are merged per
+template version into a JSON file that the modification check loads instead
+of the built-in TEMPLATE_FORMATS:
+
+    python -m estatementvalidator learn-template 2024=corpus/2024/ 2025=corpus/2025/ -o template.json
+
+The file is reproducible: the same corpus gives the same bytes, whatever the
+number of workers or the order the files were found in.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from estatementvalidator.document import open_document, portable_source
+from estatementvalidator.modify_check import DEFAULT_ENGINE, format_key, get_run_engine, iter_pages
+
+TEMPLATE_SCHEMA = 1
+# Buckets of the positional histograms, across the page width and down the page height
+HISTOGRAM_BINS = 10
+# Statements handed to a worker process at a time
+LEARN_CHUNK_SIZE = 8
+
+
+def _bucket(value: float, extent: float) -> int:
+    return min(max(int(value / extent * HISTOGRAM_BINS), 0), HISTOGRAM_BINS - 1) if extent else 0
+
+
+def profile_statement(source, engine: str = DEFAULT_ENGINE) -> Dict[str, Any]:
+    """
+    Glyph counts and positional histograms per format of one statement.
+
+    Args:
+        source (str | bytes | BinaryIO | StatementDocument): The statement
+        engine (str): Character extraction engine, 'pdfplumber' (default) or 'pymupdf'
+
+    Returns:
+        Dict[str, Any]: {'sha256', 'pages', 'formats': {(font, size, color):
+            {'glyphs', 'x', 'y'}}}, where 'x' and 'y' are HISTOGRAM_BINS counts
+    """
+    page_runs = get_run_engine(engine)
+    formats = {}
+    with open_document(source) as document:
+        for page_num in iter_pages(document, range(document.page_count)):
+            rect = document.doc[page_num].rect
+            for font, size, color, chars in page_runs(document, page_num):
+                key = format_key(font, size, color)
+                profile = formats.get(key)
+                if profile is None:
+                    profile = formats[key] = {'glyphs': 0, 'x': [0] * HISTOGRAM_BINS, 'y': [0] * HISTOGRAM_BINS}
+                for char in chars:
+                    profile['glyphs'] += 1
+                    profile['x'][_bucket(char['x0'], rect.width)] += 1
+                    profile['y'][_bucket(char['top'], rect.height)] += 1
+        return {'sha256': document.sha256, 'pages': document.page_count, 'formats': formats}
+
+
+def _profile_chunk(sources, engine):
+    profiles = []
+    for source in sources:
+        try:
+            profiles.append(profile_statement(source, engine))
+        except Exception as e:
+            profiles.append({'error': str(e)})
+    return profiles
+
+
+def _iter_profiles(paths: Iterable, workers: int, engine: str):
+    """(source, profile) pairs, profiled in chunks by a process pool"""
+    sources = list(paths)
+    if workers == 1:
+        for source in sources:
+            yield source, _profile_chunk([source], engine)[0]
+        return
+    chunks = [sources[start:start + LEARN_CHUNK_SIZE] for start in range(0, len(sources), LEARN_CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_profile_chunk, [portable_source(source) for source in chunk], engine)
+                   for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            yield from zip(chunk, future.result())
+
+
+def _color_value(color):
+    return list(color) if isinstance(color, tuple) else color
+
+
+def learn_version(paths: Iterable, workers: Optional[int] = None, engine: str = DEFAULT_ENGINE,
+                  min_documents: int = 1) -> Tuple[Dict[str, Any], List[Tuple[Any, str]]]:
+    """
+    Aggregate the format profiles of a corpus of one template version.
+
+    Args:
+        paths (Iterable): Genuine statements of this version: paths, bytes or streams
+        workers (int): Worker processes (default: os.cpu_count()); 1 profiles in this process
+        engine (str): Character extraction engine
+        min_documents (int): Keep only formats found in at least this many statements
+
+    Returns:
+        Tuple: (version, errors), where version is {'documents', 'pages', 'corpus_sha256',
+            'formats': [{'font', 'size', 'color', 'glyphs', 'documents', 'x_histogram',
+            'y_histogram'}, ...]}, most frequent format first, and errors lists the
+            (source, message) of statements that could not be profiled
+    """
+    workers = workers or os.cpu_count() or 1
+    glyphs, documents = Counter(), Counter()
+    x_histograms, y_histograms = {}, {}
+    digests, pages, errors = set(), 0, []
+
+    for source, profile in _iter_profiles(paths, workers, engine):
+        if 'error' in profile:
+            errors.append((source, profile['error']))
+            continue
+        if profile['sha256'] in digests:
+            continue  # A copy of a statement must not weigh twice
+        digests.add(profile['sha256'])
+        pages += profile['pages']
+        for key, counts in profile['formats'].items():
+            glyphs[key] += counts['glyphs']
+            documents[key] += 1
+            x_histograms[key] = [a + b for a, b in zip(x_histograms.get(key, [0] * HISTOGRAM_BINS), counts['x'])]
+            y_histograms[key] = [a + b for a, b in zip(y_histograms.get(key, [0] * HISTOGRAM_BINS), counts['y'])]
+
+    kept = [key for key in glyphs if documents[key] >= min_documents]
+    kept.sort(key=lambda key: (-glyphs[key], key[0], key[1], json.dumps(_color_value(key[2]))))
+    return {
+        'documents': len(digests),
+        'pages': pages,
+        'corpus_sha256': hashlib.sha256(''.join(sorted(digests)).encode('ascii')).hexdigest(),
+        'formats': [{
+            'font': font,
+            'size': size,
+            'color': _color_value(color),
+            'glyphs': glyphs[(font, size, color)],
+            'documents': documents[(font, size, color)],
+            'x_histogram': x_histograms[(font, size, color)],
+            'y_histogram': y_histograms[(font, size, color)]
+        } for font, size, color in kept]
+    }, errors
+
+
+def learn_template(corpora: Dict[str, Iterable], workers: Optional[int] = None, engine: str = DEFAULT_ENGINE,
+                   min_documents: int = 1) -> Tuple[Dict[str, Any], List[Tuple[Any, str]]]:
+    """
+    Build a template file from one corpus per template version.
+
+    Args:
+        corpora (Dict[str, Iterable]): Version name to its genuine statements; the
+            last version becomes the 'current' one
+        workers (int): Worker processes (default: os.cpu_count())
+        engine (str): Character extraction engine
+        min_documents (int): Keep only formats found in at least this many statements
+
+    Returns:
+        Tuple: (template, errors): the template file content and the statements that
+            could not be profiled
+    """
+    versions, errors = {}, []
+    for name, paths in corpora.items():
+        versions[name], version_errors = learn_version(paths, workers, engine, min_documents)
+        errors.extend(version_errors)
+    return {
+        'schema': TEMPLATE_SCHEMA,
+        'engine': engine,
+        'histogram_bins': HISTOGRAM_BINS,
+        'current': next(reversed(versions), None),
+        'versions': versions
+    }, errors
+
+
+def save_template(template: Dict[str, Any], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(template, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def _read_template(path: str, version: Optional[str] = None) -> Tuple[List[Tuple[str, float, Any]], Optional[str]]:
+    """The formats of one version of a template file, and the engine it was learned with"""
+    with open(path, encoding='utf-8') as f:
+        template = json.load(f)
+    if template.get('schema') != TEMPLATE_SCHEMA:
+        raise ValueError(f"Unsupported template schema {template.get('schema')!r} in {path}, "
+                         f"expected {TEMPLATE_SCHEMA}")
+    version = version or template.get('current')
+    if version not in template.get('versions', {}):
+        raise ValueError(f"Template version {version!r} not found in {path}, "
+                         f"expected one of {sorted(template.get('versions', {}))}")
+    formats = [(fmt['font'], fmt['size'], tuple(fmt['color']) if isinstance(fmt['color'], list) else fmt['color'])
+               for fmt in template['versions'][version]['formats']]
+    return formats, template.get('engine')
+
+
+def load_template(path: str, version: Optional[str] = None,
+                  engine: Optional[str] = None) -> List[Tuple[str, float, Any]]:
+    """
+    The (font, size, color) formats of one version of a template file.
+
+    Args:
+        path (str): Template file written by learn-template
+        version (str): Version to use; the file's 'current' version if None
+        engine (str): Engine the statements will be checked with; a template learned
+            with another engine is rejected, since the engines report colors differently
+
+    Returns:
+        List[Tuple[str, float, Any]]: Formats in the shape of TEMPLATE_FORMATS
+    """
+    formats, learned_with = _read_template(path, version)
+    _check_engine(path, learned_with, engine)
+    return formats
+
+
+def _check_engine(path: str, learned_with: Optional[str], engine: Optional[str]) -> None:
+    if engine is not None and learned_with is not None and learned_with != engine:
+        raise ValueError(f"Template {path} was learned with the {learned_with!r} engine, "
+                         f"statements are checked with {engine!r}")
@@ -0,0 +1,144 @@
+"""
+Per-stage timing and counters for validation runs.
+
+The checks wrap their stages in `stage(name)` and report quantities with
+`count(name, value)`. Both are close to free unless a profile is being
+collected (the `timings=True` option of the checks, or the `profile()`
+context manager) or a TimingHook is registered with add_hook.
+
+Stage names nest: the glyph scan inside the modification check is recorded
+as 'modification.glyphs'. Durations are in seconds and accumulate when a
+stage runs more than once, e.g. once per page.
+"""
+
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class TimingHook:
+    """
+    Receives every stage duration and counter as it is recorded, e.g. to feed
+    Prometheus histograms and counters. Subclass it, override what you need and
+    register it with add_hook. Hooks are per process and are called from the
+    thread that ran the stage.
+    """
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """A stage (full dotted name) finished after `seconds`"""
+
+    def count(self, name: str, value: int) -> None:
+        """`value` more units of `name`, e.g. 'bytes_read' or 'pages_processed'"""
+
+
+class Profile:
+    """Stage durations and counters collected while a profile is active"""
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stages': dict(self.stages),
+            'bytes_read': self.counters.get('bytes_read', 0),
+            'pages_processed': self.counters.get('pages_processed', 0),
+            'counters': dict(self.counters)
+        }
+
+
+_hooks: List[TimingHook] = []
+_profile = contextvars.ContextVar('estatementvalidator_profile', default=None)
+_path = contextvars.ContextVar('estatementvalidator_stage', default=())
+
+
+def add_hook(hook: TimingHook) -> None:
+    """Register `hook` for every stage and counter recorded in this process"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: TimingHook) -> None:
+    _hooks.remove(hook)
+
+
+class _Stage:
+    __slots__ = ('profile', 'name', 'token', 'start')
+
+    def __init__(self, profile: Optional[Profile], name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        path = _path.get() + (self.name,)
+        self.name = '.'.join(path)
+        self.token = _path.set(path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        _path.reset(self.token)
+        if self.profile is not None:
+            self.profile.stages[self.name] += seconds
+        for hook in _hooks:
+            hook.observe(self.name, seconds)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """Context manager timing the stage `name`, nested under the enclosing stage"""
+    profile = _profile.get()
+    if profile is None and not _hooks:
+        return _NO_STAGE
+    return _Stage(profile, name)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add `value` to the counter `name`"""
+    profile = _profile.get()
+    if profile is None and not _hooks:
+        return
+    if profile is not None:
+        profile.counters[name] += value
+    for hook in _hooks:
+        hook.count(name, value)
+
+
+@contextmanager
+def profile() -> Iterator[Profile]:
+    """Collect the stages and counters recorded in this context into a Profile"""
+    current = Profile()
+    token = _profile.set(current)
+    try:
+        yield current
+    finally:
+        _profile.reset(token)
+
+
+def with_timings(timings: bool, run, *args, **kwargs):
+    """
+    Call `run`, which returns (is_valid, result_data), and add the profile of the
+    call to the result as 'timings' if requested
+    """
+    if not timings:
+        return run(*args, **kwargs)
+    start = time.perf_counter()
+    with profile() as current:
+        is_valid, result = run(*args, **kwargs)
+    current.stages['total'] = time.perf_counter() - start
+    # A copy, so a result shared with the cache never carries timings
+    return is_valid, dict(result, timings=current.as_dict())
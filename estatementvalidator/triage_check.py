@@ -0,0 +1,162 @@
+"""
+Structural pre-flight screen of PDF statements.
+
+Triage only reads what PyMuPDF needs to open a file: the trailer, the xref
+sections and their incremental-update chain, the document information
+dictionary and the page tree root. No page content is parsed and nothing is
+rendered, so a directory of thousands of statements can be screened in
+seconds before any of them reaches the expensive checks.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from estatementvalidator.document import StatementDocument, is_path, portable_source, source_bytes
+from estatementvalidator.producer_check import Target_Producer
+from estatementvalidator.revisions import MAX_REVISIONS, count_revisions
+from estatementvalidator.timing import count, stage
+
+logger = logging.getLogger(__name__)
+
+# What a genuine statement looks like from the outside. The page and size bounds
+# are opt-in: None is unbounded, e.g. dict(TRIAGE_LIMITS, max_pages=500)
+TRIAGE_LIMITS = {
+    'producer': Target_Producer,
+    'max_revisions': MAX_REVISIONS,
+    'min_pages': 1,
+    'max_pages': None,
+    'min_size': None,              # Bytes
+    'max_size': None
+}
+
+# Files handed to a worker process at a time by iter_triage
+TRIAGE_CHUNK_SIZE = 64
+
+
+def _open(source) -> Tuple[fitz.Document, int, bool, Any]:
+    """
+    (PyMuPDF document, size in bytes, whether the caller owns the document, and
+    the source to count the revisions of, read once for a stream)
+    """
+    if isinstance(source, StatementDocument):
+        return source.doc, len(source.data), False, source
+    if not is_path(source):
+        data = source_bytes(source)
+        return fitz.open(stream=data, filetype='pdf'), len(data), True, data
+    path = os.fspath(source)
+    # Opened from the path, PyMuPDF only reads the sections it needs
+    return fitz.open(path, filetype='pdf'), os.path.getsize(path), True, path
+
+
+def _out_of_bounds(value: int, low: Optional[int], high: Optional[int]) -> bool:
+    return (low is not None and value < low) or (high is not None and value > high)
+
+
+def _bounds(low: Optional[int], high: Optional[int]) -> str:
+    if low is None:
+        return f"at most {high}"
+    return f"at least {low}" if high is None else f"{low} to {high}"
+
+
+def triage(source, limits: Dict[str, Any] = TRIAGE_LIMITS) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Screen a PDF by its producer, revision count, page count and size. Revisions
+    are counted as scan_revisions counts them; the page and size bounds only apply
+    where `limits` sets them.
+
+    Args:
+        source (str | bytes | BinaryIO | StatementDocument): Path to the PDF file, its bytes
+            (or a memoryview of them), a binary stream, or an already opened document
+        limits (dict): Expected producer and bounds (TRIAGE_LIMITS)
+
+    Returns:
+        Tuple[bool, Dict[str, Any]]: (passed, result_data), where result_data has the
+            producer, revisions, pages and size read and the 'reasons' of a rejection
+    """
+    try:
+        with stage('triage'):
+            doc, size, owned, raw = _open(source)
+            try:
+                producer = (doc.metadata or {}).get('producer', '').strip()
+                revisions = count_revisions(raw)
+                pages = doc.page_count
+            finally:
+                if owned:
+                    doc.close()
+    except Exception as e:
+        return False, {
+            'result': 'error',
+            'message': str(e)
+        }
+
+    reasons = []
+    if producer != limits['producer']:
+        reasons.append(f"Unexpected producer '{producer}'")
+    if revisions > limits['max_revisions']:
+        reasons.append(f"{revisions} revisions, at most {limits['max_revisions']} expected")
+    if _out_of_bounds(pages, limits.get('min_pages'), limits.get('max_pages')):
+        reasons.append(f"{pages} pages, {_bounds(limits.get('min_pages'), limits.get('max_pages'))} expected")
+    if _out_of_bounds(size, limits.get('min_size'), limits.get('max_size')):
+        reasons.append(f"{size} bytes, {_bounds(limits.get('min_size'), limits.get('max_size'))} expected")
+
+    if reasons:
+        count('triage_rejected')
+        logger.info("Triage rejected %s: %s", source if isinstance(source, str) else 'a statement', '; '.join(reasons))
+    return not reasons, {
+        'result': 'fail' if reasons else 'pass',
+        'producer': producer,
+        'revisions': revisions,
+        'pages': pages,
+        'size': size,
+        'reasons': reasons
+    }
+
+
+def _triage_chunk(sources, limits):
+    return [triage(source, limits) for source in sources]
+
+
+def iter_triage(paths: Iterable, workers: Optional[int] = None,
+                limits: Dict[str, Any] = TRIAGE_LIMITS) -> Iterator[Tuple[Any, bool, Dict[str, Any]]]:
+    """
+    Triage many PDFs, in submission order.
+
+    Args:
+        paths (Iterable): PDF paths (or bytes, or binary streams) to screen
+        workers (int): Worker processes (default: os.cpu_count()); 1 screens in this process
+        limits (dict): Expected producer and bounds (TRIAGE_LIMITS)
+
+    Yields:
+        Tuple: (source, passed, result_data)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for source in paths:
+            yield (source, *triage(source, limits))
+        return
+
+    def chunks():
+        chunk = []
+        for source in paths:
+            chunk.append(source)
+            if len(chunk) == TRIAGE_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    # A file takes a fraction of a millisecond, so files go to the workers in chunks
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in chunks():
+            pending.append((chunk, pool.submit(_triage_chunk, [portable_source(source) for source in chunk], limits)))
+            # Keep a bounded window in flight so a huge directory is not queued at once
+            while len(pending) > workers * 4:
+                done, future = pending.pop(0)
+                yield from ((source, *outcome) for source, outcome in zip(done, future.result()))
+        for done, future in pending:
+            yield from ((source, *outcome) for source, outcome in zip(done, future.result()))
@@ -0,0 +1,122 @@
+"""
+What is uploaded to the conversion API for content extraction.
+
+- 'pdf' (default): the PDF bytes, which the service rasterises and reads itself
+- 'text': the text layer already extracted by PyMuPDF, as a plain-text file
+- 'images': only the first pages, rendered to grayscale PNGs at a chosen DPI
+
+The text and image payloads are a fraction of the PDF and go with a shorter
+prompt, which cuts both upload bytes and model prefill time. Their max_tokens
+is sized to the JSON the prompt asks for rather than the fixed budget of a
+whole PDF, so the answer is never cut short.
+"""
+
+import os
+from typing import Any, Dict, List, Tuple, Union
+
+import fitz  # PyMuPDF
+
+UPLOAD_MODES = ('pdf', 'text', 'images')
+
+# Defaults of the upload options; 'pages' and 'dpi' only apply to 'images'
+DEFAULT_UPLOAD = {'mode': 'pdf', 'pages': 1, 'dpi': 150}
+
+CHARS_PER_TOKEN = 4
+
+# The fields the compact prompt asks for
+EXTRACTION_FIELDS = ("Name", "Bank_code", "User_address", "Bank_address", "Account_Number",
+                     "Statement_Date", "Account_type")
+# Output budget of the JSON answer: every field with a long value (an address runs to
+# about 40 tokens), plus the "other suitable data" the prompt allows in a sub-json
+TOKENS_PER_FIELD = 64
+EXTRA_DATA_TOKENS = 1024
+SCHEMA_MAX_TOKENS = len(EXTRACTION_FIELDS) * TOKENS_PER_FIELD + EXTRA_DATA_TOKENS
+
+# The fields are the same as for a whole PDF, asked for in fewer words
+COMPACT_SYSTEM_PROMPT = "Extract bank statement fields as json"
+COMPACT_USER_PROMPT = (
+    'Return only json with ' + ', '.join(f'"{field}"' for field in EXTRACTION_FIELDS)
+    + ' and other suitable data in sub-json; blank or null if absent. '
+    '"User_address" exactly as printed, lines joined with spaces, no commas.'
+)
+
+UploadFile = Tuple[str, Tuple[str, bytes, str]]
+
+
+def upload_options(upload: Union[None, str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Normalise an upload mode name or options dict (mode, pages, dpi) to a full options dict"""
+    if upload is None:
+        options = dict(DEFAULT_UPLOAD)
+    elif isinstance(upload, str):
+        options = dict(DEFAULT_UPLOAD, mode=upload)
+    else:
+        options = dict(DEFAULT_UPLOAD, **upload)
+    if options['mode'] not in UPLOAD_MODES:
+        raise ValueError(f"Unknown upload mode '{options['mode']}', expected one of {UPLOAD_MODES}")
+    return options
+
+
+def content_stage(options: Dict[str, Any], extraction: str = 'llm', prefix: str = 'content') -> str:
+    """
+    Result cache stage of the extraction result obtained with these upload options
+    and extraction mode; 'llm' keeps the stage names of the model's answers, which
+    hold every field, so a result of another mode is never served in their place.
+    `prefix` names the step the result belongs to, e.g. 'qrcode' for its verdict.
+    """
+    if options['mode'] == 'pdf':
+        stage = prefix
+    elif options['mode'] == 'text':
+        stage = f"{prefix}.text"
+    else:
+        stage = f"{prefix}.images.{options['pages']}.{options['dpi']}"
+    return stage if extraction == 'llm' else f"{stage}.{extraction}"
+
+
+def sized_max_tokens(ceiling: int, input_tokens: int = 0) -> int:
+    """
+    max_tokens of a compact request: the schema's budget, or the input's length if
+    that is longer (a text layer copied into the answer), at most `ceiling`
+    """
+    return min(ceiling, max(SCHEMA_MAX_TOKENS, input_tokens))
+
+
+def _compact_params(params: Dict[str, Any], input_tokens: int = 0) -> Dict[str, Any]:
+    return dict(params, system_prompt=COMPACT_SYSTEM_PROMPT, user_prompt=COMPACT_USER_PROMPT,
+                max_tokens=sized_max_tokens(params['max_tokens'], input_tokens))
+
+
+def build_upload(document, params: Dict[str, Any],
+                 upload: Union[None, str, Dict[str, Any]] = None) -> Tuple[List[UploadFile], Dict[str, Any]]:
+    """
+    Build the multipart files and query parameters of an extraction request.
+
+    Args:
+        document (StatementDocument): The opened PDF document
+        params (Dict[str, Any]): Request parameters for a whole-PDF upload
+        upload (str | dict): Upload mode, or options {'mode', 'pages', 'dpi'}
+
+    Returns:
+        Tuple: ([('file', (name, bytes, content type)), ...], params)
+    """
+    options = upload_options(upload)
+    stem = os.path.splitext(document.name)[0]
+
+    if options['mode'] == 'pdf':
+        return [('file', (document.name, document.data, 'application/pdf'))], params
+
+    if options['mode'] == 'text':
+        # Form feeds between pages, as in pdftotext output
+        text = '\f'.join(page.get_text() for page in document.doc)
+        return ([('file', (f"{stem}.txt", text.encode('utf-8'), 'text/plain; charset=utf-8'))],
+                _compact_params(params, len(text) // CHARS_PER_TOKEN))
+
+    files = []
+    for page_number in range(min(options['pages'], document.page_count)):
+        pix = document.doc[page_number].get_pixmap(dpi=options['dpi'], colorspace=fitz.csGRAY, alpha=False)
+        files.append(('file', (f"{stem}_page{page_number + 1}.png", pix.tobytes('png'), 'image/png')))
+    # The answer is the same JSON however many pages are sent
+    return files, _compact_params(params)
+
+
+def upload_size(files: List[UploadFile]) -> int:
+    return sum(len(data) for _, (_, data, _) in files)
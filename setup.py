@@ -13,22 +13,25 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/chenziwen1203/estatementvalidator",
     packages=find_packages(),
+    # A learned template shipped next to modify_check.py replaces the built-in formats
+    package_data={"estatementvalidator": ["template.json"]},
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
-    python_requires=">=3.6",
+    # Executor.shutdown(cancel_futures=True) is new in 3.9
+    python_requires=">=3.9",
     install_requires=[
         "requests>=2.25.1",
+        "aiohttp>=3.8.0",
         "PyPDF2>=2.0.0",
         "Pillow>=8.0.0",
         "qrcode>=7.3",
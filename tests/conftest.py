@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The synthetic statements of the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic import NAME, make_statement, qr_address  # noqa: E402
+
+from estatementvalidator.stub_server import StubServer  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def statement():
+    return make_statement(1)
+
+
+@pytest.fixture(scope='session')
+def foreign_statement():
+    return make_statement(1, 'foreign')
+
+
+@pytest.fixture
+def stub():
+    with StubServer(summary={'Name': NAME, 'User_address': qr_address()}) as server:
+        yield server
@@ -0,0 +1,41 @@
+import logging
+import sys
+import time
+
+from estatementvalidator import batch
+from estatementvalidator.batch import _init_worker, iter_validate
+from estatementvalidator.log import LOGGER_NAME
+
+WORKERS = 2
+
+
+def slow_first_stage(source, cache=None, forensics=False):
+    if source == b'slow':
+        time.sleep(1)
+    return None, None, None
+
+
+def test_quiet_workers_only_log_errors():
+    logger = logging.getLogger(LOGGER_NAME)
+    level, stdout = logger.level, sys.stdout
+    try:
+        _init_worker(True)
+        assert logger.level == logging.ERROR and sys.stdout is stdout
+    finally:
+        logger.setLevel(level)
+
+
+def test_ordered_results_behind_a_slow_document_are_bounded(monkeypatch):
+    monkeypatch.setattr(batch, '_local_stage', slow_first_stage)
+    read = []
+
+    def sources():
+        for index in range(100):
+            read.append(index)
+            yield b'slow' if index == 0 else b'fast'
+
+    results = iter_validate(sources(), workers=WORKERS, ordered=True, local_only=True)
+    first = next(results)
+    assert first.index == 0 and first.is_valid
+    assert len(read) <= 2 * WORKERS * 4 + 1
+    assert [item.index for item in results] == list(range(1, 100))
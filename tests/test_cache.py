@@ -0,0 +1,124 @@
+import pickle
+import time
+
+import fitz
+import pytest
+
+from synthetic import make_statement
+
+from estatementvalidator.cache import (DirectoryCacheBackend, MemoryCacheBackend, ResultCache,
+                                       SQLiteCacheBackend)
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.estatement_validator import run_local_checks
+from estatementvalidator.modify_check import TEMPLATE_ENV, TEMPLATE_FORMATS, use_template
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'directory'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCacheBackend(max_entries=3)
+    if request.param == 'sqlite':
+        return SQLiteCacheBackend(str(tmp_path / 'cache.db'), max_entries=3)
+    return DirectoryCacheBackend(str(tmp_path / 'cache'), max_entries=3, evict_every=1)
+
+
+def test_round_trip(backend):
+    backend.set('a', '{"x": 1}')
+    assert backend.get('a') == '{"x": 1}'
+    assert backend.get('b') is None
+    backend.set('a', '"replaced"')
+    assert backend.get('a') == '"replaced"' and len(backend) == 1
+    backend.delete('a')
+    assert backend.get('a') is None and len(backend) == 0
+
+
+def test_expired_entries_are_not_returned(backend):
+    backend.set('a', '1', ttl=0.05)
+    assert backend.get('a') == '1'
+    time.sleep(0.1)
+    assert backend.get('a') is None
+
+
+def test_least_recently_used_entries_are_evicted(backend):
+    for key in 'abc':
+        backend.set(key, '1')
+        time.sleep(0.02)  # Distinct access times on disk
+    backend.get('a')
+    time.sleep(0.02)
+    backend.set('d', '1')
+    assert backend.get('b') is None
+    assert all(backend.get(key) == '1' for key in 'acd')
+    backend.clear()
+    assert len(backend) == 0
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'directory'])
+def test_shared_backends_survive_pickling(kind, tmp_path):
+    backend = (SQLiteCacheBackend(str(tmp_path / 'cache.db')) if kind == 'sqlite'
+               else DirectoryCacheBackend(str(tmp_path / 'cache')))
+    backend.set('a', '1')
+    assert pickle.loads(pickle.dumps(backend)).get('a') == '1'
+
+
+def test_directory_eviction_runs_every_few_writes(tmp_path):
+    backend = DirectoryCacheBackend(str(tmp_path / 'cache'), max_entries=2, evict_every=4)
+    for key in 'abcd':
+        backend.set(key, '1')
+    assert len(backend) == 4  # Only the first write swept
+    backend.set('e', '1')
+    assert len(backend) == 2
+
+
+def test_result_cache_round_trip(backend, statement):
+    cache = ResultCache(backend)
+    document = StatementDocument(statement)
+    assert cache.get(document, 'producer') is None
+    cache.set(document, 'producer', [True, {'result': 'pass'}])
+    assert cache.get(document, 'producer') == [True, {'result': 'pass'}]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_template_change_changes_the_ruleset(statement):
+    cache = ResultCache()
+    document = StatementDocument(statement)
+    use_template(TEMPLATE_FORMATS)
+    try:
+        cache.set(document, 'modification', [True, {'result': 'pass'}])
+        use_template(TEMPLATE_FORMATS[:1])
+        assert cache.get(document, 'modification') is None
+        use_template(TEMPLATE_FORMATS)
+        assert cache.get(document, 'modification') == [True, {'result': 'pass'}]
+    finally:
+        use_template()
+
+
+def test_template_environment_change_is_followed(tmp_path, monkeypatch):
+    from estatementvalidator.modify_check import template_formats
+    monkeypatch.delenv(TEMPLATE_ENV, raising=False)
+    use_template()
+    try:
+        assert template_formats() == TEMPLATE_FORMATS
+        path = tmp_path / 'template.json'
+        path.write_text('{"schema": 1, "engine": "pdfplumber", "current": "v1", "versions": {"v1": {"formats": '
+                        '[{"font": "AllAndNone", "size": 8.0, "color": [0.0, 0.0, 0.0]}]}}}')
+        monkeypatch.setenv(TEMPLATE_ENV, str(path))
+        assert template_formats() == [('AllAndNone', 8.0, (0.0, 0.0, 0.0))]
+    finally:
+        monkeypatch.delenv(TEMPLATE_ENV, raising=False)
+        use_template()
+
+
+@pytest.mark.parametrize('variant', ['overlay', 'foreign'])
+def test_cached_modification_result_reads_back_unchanged(variant):
+    cache = ResultCache()
+    document = StatementDocument(make_statement(1, variant))
+    found = run_local_checks(document, cache=cache, forensics=True)
+    assert run_local_checks(document, cache=cache, forensics=True) == found
+    assert cache.hits['modification.pdfplumber'] == 1
+    issues = found[0]['overlay_issues'] or found[0]['format_violations']
+    assert all(isinstance(value, float) for value in issues[0].get('coordinates', issues[0].get('position')))
+
+
+def test_unserializable_results_are_refused(statement):
+    with pytest.raises(TypeError):
+        ResultCache().set(StatementDocument(statement), 'modification', {'coordinates': fitz.Rect(0, 0, 1, 1)})
@@ -0,0 +1,35 @@
+import io
+
+from estatementvalidator import check_modification
+from estatementvalidator.document import StatementDocument, source_bytes
+from estatementvalidator.revisions import scan_revisions
+
+
+def test_buffers_are_shared_not_copied(statement):
+    buffer = bytearray(statement)
+    assert source_bytes(buffer) is buffer
+    assert source_bytes(memoryview(buffer)) is buffer
+    assert source_bytes(memoryview(statement)) is statement
+    with StatementDocument(memoryview(buffer)) as document:
+        assert document.data is buffer
+        assert document.doc.page_count == len(document.plumber.pages)
+
+
+def test_partial_views_are_copied(statement):
+    view = memoryview(bytearray(b'--' + statement))[2:]
+    assert source_bytes(view) == statement
+    assert source_bytes(io.BytesIO(statement)) == statement
+
+
+def test_shared_buffer_runs_the_checks(statement):
+    buffer = bytearray(statement)
+    assert check_modification(buffer)[0] == check_modification(statement)[0]
+    assert scan_revisions(buffer) == scan_revisions(statement)
+
+
+def test_release_page_without_pdfminer_object_cache(statement):
+    with StatementDocument(statement) as document:
+        document.plumber.pages[0].chars
+        pdfminer_doc, document.plumber.doc = document.plumber.doc, object()
+        document.release_page(0)
+        document.plumber.doc = pdfminer_doc
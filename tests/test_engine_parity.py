@@ -0,0 +1,83 @@
+"""
+The two character engines must report the same format keys, not only the same
+verdicts: a check that passes recolored text because one engine normalises the
+color away is a missed tampering.
+"""
+
+import fitz
+import pytest
+
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.modify_check import DEFAULT_ENGINE, analyze_pdf, format_key, get_run_engine
+
+TEMPLATE = [('Helvetica', 10.0, (0.0, 0.0, 0.0)), ('Helvetica', 10.0, (0.502, 0.502, 0.502))]
+
+# name: (fill color operator, BaseFont, format key in the PDF's own color space)
+FIXTURES = {
+    'rgb': ('0 0 0 rg', 'Helvetica', ('Helvetica', 10.0, (0.0, 0.0, 0.0))),
+    'template_grey': ('.502 .502 .502 rg', 'Helvetica', ('Helvetica', 10.0, (0.502, 0.502, 0.502))),
+    'gray': ('0 g', 'Helvetica', ('Helvetica', 10.0, (0.0,))),
+    'cmyk': ('0 0 0 1 k', 'Helvetica', ('Helvetica', 10.0, (0.0, 0.0, 0.0, 1.0))),
+    'half_grey': ('0.5 0.5 0.5 rg', 'Helvetica', ('Helvetica', 10.0, (0.5, 0.5, 0.5))),
+    'subset': ('0 0 0 rg', 'ABCDEF+Helvetica', ('ABCDEF+Helvetica', 10.0, (0.0, 0.0, 0.0))),
+}
+
+# MuPDF converts every fill color to 8-bit sRGB
+SRGB_ONLY = pytest.mark.xfail(strict=True, reason="PyMuPDF reports colors as sRGB, not in the PDF's color space")
+
+
+def make_pdf(fill, base_font):
+    """One line of 10 pt text drawn with the given fill operator and font name"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), 'Sample', fontname='helv', fontsize=10)
+    font_xref = next(font[0] for font in page.get_fonts())
+    doc.update_stream(page.get_contents()[0], f'BT /helv 10 Tf {fill} 1 0 0 1 72 720 Tm (Sample) Tj ET'.encode())
+    if base_font != 'Helvetica':
+        descriptor = doc.get_new_xref()
+        doc.update_object(descriptor, f'<< /Type /FontDescriptor /FontName /{base_font} /Flags 32 '
+                                      f'/FontBBox [0 0 1000 1000] /ItalicAngle 0 /Ascent 718 /Descent -207 '
+                                      f'/CapHeight 718 /StemV 88 >>')
+        doc.xref_set_key(font_xref, 'BaseFont', f'/{base_font}')
+        doc.xref_set_key(font_xref, 'FontDescriptor', f'{descriptor} 0 R')
+    return doc.tobytes()
+
+
+def page_keys(data, engine):
+    with StatementDocument(data) as document:
+        return {format_key(font, size, color) for font, size, color, _ in get_run_engine(engine)(document, 0)}
+
+
+@pytest.mark.parametrize('name', sorted(FIXTURES))
+def test_pdfplumber_keys_keep_the_color_space(name):
+    fill, base_font, key = FIXTURES[name]
+    assert page_keys(make_pdf(fill, base_font), 'pdfplumber') == {key}
+
+
+@pytest.mark.parametrize('name', [
+    'rgb', 'template_grey', 'subset',
+    pytest.param('gray', marks=SRGB_ONLY),
+    pytest.param('cmyk', marks=SRGB_ONLY),
+    pytest.param('half_grey', marks=SRGB_ONLY),
+])
+def test_engines_report_the_same_keys(name):
+    fill, base_font, _ = FIXTURES[name]
+    data = make_pdf(fill, base_font)
+    assert page_keys(data, 'pymupdf') == page_keys(data, 'pdfplumber')
+
+
+@pytest.mark.parametrize('name, valid', [
+    ('rgb', True), ('template_grey', True),
+    ('gray', False), ('cmyk', False), ('half_grey', False), ('subset', False),
+])
+def test_default_engine_flags_recolored_text(name, valid):
+    fill, base_font, _ = FIXTURES[name]
+    modify_valid, _ = analyze_pdf(make_pdf(fill, base_font), TEMPLATE, engine=DEFAULT_ENGINE)
+    assert modify_valid is valid
+
+
+def test_pymupdf_engine_restores_the_subset_fontname_setting():
+    data = make_pdf('0 0 0 rg', 'ABCDEF+Helvetica')
+    assert not fitz.TOOLS.set_subset_fontnames()
+    assert page_keys(data, 'pymupdf') == {FIXTURES['subset'][2]}
+    assert not fitz.TOOLS.set_subset_fontnames()
@@ -0,0 +1,38 @@
+import pytest
+
+from synthetic import make_statement
+
+from estatementvalidator import check_modification
+from estatementvalidator.estatement_validator import FAIL_FAST_VIOLATIONS
+
+PAGES = 5
+
+
+@pytest.fixture(scope='module')
+def early():
+    return make_statement(PAGES, 'early')
+
+
+def test_fail_fast_stops_after_the_first_violating_page(early):
+    is_valid, result = check_modification(early, max_violations=FAIL_FAST_VIOLATIONS, timings=True)
+    assert not is_valid and result['stopped_at_page'] == 1
+    assert len(result['format_violations']) == FAIL_FAST_VIOLATIONS
+    assert result['timings']['pages_processed'] == 1
+
+
+def test_max_violations_bounds_the_report(early):
+    _, result = check_modification(early, max_violations=3)
+    assert len(result['format_violations']) + len(result['overlay_issues']) == 3
+    assert result['stopped_at_page'] == 1
+
+
+def test_forensics_scans_every_page(early):
+    is_valid, result = check_modification(early, timings=True)
+    assert not is_valid and result['stopped_at_page'] is None
+    assert len(result['format_violations']) == len('999999.99')
+    assert result['timings']['pages_processed'] == PAGES
+
+
+def test_a_late_violation_is_found_on_the_last_page():
+    _, result = check_modification(make_statement(PAGES, 'foreign'), max_violations=FAIL_FAST_VIOLATIONS)
+    assert result['stopped_at_page'] == PAGES
@@ -0,0 +1,68 @@
+import pytest
+
+from synthetic import NAME, make_statement, qr_address
+
+from estatementvalidator import estatement_validator, validate_document
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.local_extractor import LOCAL_CONFIDENCE_THRESHOLD, LOCAL_LAYOUT, extract_fields
+from estatementvalidator.stub_server import StubServer
+
+# A one-line address is unusual enough to ask the model
+SHORT_ADDRESS = ('FLAT A 1/F 1 TEST ROAD HONG KONG',)
+# Longer than the block the layout reads, so the address read locally misses lines
+LONG_ADDRESS = tuple(f"LINE {chr(ord('A') + index)}" for index in range(LOCAL_LAYOUT['max_address_lines']))
+
+
+class NoClient:
+    """A conversion client that must never be used"""
+
+    def post_files(self, *args, **kwargs):
+        raise AssertionError("the conversion API was called")
+
+
+@pytest.fixture(scope='module')
+def short_address_statement():
+    return make_statement(1, address=SHORT_ADDRESS)
+
+
+def test_a_clear_layout_is_read_with_full_confidence(statement):
+    with StatementDocument(statement) as document:
+        extraction = extract_fields(document)
+    assert extraction['fields']['Name'] == NAME
+    assert extraction['fields']['User_address'] == qr_address()
+    assert extraction['fields']['Account_Number'] == '012-345-6-789012-3'
+    assert extraction['overall'] >= LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_auto_skips_the_api_on_a_layout_match(stub, statement):
+    is_valid, result = validate_document(statement, api_url=stub.url, extraction='auto', client=NoClient())
+    assert is_valid and result['content']['extractor'] == 'local'
+    assert stub.requests == 0
+
+
+@pytest.mark.parametrize('address, confident', [(SHORT_ADDRESS, False), (LONG_ADDRESS, True)])
+def test_auto_asks_the_api_when_unsure(address, confident):
+    """Below the confidence threshold, or a confident read that differs from the QR code"""
+    data = make_statement(1, address=address)
+    with StatementDocument(data) as document:
+        extraction = extract_fields(document)
+    assert (extraction['overall'] >= LOCAL_CONFIDENCE_THRESHOLD) is confident
+    assert confident is (extraction['fields']['User_address'] != qr_address(address))
+    with StubServer(summary={'Name': NAME, 'User_address': qr_address(address)}) as stub:
+        is_valid, result = validate_document(data, api_url=stub.url, extraction='auto')
+    assert is_valid and 'extractor' not in result['content']
+    assert stub.requests == 1
+
+
+def test_the_threshold_decides_the_fallback(stub, statement, monkeypatch):
+    monkeypatch.setattr(estatement_validator, 'LOCAL_CONFIDENCE_THRESHOLD', 1.01)
+    is_valid, _ = validate_document(statement, api_url=stub.url, extraction='auto')
+    assert is_valid and stub.requests == 1
+
+
+@pytest.mark.parametrize('fixture', ['statement', 'short_address_statement'])
+def test_local_never_calls_the_client(stub, fixture, request):
+    _, result = validate_document(request.getfixturevalue(fixture), api_url=stub.url, extraction='local',
+                                  client=NoClient())
+    assert result['result'] != 'error'
+    assert stub.requests == 0
@@ -0,0 +1,106 @@
+import fitz
+import pytest
+import qrcode
+
+from synthetic import QR_RECT, qr_address, qr_payload
+
+from estatementvalidator import img_qr_reader
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.img_qr_reader import decode_qrcode
+from estatementvalidator.pdf_qr2img import (QR_CUT_BOTTOM, QR_CUT_LEFT, QR_CUT_RIGHT, QR_CUT_TOP, cut_rect,
+                                            locate_qr)
+
+ADDRESS = f"Address: {qr_address()}"
+# Well away from the area the fixed QR_CUT_* margins keep
+VECTOR_ORIGIN = (100.0, 500.0)
+MODULE = 2.0
+
+
+def vector_statement(per_module=False):
+    """A page whose QR code is drawn as filled squares: one path, or one path per module"""
+    code = qrcode.QRCode(border=0)
+    code.add_data(qr_payload())
+    matrix = code.get_matrix()
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((50, 80), "BANK OF CHINA (HONG KONG)", fontsize=13)
+    shape = page.new_shape()
+    for row, modules in enumerate(matrix):
+        for column, dark in enumerate(modules):
+            if dark:
+                x, y = VECTOR_ORIGIN[0] + column * MODULE, VECTOR_ORIGIN[1] + row * MODULE
+                shape.draw_rect(fitz.Rect(x, y, x + MODULE, y + MODULE))
+                if per_module:
+                    shape.finish(fill=(0, 0, 0), color=None)
+    if not per_module:
+        shape.finish(fill=(0, 0, 0), color=None)
+    shape.commit()
+    side = len(matrix) * MODULE
+    return doc.tobytes(), fitz.Rect(*VECTOR_ORIGIN, VECTOR_ORIGIN[0] + side, VECTOR_ORIGIN[1] + side)
+
+
+@pytest.fixture(scope='module')
+def vector():
+    return vector_statement()
+
+
+def test_an_embedded_qr_image_is_decoded_without_rendering(statement, monkeypatch):
+    with StatementDocument(statement) as document:
+        location = locate_qr(document)
+        assert location['source'] == 'image' and location['xref']
+        assert location['rect'] == QR_RECT
+        monkeypatch.setattr(img_qr_reader, 'qr2pixmap', None)  # Rendering would raise
+        address, rung = decode_qrcode(document)
+    assert address == ADDRESS and rung['source'] == 'embedded'
+
+
+@pytest.mark.parametrize('per_module', [False, True])
+def test_a_vector_qr_outside_the_legacy_clip_is_located(per_module):
+    data, drawn = vector_statement(per_module)
+    with StatementDocument(data) as document:
+        location = locate_qr(document)
+        assert location['source'] == 'drawing' and location['xref'] is None
+        assert location['rect'] == drawn
+        assert not drawn.intersects(cut_rect(document.doc[0].rect, QR_CUT_TOP, QR_CUT_BOTTOM,
+                                             QR_CUT_LEFT, QR_CUT_RIGHT))
+        address, rung = decode_qrcode(document)
+        assert address == ADDRESS and rung['source'] == 'located' and rung['rung'] == 0
+        assert decode_qrcode(document, locate=False) == (None, None)
+
+
+def test_a_page_without_a_qr_code():
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 80), "No code here")
+    with StatementDocument(doc.tobytes()) as document:
+        assert locate_qr(document) is None
+        assert decode_qrcode(document) == (None, None)
+
+
+def test_the_ladder_climbs_until_a_rung_decodes(vector, monkeypatch):
+    renders, decodes = [], []
+    render, decode = img_qr_reader.qr2pixmap, img_qr_reader.extract_qr_data_from_pixmap
+
+    def counted_render(document, dpi, clip):
+        renders.append(dpi)
+        return render(document, dpi=dpi, clip=clip)
+
+    def counted_decode(pix, **options):
+        decodes.append(options)
+        return decode(pix, **options)
+
+    monkeypatch.setattr(img_qr_reader, 'qr2pixmap', counted_render)
+    monkeypatch.setattr(img_qr_reader, 'extract_qr_data_from_pixmap', counted_decode)
+    ladder = (
+        {'dpi': 20, 'upscale_factor': 1, 'try_threshold': False},   # Too coarse for any attempt
+        {'dpi': 50, 'upscale_factor': 1, 'try_threshold': False},   # Modules blur at 1.4 pixels
+        {'dpi': 50, 'upscale_factor': 2, 'try_threshold': True},    # Sharp again once upscaled
+        {'dpi': 300, 'upscale_factor': 1, 'try_threshold': False},
+    )
+    with StatementDocument(vector[0]) as document:
+        address, rung = decode_qrcode(document, ladder=ladder)
+    assert address == ADDRESS
+    assert rung == dict(ladder[2], rung=2, source='located')
+    assert renders == [20, 50]  # A render is shared by the rungs of its DPI
+    # The third rung skips the plain decode its DPI already failed
+    assert [options['try_original'] for options in decodes] == [True, True, False]
+
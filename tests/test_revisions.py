@@ -0,0 +1,139 @@
+import re
+import zlib
+
+import fitz
+import pytest
+
+from estatementvalidator.revisions import MAX_REVISIONS, count_revisions, revision_check, scan_revisions
+
+
+@pytest.fixture(scope='module')
+def base():
+    doc = fitz.open()
+    doc.new_page()
+    doc.set_metadata({'producer': 'original'})
+    return doc.tobytes()
+
+
+def trailer_of(data):
+    """(startxref, size, root, info) of the last revision"""
+    def last(pattern):
+        return int(re.findall(pattern, data)[-1])
+    return (last(rb'startxref\s+(\d+)'), last(rb'/Size\s+(\d+)'), last(rb'/Root\s+(\d+)'),
+            last(rb'/Info\s+(\d+)'))
+
+
+def write_objects(data, objects):
+    out = bytearray(data if data.endswith(b'\n') else data + b'\n')
+    offsets = {}
+    for number, body in objects.items():
+        offsets[number] = len(out)
+        out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    return out, offsets
+
+
+def info(producer):
+    return f'<</Producer({producer})>>'.encode()
+
+
+def append_table(data, producer, freed=()):
+    """An incremental update in the classic style: new Info dictionary, xref table, trailer"""
+    prev, size, root, info_number = trailer_of(data)
+    out, offsets = write_objects(data, {info_number: info(producer)})
+    xref = len(out)
+    out += b'xref\n'
+    for number in sorted(offsets):
+        out += f'{number} 1\n{offsets[number]:010d} 00000 n \n'.encode()
+    for number in freed:
+        out += f'{number} 1\n0000000000 00001 f \n'.encode()
+    out += (f'trailer\n<</Size {size}/Root {root} 0 R/Info {info_number} 0 R/Prev {prev}>>\n'
+            f'startxref\n{xref}\n%%EOF\n').encode()
+    return bytes(out)
+
+
+def png_encode(rows, columns):
+    """The rows PNG-filtered with each of the five filter types in turn"""
+    out, previous = bytearray(), bytes(columns)
+    for index, row in enumerate(rows):
+        kind = index % 5
+        encoded = bytearray()
+        for i, value in enumerate(row):
+            left, up = row[i - 1] if i else 0, previous[i]
+            upper_left = previous[i - 1] if i else 0
+            estimate = left + up - upper_left
+            distances = (abs(estimate - left), abs(estimate - up), abs(estimate - upper_left))
+            predicted = (0, left, up, (left + up) // 2,
+                         (left, up, upper_left)[distances.index(min(distances))])[kind]
+            encoded.append((value - predicted) & 0xFF)
+        out += bytes([kind]) + encoded
+        previous = row
+    return bytes(out)
+
+
+def append_stream(data, producer, extra=3, freed=()):
+    """An incremental update with a Flate-compressed, PNG-predicted xref stream"""
+    prev, size, root, info_number = trailer_of(data)
+    added = {info_number: info(producer)}
+    added.update({size + index: b'<</Filler true>>' for index in range(extra)})
+    out, offsets = write_objects(data, added)
+    xref_number = size + extra
+    offsets[xref_number] = len(out)
+
+    entries = [(1, offsets[number], 0) for number in sorted(offsets)] + [(0, 0, 1) for _ in freed]
+    numbers = sorted(offsets) + list(freed)
+    rows = [bytes([kind]) + offset.to_bytes(3, 'big') + bytes([generation]) for kind, offset, generation in entries]
+    body = zlib.compress(png_encode(rows, 5))
+    index = ' '.join(f'{number} 1' for number in numbers)
+    out += (f'{xref_number} 0 obj\n<</Type/XRef/Size {xref_number + 1}/W[1 3 1]/Index[{index}]/Root {root} 0 R'
+            f'/Info {info_number} 0 R/Prev {prev}/Filter/FlateDecode/DecodeParms<</Predictor 12/Columns 5>>'
+            f'/Length {len(body)}>>\nstream\n').encode() + body
+    out += f'\nendstream\nendobj\nstartxref\n{offsets[xref_number]}\n%%EOF\n'.encode()
+    return bytes(out), sorted(offsets)
+
+
+def test_xref_tables_are_walked(base):
+    edited = append_table(append_table(base, 'first edit'), 'second edit', freed=[4])
+    revisions = scan_revisions(edited)
+    assert count_revisions(edited) == len(revisions) == 3
+    assert [revision['xref'] for revision in revisions] == ['table'] * 3
+    assert [revision['producer'] for revision in revisions] == ['original', 'first edit', 'second edit']
+    assert revisions[2]['prev'] == revisions[1]['xref_offset']
+    assert revisions[2]['objects'] == [trailer_of(base)[3]] and revisions[2]['freed'] == [4]
+    assert revisions[2]['end'] == len(edited)
+
+
+def test_predicted_xref_streams_are_decoded(base):
+    edited, written = append_stream(base, 'stream edit', extra=7, freed=[4])
+    assert fitz.open(stream=edited, filetype='pdf').metadata['producer'] == 'stream edit'
+    revisions = scan_revisions(edited)
+    assert count_revisions(edited) == len(revisions) == 2
+    assert revisions[1]['xref'] == 'stream'
+    assert revisions[1]['objects'] == written and revisions[1]['freed'] == [4]
+    assert revisions[1]['producer'] == 'stream edit'
+    assert revisions[1]['prev'] == revisions[0]['xref_offset']
+
+
+def linearized(data, flag=b'/Linearized 1'):
+    """`data` with a first-page section ending in its own %%EOF, as a linearized file has"""
+    header_end = data.index(b'\n') + 1
+    first_page = (b'900 0 obj\n<<' + flag + b'>>\nendobj\nxref\n900 1\n0000000009 00000 n \n'
+                  b'trailer\n<</Size 901>>\nstartxref\n0\n%%EOF\n')
+    return data[:header_end] + first_page + data[header_end:]
+
+
+def test_the_first_eof_of_a_linearized_file_is_not_a_revision(base):
+    assert count_revisions(linearized(base)) == len(scan_revisions(linearized(base))) == 1
+    assert count_revisions(append_table(linearized(base), 'edit')) == 2
+    assert count_revisions(linearized(base, flag=b'/Type /Other')) == 2
+
+
+def test_max_revisions_boundary(base):
+    edited = base
+    for number in range(MAX_REVISIONS - 1):
+        edited = append_table(edited, f'edit {number}')
+    is_valid, result = revision_check(edited)
+    assert is_valid and result['revision_count'] == MAX_REVISIONS and result['message'] is None
+
+    is_valid, result = revision_check(append_table(edited, 'one too many'))
+    assert not is_valid and result['revision_count'] == MAX_REVISIONS + 1
+    assert 'Incremental updates found' in result['message']
@@ -0,0 +1,69 @@
+import http.client
+import json
+
+import pytest
+
+from estatementvalidator.service import ValidationService
+
+
+@pytest.fixture
+def service(stub, statement):
+    with ValidationService(port=0, api_url=stub.url, workers=1, max_upload=len(statement) + 16,
+                           extraction='llm') as server:
+        yield server
+
+
+def post(service, headers, body=b'', chunks=None):
+    connection = http.client.HTTPConnection(*service.server_address[:2], timeout=60)
+    connection.putrequest('POST', '/validate')
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders()
+    try:
+        if chunks is None:
+            connection.send(body)
+        else:
+            for chunk in chunks:
+                connection.send(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            connection.send(b'0\r\n\r\n')
+    except BrokenPipeError:
+        pass  # The service answered before the whole body was sent
+    response = connection.getresponse()
+    try:
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_validates_a_statement(service, statement):
+    status, payload = post(service, {'Content-Length': str(len(statement))}, statement)
+    assert status == 200
+    assert payload['valid'] is True and payload['result'] == 'pass'
+
+
+def test_chunked_statement(service, statement):
+    status, payload = post(service, {'Transfer-Encoding': 'chunked'}, chunks=[statement[:1000], statement[1000:]])
+    assert status == 200 and payload['result'] == 'pass'
+
+
+@pytest.mark.parametrize('length', ['abc', '-1'])
+def test_malformed_content_length(service, length):
+    status, _ = post(service, {'Content-Length': length})
+    assert status == 400
+
+
+def test_declared_length_over_the_limit(service):
+    status, _ = post(service, {'Content-Length': str(10 ** 9)})
+    assert status == 413
+
+
+def test_chunked_upload_stops_at_the_limit(service, statement):
+    status, _ = post(service, {'Transfer-Encoding': 'chunked'}, chunks=[statement, statement])
+    assert status == 413
+    assert service.metrics()['too_large'] == 1
+
+
+def test_every_worker_is_started(stub):
+    with ValidationService(port=0, api_url=stub.url, workers=2) as server:
+        processes = server._pool._processes
+        assert len(processes) == 2 and all(process.is_alive() for process in processes.values())
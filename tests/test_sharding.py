@@ -0,0 +1,23 @@
+import pytest
+
+from estatementvalidator import check_modification
+from estatementvalidator import modify_check
+
+from synthetic import make_statement
+
+
+@pytest.mark.parametrize('variant', ['genuine', 'foreign'])
+def test_sharded_scan_matches_the_sequential_one(variant):
+    data = make_statement(6, variant)
+    sharded = check_modification(data, workers=2)
+    sequential = check_modification(data)
+    assert sharded[0] == sequential[0]
+    assert sharded[1]['format_violations'] == sequential[1]['format_violations']
+
+
+def test_page_workers_are_reused():
+    data = make_statement(4)
+    check_modification(data, workers=2)
+    pool = modify_check._shard_pools[2]
+    check_modification(data, workers=2)
+    assert modify_check._shard_pools[2] is pool
@@ -0,0 +1,36 @@
+import logging
+
+import pytest
+
+from estatementvalidator import check_modification
+from estatementvalidator.modify_check import use_template
+from estatementvalidator.template_learner import learn_template, load_template, save_template
+
+
+@pytest.fixture
+def template_path(statement, tmp_path):
+    template, errors = learn_template({'v1': [statement]}, workers=1, engine='pymupdf')
+    assert not errors
+    path = str(tmp_path / 'template.json')
+    save_template(template, path)
+    return path
+
+
+def test_load_template_rejects_another_engine(template_path):
+    assert load_template(template_path, engine='pymupdf')
+    with pytest.raises(ValueError, match="learned with the 'pymupdf' engine"):
+        load_template(template_path, engine='pdfplumber')
+    with pytest.raises(ValueError):
+        use_template(template_path, engine='pdfplumber')
+
+
+def test_check_with_another_engine_warns(template_path, statement, caplog):
+    use_template(template_path)
+    try:
+        with caplog.at_level(logging.WARNING, logger='estatementvalidator.modify_check'):
+            check_modification(statement, engine='pymupdf')
+            assert not caplog.records
+            check_modification(statement, engine='pdfplumber')
+        assert "learned with the 'pymupdf' engine" in caplog.text
+    finally:
+        use_template()
@@ -0,0 +1,44 @@
+import fitz
+
+from estatementvalidator import triage
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.estatement_validator import run_local_checks
+from estatementvalidator.revisions import scan_revisions
+from estatementvalidator.triage_check import TRIAGE_LIMITS
+
+
+def with_producer(data, producer):
+    doc = fitz.open(stream=data, filetype='pdf')
+    doc.set_metadata(dict(doc.metadata, producer=producer))
+    return doc.tobytes()
+
+
+def with_revisions(data, edits, tmp_path):
+    """The statement with `edits` incremental updates appended"""
+    path = tmp_path / 'edited.pdf'
+    path.write_bytes(data)
+    for number in range(edits):
+        doc = fitz.open(path)
+        doc.set_metadata(dict(doc.metadata, title=f'edit {number}'))
+        doc.saveIncr()
+        doc.close()
+    return path.read_bytes()
+
+
+def test_revisions_are_counted_like_scan_revisions(statement, tmp_path):
+    edited = with_revisions(statement, 2, tmp_path)
+    passed, result = triage(edited)
+    assert result['revisions'] == len(scan_revisions(edited)) == 3
+    assert not passed and result['reasons'] == ['3 revisions, at most 2 expected']
+
+
+def test_size_and_page_bounds_are_opt_in(statement):
+    assert triage(statement)[0]
+    passed, result = triage(statement, dict(TRIAGE_LIMITS, max_pages=500, min_size=len(statement) + 1))
+    assert not passed and result['reasons'] == [f'{len(statement)} bytes, at least {len(statement) + 1} expected']
+
+
+def test_wrong_producer_keeps_the_producer_result(statement):
+    failure, _, _ = run_local_checks(StatementDocument(with_producer(statement, 'Other Producer')))
+    assert failure == {'result': 'fail', 'producer': 'false', 'modify': 'unknown', 'qrcode': 'unknown',
+                       'message': 'Producer check failed'}
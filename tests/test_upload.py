@@ -0,0 +1,32 @@
+import pytest
+
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.estatement_validator import EXTRACTION_API_PARAMS
+from estatementvalidator.upload import SCHEMA_MAX_TOKENS, build_upload, content_stage, upload_options
+
+from synthetic import make_statement
+
+
+@pytest.mark.parametrize('pages', [1, 3])
+def test_image_answers_get_the_schema_budget(pages):
+    with StatementDocument(make_statement(3)) as document:
+        files, params = build_upload(document, EXTRACTION_API_PARAMS, {'mode': 'images', 'pages': pages, 'dpi': 50})
+    assert len(files) == pages
+    assert params['max_tokens'] == SCHEMA_MAX_TOKENS
+
+
+def test_text_answers_get_at_least_the_schema_budget(statement):
+    with StatementDocument(statement) as document:
+        _, params = build_upload(document, EXTRACTION_API_PARAMS, 'text')
+    assert SCHEMA_MAX_TOKENS <= params['max_tokens'] <= EXTRACTION_API_PARAMS['max_tokens']
+
+
+@pytest.mark.parametrize('upload, extraction, stage', [
+    ('pdf', 'llm', 'qrcode'),
+    ('text', 'llm', 'qrcode.text'),
+    ({'mode': 'images', 'pages': 2, 'dpi': 100}, 'auto', 'qrcode.images.2.100.auto'),
+])
+def test_content_stage_prefix(upload, extraction, stage):
+    options = upload_options(upload)
+    assert content_stage(options, extraction, prefix='qrcode') == stage
+    assert content_stage(options, extraction) == 'content' + stage[len('qrcode'):]
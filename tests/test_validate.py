@@ -0,0 +1,128 @@
+import asyncio
+import sys
+import threading
+
+import fitz
+import pytest
+
+from estatementvalidator import async_validator, avalidate_document, estatement_validator, validate_document
+from estatementvalidator.cache import ResultCache
+from estatementvalidator.client import ConversionClient
+from estatementvalidator.document import StatementDocument
+from estatementvalidator.img_qr_reader import extract_qr_data_from_pixmap
+
+
+def test_genuine_statement_passes(stub, statement):
+    is_valid, result = validate_document(statement, api_url=stub.url, extraction='llm')
+    assert is_valid and result['result'] == 'pass'
+    assert stub.requests == 1 and stub.uploads['pdf'] == 1
+
+
+def test_the_model_extracts_by_default(stub, statement):
+    is_valid, result = validate_document(statement, api_url=stub.url)
+    assert is_valid and 'Bank_code' in result['content_data']
+    assert stub.requests == 1
+
+
+def test_extraction_modes_do_not_share_cached_content(stub, statement):
+    cache = ResultCache()
+    _, local = validate_document(statement, api_url=stub.url, cache=cache, extraction='auto')
+    assert local['content']['extractor'] == 'local' and stub.requests == 0
+    _, full = validate_document(statement, api_url=stub.url, cache=cache)
+    assert 'Bank_code' in full['content_data'] and stub.requests == 1
+
+
+def test_tampered_statement_fails_before_the_api(stub, foreign_statement):
+    is_valid, result = validate_document(foreign_statement, api_url=stub.url, extraction='llm')
+    assert not is_valid and result['message'] == 'Modification check failed'
+    assert stub.requests == 0
+
+
+def test_5xx_answers_are_retried(stub, statement):
+    stub.failures = 2
+    client = ConversionClient(backoff=0)
+    try:
+        is_valid, _ = validate_document(statement, api_url=stub.url, extraction='llm', client=client)
+    finally:
+        client.close()
+    assert is_valid and stub.requests == 3
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(async_validator, 'backoff_delay', lambda attempt: 0)
+
+
+def test_async_retries_like_the_client(stub, statement, no_backoff):
+    stub.failures = 2
+    is_valid, result = asyncio.run(avalidate_document(statement, api_url=stub.url, extraction='llm'))
+    assert is_valid and result['result'] == 'pass'
+    assert stub.requests == 3
+
+
+def test_async_gives_up_after_the_retries(stub, statement, no_backoff):
+    stub.failures = 10
+    is_valid, result = asyncio.run(avalidate_document(statement, api_url=stub.url, extraction='llm'))
+    assert not is_valid
+    assert stub.requests == 1 + async_validator.DEFAULT_RETRIES
+
+
+def test_async_closes_only_the_documents_it_opened(stub, statement, monkeypatch):
+    opened = []
+
+    class TrackedDocument(StatementDocument):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(async_validator, 'StatementDocument', TrackedDocument)
+    asyncio.run(avalidate_document(statement, api_url=stub.url, extraction='llm'))
+    assert len(opened) == 1 and opened[0]._doc is None
+
+    with StatementDocument(statement) as document:
+        document.doc
+        asyncio.run(avalidate_document(document, api_url=stub.url, extraction='llm'))
+        assert document._doc is not None
+
+
+def test_a_failed_qr_decode_is_not_cached(stub, statement, monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(estatement_validator, 'decode_qrcode', lambda document, output_img: (None, None))
+    validate_document(statement, api_url=stub.url, cache=cache)
+    assert cache.get(StatementDocument(statement), 'qrcode_data') is None
+    monkeypatch.undo()
+    is_valid, _ = validate_document(statement, api_url=stub.url, cache=cache)
+    assert is_valid and cache.get(StatementDocument(statement), 'qrcode_data')['qr_data']
+
+
+def test_a_missing_zbar_library_is_not_a_missing_qr_code(statement, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyzbar', None)
+    with StatementDocument(statement) as document:
+        pix = document.doc[0].get_pixmap(colorspace=fitz.csGRAY)
+    with pytest.raises(ImportError):
+        extract_qr_data_from_pixmap(pix)
+
+
+def test_async_builds_the_upload_off_the_event_loop(stub, statement, monkeypatch):
+    threads, original = [], async_validator.build_upload
+
+    def build_upload(*args):
+        threads.append(threading.current_thread())
+        return original(*args)
+
+    monkeypatch.setattr(async_validator, 'build_upload', build_upload)
+    is_valid, _ = asyncio.run(avalidate_document(statement, api_url=stub.url, upload='text'))
+    assert is_valid and stub.uploads['text'] == 1
+    assert threads and threading.main_thread() not in threads
+
+
+def test_async_thread_executor_parses_the_document_once(stub, statement, monkeypatch):
+    opened, original = [], StatementDocument.__init__
+
+    def init(self, *args, **kwargs):
+        opened.append(self)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(StatementDocument, '__init__', init)
+    is_valid, _ = asyncio.run(avalidate_document(statement, api_url=stub.url))
+    assert is_valid and len(opened) == 1